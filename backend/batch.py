@@ -0,0 +1,23 @@
+# Batched multi-get: one `id = ANY($1::bigint[])` query for a list of ids
+from typing import Callable, Optional
+from database import execute_query
+
+
+def order_by_ids(ids: list[int], lookup: Callable[[int], Optional[dict]]) -> tuple[list[dict], list[int]]:
+    # Rows in the order of ids, plus the ids that had no row
+    items = []
+    missing = []
+    for row_id in ids:
+        row = lookup(row_id)
+        if row is None:
+            missing.append(row_id)
+        else:
+            items.append(row)
+    return items, missing
+
+
+async def fetch_by_ids(query: str, ids: list[int], statement: str) -> tuple[list[dict], list[int]]:
+    # query selects an id column and takes the id array as $1
+    rows = await execute_query(query, ids, statement=statement)
+    by_id = {row['id']: row for row in rows}
+    return order_by_ids(ids, by_id.get)
@@ -0,0 +1,149 @@
+# Bulk settlement of one event's bets (SETTLE_EVENT_QUERY, as POST /api/events/{id}/settle
+# runs it) with the statement-level audit triggers, and with the previous row-level audit
+# trigger (one dynamic primary key lookup and one audit_log INSERT per row) put back in
+# their place. Settlement updates the bets, inserts their balance changes and credits the
+# customers, so all three tables are audited.
+#
+# Needs the database (DB_* settings). Each run sets up its event and bets and times the
+# settlement inside one transaction, which is rolled back. The audit time is the sum of
+# the audit triggers' times from EXPLAIN ANALYZE.
+# Usage (from backend/): python benchmarks/bench_audit_settlement.py [bets] [customers]
+import asyncio
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import asyncpg  # noqa: E402
+
+from database import get_db_settings  # noqa: E402
+from routers.events import SETTLE_EVENT_QUERY  # noqa: E402
+
+AUDITED_TABLES = ("bets", "balance_changes", "customers")
+
+ROW_LEVEL_AUDIT = """
+    CREATE FUNCTION audit_trigger_function_row_level()
+    RETURNS TRIGGER AS $$
+    DECLARE
+        pk_value TEXT;
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            EXECUTE format('SELECT ($1).%I', 'id') INTO pk_value USING OLD;
+        ELSE
+            EXECUTE format('SELECT ($1).%I', 'id') INTO pk_value USING NEW;
+        END IF;
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO audit_log (table_name, operation, row_id, new_data)
+            VALUES (TG_TABLE_NAME, TG_OP::audit_operation, pk_value::bigint, to_jsonb(NEW));
+        ELSIF TG_OP = 'UPDATE' THEN
+            INSERT INTO audit_log (table_name, operation, row_id, old_data, new_data)
+            VALUES (TG_TABLE_NAME, TG_OP::audit_operation, pk_value::bigint, to_jsonb(OLD), to_jsonb(NEW));
+        ELSE
+            INSERT INTO audit_log (table_name, operation, row_id, old_data)
+            VALUES (TG_TABLE_NAME, TG_OP::audit_operation, pk_value::bigint, to_jsonb(OLD));
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+"""
+
+SETUP = """
+    INSERT INTO sports (name) VALUES ('Football') ON CONFLICT DO NOTHING;
+    INSERT INTO bookies (name, description) VALUES ('BenchBookie', 'Audit benchmark') ON CONFLICT DO NOTHING;
+    INSERT INTO competitions (name, country, sport) VALUES ('Bench League', 'ZZ', 'Football');
+    INSERT INTO teams (name, country, sport) VALUES ('Bench Home', 'ZZ', 'Football'), ('Bench Away', 'ZZ', 'Football');
+    INSERT INTO events (date, competition_id, team_a_id, team_b_id, status)
+    SELECT CURRENT_TIMESTAMP + INTERVAL '1 day', c.id, a.id, b.id, 'prematch'
+    FROM competitions c, teams a, teams b
+    WHERE c.name = 'Bench League' AND a.name = 'Bench Home' AND b.name = 'Bench Away';
+"""
+
+INSERT_CUSTOMERS = """
+    INSERT INTO customers (username, password, real_name, currency, status, balance)
+    SELECT 'audit_bench_' || n, 'x', 'Audit Benchmark', 'USD', 'active', ROW(1000000, 'USD')::money_amount
+    FROM generate_series(1, $1) AS n
+    RETURNING id
+"""
+
+INSERT_BETS = """
+    INSERT INTO bets (
+        bookie, customer_id, bookie_bet_id, bet_type, event_id, sport,
+        placement_status, stake, odds, placement_data
+    )
+    SELECT
+        'BenchBookie', ($2::bigint[])[1 + n % array_length($2::bigint[], 1)], 'AUDIT-BENCH-' || n, 'match_winner',
+        $1, 'Football', 'placed', ROW(10, 'USD')::money_amount, 2.5,
+        jsonb_build_object('selection', (ARRAY['home_win', 'draw', 'away_win'])[1 + n % 3])
+    FROM generate_series(1, $3) AS n
+"""
+
+
+async def settle(conn: asyncpg.Connection, row_level: bool, bet_count: int, customer_count: int) -> tuple[float, float, int]:
+    tr = conn.transaction()
+    await tr.start()
+    try:
+        await conn.execute(SETUP)
+        event_id = await conn.fetchval(
+            "SELECT e.id FROM events e JOIN competitions c ON c.id = e.competition_id WHERE c.name = 'Bench League'"
+        )
+        customer_ids = [row["id"] for row in await conn.fetch(INSERT_CUSTOMERS, customer_count)]
+        # Stakes are not debited: this measures settlement, not placement
+        await conn.execute("SELECT set_config('app.bulk_balance_writes', 'on', true)")
+        await conn.execute(INSERT_BETS, event_id, customer_ids, bet_count)
+        # Plan the settlement for this many bets, not for the empty tables
+        await conn.execute("ANALYZE bets, customers, balance_changes")
+
+        if row_level:
+            await conn.execute(ROW_LEVEL_AUDIT)
+            for table in AUDITED_TABLES:
+                for event in ("insert", "update", "delete"):
+                    await conn.execute(f"DROP TRIGGER audit_{table}_on_{event} ON {table}")
+                await conn.execute(f"""
+                    CREATE TRIGGER audit_{table}_row_level AFTER INSERT OR UPDATE OR DELETE ON {table}
+                    FOR EACH ROW EXECUTE FUNCTION audit_trigger_function_row_level()
+                """)
+
+        audit_before = await conn.fetchval("SELECT COUNT(*) FROM audit_log")
+        start = time.perf_counter()
+        plan = await conn.fetch(
+            "EXPLAIN ANALYZE " + SETTLE_EVENT_QUERY,
+            event_id, ["match_winner"] * 3, ["home_win", "draw", "away_win"], ["win", "lose", "lose"], None
+        )
+        elapsed = time.perf_counter() - start
+        audit_ms = sum(
+            float(match.group(1))
+            for row in plan
+            if (match := re.match(r"Trigger audit_\w+ on \w+: time=([\d.]+)", row[0]))
+        )
+        audit_rows = await conn.fetchval("SELECT COUNT(*) FROM audit_log") - audit_before
+        return elapsed, audit_ms / 1000, audit_rows
+    finally:
+        await tr.rollback()
+
+
+async def main(bet_count: int, customer_count: int) -> None:
+    settings = get_db_settings()
+    conn = await asyncpg.connect(
+        host=settings.db_host,
+        port=settings.db_port,
+        user=settings.db_user,
+        password=settings.db_password,
+        database=settings.db_name,
+    )
+    print(f"bets: {bet_count}, customers: {customer_count}")
+    for row_level in (True, False):
+        elapsed, audit, audit_rows = await settle(conn, row_level, bet_count, customer_count)
+        label = "row-level audit" if row_level else "statement-level audit"
+        print(
+            f"{label:>22}: settle {elapsed * 1000:8.1f} ms ({bet_count / elapsed:7.0f} bets/s), "
+            f"of which audit {audit * 1000:7.1f} ms for {audit_rows} audit rows"
+        )
+    await conn.close()
+
+
+if __name__ == "__main__":
+    bet_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    customer_count = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    asyncio.run(main(bet_count, customer_count))
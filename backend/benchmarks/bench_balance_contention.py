@@ -0,0 +1,92 @@
+# Many concurrent writers on one customer's balance, with and without ledger mode: each
+# transaction inserts one balance change (a debit, or a credit such as a settlement payout).
+# Row mode updates (and audits) the customer row under its lock for every change; ledger
+# mode only appends, and only debits serialize, on the customer's advisory lock.
+#
+# Needs the database (DB_* settings). Creates a throwaway customer per mode and deletes it.
+# Usage (from backend/): python benchmarks/bench_balance_contention.py [writers] [changes_per_writer] [credit_share]
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import asyncpg  # noqa: E402
+
+from database import get_db_settings  # noqa: E402
+
+INSERT_CHANGE = """
+    INSERT INTO balance_changes (customer_id, change_type, delta, description)
+    VALUES ($1, $2, ROW($3, 'USD')::money_amount, 'contention benchmark')
+"""
+
+
+async def connect(ledger: bool) -> asyncpg.Connection:
+    settings = get_db_settings()
+    return await asyncpg.connect(
+        host=settings.db_host,
+        port=settings.db_port,
+        user=settings.db_user,
+        password=settings.db_password,
+        database=settings.db_name,
+        server_settings={"app.balance_ledger": "on" if ledger else "off"},
+    )
+
+
+async def writer(conn: asyncpg.Connection, customer_id: int, changes: int, credit_share: float, latencies: list) -> None:
+    rng = random.Random(id(conn))
+    for _ in range(changes):
+        credit = rng.random() < credit_share
+        start = time.perf_counter()
+        await conn.execute(INSERT_CHANGE, customer_id, "top_up" if credit else "withdrawal", 1 if credit else -1)
+        latencies.append(time.perf_counter() - start)
+
+
+async def run(ledger: bool, writers: int, changes: int, credit_share: float) -> None:
+    admin = await connect(ledger)
+    conns = [await connect(ledger) for _ in range(writers)]
+    customer_id = await admin.fetchval("""
+        INSERT INTO customers (username, password, real_name, currency, status, balance)
+        VALUES ($1, 'x', 'Contention Benchmark', 'USD', 'active', ROW(1000000, 'USD')::money_amount)
+        RETURNING id
+    """, f"contention_bench_{int(time.time() * 1000)}")
+    audit_before = await admin.fetchval("SELECT COUNT(*) FROM audit_log WHERE table_name = 'customers'")
+
+    latencies: list = []
+    start = time.perf_counter()
+    await asyncio.gather(*(writer(conn, customer_id, changes, credit_share, latencies) for conn in conns))
+    elapsed = time.perf_counter() - start
+
+    audit_rows = await admin.fetchval("SELECT COUNT(*) FROM audit_log WHERE table_name = 'customers'") - audit_before
+    balance = await admin.fetchval("SELECT (customer_balance(id, balance)).amount FROM customers WHERE id = $1", customer_id)
+    expected = await admin.fetchval(
+        "SELECT 1000000 + SUM((delta).amount) FROM balance_changes WHERE customer_id = $1", customer_id
+    )
+
+    latencies.sort()
+    total = writers * changes
+    print(
+        f"{'ledger' if ledger else 'row':>6}: {total / elapsed:8.0f} changes/s  "
+        f"p50 {latencies[total // 2] * 1000:6.2f} ms  p99 {latencies[int(total * 0.99)] * 1000:6.2f} ms  "
+        f"customer audit rows {audit_rows:6d}  balance {'ok' if balance == expected else f'MISMATCH {balance} != {expected}'}"
+    )
+
+    await admin.execute("DELETE FROM balance_changes WHERE customer_id = $1", customer_id)
+    await admin.execute("DELETE FROM customers WHERE id = $1", customer_id)
+    for conn in [admin, *conns]:
+        await conn.close()
+
+
+async def main(writers: int, changes: int, credit_share: float) -> None:
+    print(f"writers: {writers}, changes per writer: {changes}, credit share: {credit_share}")
+    for ledger in (False, True):
+        await run(ledger, writers, changes, credit_share)
+
+
+if __name__ == "__main__":
+    writers = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    changes = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    credit_share = float(sys.argv[3]) if len(sys.argv) > 3 else 0.5
+    asyncio.run(main(writers, changes, credit_share))
@@ -0,0 +1,72 @@
+# Monte Carlo liability kernel on a synthetic book: open bets spread over a competition's
+# events and markets, aggregated per selection as SIMULATION_QUERY does, then simulated
+#
+# Usage (from backend/): python benchmarks/bench_liability_simulation.py [bets] [simulations] [events]
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np  # noqa: E402
+
+from simulation import build_markets, simulate_pnl  # noqa: E402
+
+MARKETS = {
+    "match_winner": ("home_win", "draw", "away_win"),
+    "total_points": ("over_2.5", "under_2.5"),
+    "both_teams_score": ("yes", "no"),
+}
+
+
+def make_rows(bet_count: int, event_count: int, rng: np.random.Generator) -> list[dict]:
+    # One row per (event, bet_type, selection) with the sums the database would return
+    book = {}
+    events = rng.integers(1, event_count + 1, bet_count)
+    bet_types = rng.integers(0, len(MARKETS), bet_count)
+    stakes = rng.uniform(1, 200, bet_count).round(2)
+    names = list(MARKETS)
+    for event_id, type_index, stake, choice in zip(events, bet_types, stakes, rng.random(bet_count)):
+        bet_type = names[type_index]
+        selections = MARKETS[bet_type]
+        selection = selections[int(choice * len(selections))]
+        odds = len(selections) * rng.uniform(0.75, 1.05)
+        row = book.setdefault((int(event_id), bet_type, selection), [0, 0.0, 0.0, 0.0])
+        row[0] += 1
+        row[1] += stake
+        row[2] += stake * odds
+        row[3] += stake / odds
+    return [
+        {
+            "event_id": event_id, "bet_type": bet_type, "selection": selection, "bet_count": count,
+            "stake": stake, "potential_payout": payout, "implied_probability": weighted / stake,
+        }
+        for (event_id, bet_type, selection), (count, stake, payout, weighted) in sorted(book.items())
+    ]
+
+
+def main(bet_count: int, simulations: int, event_count: int) -> None:
+    rng = np.random.default_rng(1)
+    rows = make_rows(bet_count, event_count, rng)
+    total_stake = sum(row["stake"] for row in rows)
+
+    start = time.perf_counter()
+    payouts, cumulative = build_markets(rows)
+    built = time.perf_counter() - start
+
+    start = time.perf_counter()
+    summary = simulate_pnl(payouts, cumulative, total_stake, simulations, seed=1)
+    simulated = time.perf_counter() - start
+
+    print(f"bets: {bet_count}, events: {event_count}, markets: {len(payouts)}, simulations: {simulations}")
+    print(f"build markets: {built * 1000:8.1f} ms")
+    print(f"simulate:      {simulated * 1000:8.1f} ms  ({simulations * len(payouts) / simulated / 1e6:.1f}M market settlements/s)")
+    print(f"expected pnl: {summary['expected_pnl']:.2f}, VaR95: {summary['value_at_risk_95']:.2f}, "
+          f"VaR99: {summary['value_at_risk_99']:.2f}")
+
+
+if __name__ == "__main__":
+    bet_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    simulations = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    event_count = int(sys.argv[3]) if len(sys.argv) > 3 else 500
+    main(bet_count, simulations, event_count)
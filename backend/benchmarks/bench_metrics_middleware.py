@@ -0,0 +1,120 @@
+# Request throughput through the old BaseHTTPMiddleware metrics layer vs. the pure ASGI one
+#
+# Usage (from backend/): python benchmarks/bench_metrics_middleware.py [requests] [repeats]
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import FastAPI, Request  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware  # noqa: E402
+
+from database import begin_query_tracking, end_query_tracking  # noqa: E402
+from main import MetricsMiddleware  # noqa: E402
+from metrics import (  # noqa: E402
+    http_requests_total,
+    http_request_duration_seconds,
+    db_queries_per_request,
+    errors_total,
+)
+
+
+class BaseHTTPMetricsMiddleware(BaseHTTPMiddleware):
+    # The middleware main.py used before, kept here as the baseline
+    async def dispatch(self, request: Request, call_next):
+        method = request.method
+        path = request.url.path
+
+        if path == "/metrics":
+            return await call_next(request)
+
+        start_time = time.time()
+        status_code = 200
+        sanitized_path = self._sanitize_path(path)
+        query_tracking = begin_query_tracking()
+
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            return response
+        except Exception as e:
+            status_code = 500
+            errors_total.labels(type=type(e).__name__, endpoint=sanitized_path).inc()
+            raise
+        finally:
+            duration = time.time() - start_time
+            http_requests_total.labels(method=method, endpoint=sanitized_path, status=str(status_code)).inc()
+            http_request_duration_seconds.labels(method=method, endpoint=sanitized_path).observe(duration)
+            db_queries_per_request.labels(endpoint=sanitized_path).observe(end_query_tracking(query_tracking))
+
+    def _sanitize_path(self, path: str) -> str:
+        import re
+        path = re.sub(r'/\d+', '/:id', path)
+        path = re.sub(r'/[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}', '/:uuid', path, flags=re.IGNORECASE)
+        return path
+
+
+def make_app(middleware) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/teams/{team_id}")
+    async def get_team(team_id: int):
+        return {"id": team_id, "name": "Arsenal", "country": "England", "sport": "Football"}
+
+    app.add_middleware(middleware)
+    return app
+
+
+async def call(app, path: str) -> None:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": b"", "headers": [(b"host", b"bench")], "server": ("bench", 80), "client": ("bench", 1),
+    }
+
+    request_sent = False
+    response_complete = asyncio.Event()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # Like a server: nothing more from the client until the response has gone out
+        await response_complete.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and not message.get("more_body", False):
+            response_complete.set()
+
+    await app(scope, receive, send)
+
+
+async def bench(app, request_count: int, repeats: int) -> float:
+    paths = [f"/api/teams/{i}" for i in range(request_count)]
+    await call(app, paths[0])
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for path in paths:
+            await call(app, path)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+async def main(request_count: int, repeats: int) -> None:
+    before = await bench(make_app(BaseHTTPMetricsMiddleware), request_count, repeats)
+    after = await bench(make_app(MetricsMiddleware), request_count, repeats)
+    print(f"requests: {request_count}, best of {repeats}")
+    print(f"BaseHTTPMiddleware: {request_count / before:9.0f} req/s  {before / request_count * 1e6:7.1f} us/req")
+    print(f"pure ASGI:          {request_count / after:9.0f} req/s  {after / request_count * 1e6:7.1f} us/req")
+    print(f"speedup:            {before / after:9.2f}x")
+
+
+if __name__ == "__main__":
+    request_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    asyncio.run(main(request_count, repeats))
@@ -0,0 +1,82 @@
+# Per-row cost of the validated response path vs. the trusted-row fast path
+#
+# Usage (from backend/): python benchmarks/bench_serialization.py [rows] [repeats]
+import json
+import sys
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from pathlib import Path
+from types import MappingProxyType
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pydantic import TypeAdapter  # noqa: E402
+
+from models import Bet  # noqa: E402
+from serialization import dumps  # noqa: E402
+
+
+def make_rows(count: int) -> list[dict]:
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            "id": i,
+            "bookie": "Bet365",
+            "customer_id": i % 50 + 1,
+            "bookie_bet_id": f"B365-{i:08d}",
+            "bet_type": "match_winner",
+            "event_id": i % 200 + 1,
+            "sport": "Football",
+            "placement_status": "placed",
+            "outcome": None,
+            # asyncpg decodes money_amount to a read-only record; a mapping proxy stands in for it
+            "stake": MappingProxyType({"amount": Decimal("25.5000"), "currency": "GBP"}),
+            "odds": Decimal("2.1000000000"),
+            "placement_data": {"selection": "home_win", "market": "1X2"},
+            "created_at": now,
+            "updated_at": now,
+        }
+        for i in range(count)
+    ]
+
+
+def validated_path(rows: list[dict]) -> bytes:
+    # What the routers did before: build models, then FastAPI re-validates
+    # them against response_model and serializes the result
+    bets = [Bet(**row) for row in rows]
+    validated = response_adapter.validate_python(bets, from_attributes=True)
+    content = response_adapter.dump_python(validated, mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+def trusted_path(rows: list[dict]) -> bytes:
+    return dumps(rows)
+
+
+def bench(fn, rows: list[dict], repeats: int) -> float:
+    fn(rows)
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(rows)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+response_adapter = TypeAdapter(List[Bet])
+
+if __name__ == "__main__":
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    rows = make_rows(row_count)
+    
+    assert json.loads(validated_path(rows)) == json.loads(trusted_path(rows)), "outputs differ"
+    
+    before = bench(validated_path, rows, repeats)
+    after = bench(trusted_path, rows, repeats)
+    print(f"rows per page: {row_count}, best of {repeats}")
+    print(f"validated models: {before * 1000:8.2f} ms/page  {before / row_count * 1e6:7.2f} us/row")
+    print(f"trusted rows:     {after * 1000:8.2f} ms/page  {after / row_count * 1e6:7.2f} us/row")
+    print(f"speedup:          {before / after:8.1f}x")
@@ -0,0 +1,110 @@
+# In-process TTL result cache with LRU eviction and request coalescing
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Iterable, Optional
+from conditional import content_tag
+from logger_config import get_logger
+from metrics import analytics_cache_requests_total
+
+logger = get_logger(__name__)
+
+
+class _Entry:
+    __slots__ = ("value", "stored_at", "tables", "tag")
+
+    def __init__(self, value: Any, stored_at: float, tables: frozenset) -> None:
+        self.value = value
+        self.stored_at = stored_at
+        self.tables = tables
+        self.tag: Optional[str] = None
+
+
+class ResultCache:
+    def __init__(self, max_entries: int = 256) -> None:
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        # Bumped by invalidate() so loads that started before a write are not stored
+        self._generation = 0
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: float,
+        tables: Iterable[str],
+        max_staleness: Optional[float] = None,
+    ) -> tuple[Any, float]:
+        # Returns the value and its age in seconds; max_staleness can only tighten the TTL
+        name = key[0] if isinstance(key, tuple) else str(key)
+        freshness = ttl if max_staleness is None else min(ttl, max_staleness)
+        now = time.monotonic()
+
+        entry = self._entries.get(key)
+        if entry is not None and now - entry.stored_at <= freshness:
+            self._entries.move_to_end(key)
+            analytics_cache_requests_total.labels(endpoint=name, result="hit").inc()
+            return entry.value, now - entry.stored_at
+
+        # Concurrent identical requests share the one query already in flight
+        future = self._inflight.get(key)
+        if future is not None:
+            analytics_cache_requests_total.labels(endpoint=name, result="coalesced").inc()
+            return await asyncio.shield(future), 0.0
+
+        analytics_cache_requests_total.labels(endpoint=name, result="miss").inc()
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        generation = self._generation
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception retrieved when nobody else was waiting on it
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+        future.set_result(value)
+        if generation == self._generation:
+            self._store(key, value, frozenset(tables))
+        return value, 0.0
+
+    def _store(self, key: Hashable, value: Any, tables: frozenset) -> None:
+        self._entries[key] = _Entry(value, time.monotonic(), tables)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def tag(self, key: Hashable, value: Any) -> str:
+        # Content tag of a value returned by get_or_load, computed once per stored entry
+        entry = self._entries.get(key)
+        if entry is None or entry.value is not value:
+            return content_tag(value)
+        if entry.tag is None:
+            entry.tag = content_tag(value)
+        return entry.tag
+
+    def invalidate(self, *tables: str) -> None:
+        # Drops every entry computed from any of the given tables (all entries if none given)
+        self._generation += 1
+        if not tables:
+            self._entries.clear()
+            return
+        changed = set(tables)
+        stale = [key for key, entry in self._entries.items() if entry.tables & changed]
+        for key in stale:
+            del self._entries[key]
+        if stale:
+            logger.debug("Result cache invalidated - Tables: %s, Entries: %d", ",".join(tables), len(stale))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+analytics_cache = ResultCache(max_entries=256)
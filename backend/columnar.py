@@ -0,0 +1,72 @@
+# Columnar responses: ?format=columnar returns {"columns": [...], "data": {column: [values]}},
+# so repeated keys are encoded once per column instead of once per row
+from typing import Any, Optional, Sequence
+from fastapi import HTTPException, Query, Response, status
+from database import execute_query, execute_records
+from projection import drop_columns
+from serialization import TrustedJSONResponse
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:  # optional: only needed for format=arrow
+    pyarrow = None
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+FORMAT_QUERY = Query(
+    "json", alias="format", pattern="^(json|columnar)$",
+    description="json (array of objects) or columnar ({columns, data})"
+)
+ANALYTICS_FORMAT_QUERY = Query(
+    "json", alias="format", pattern="^(json|columnar|arrow)$",
+    description="json (array of objects), columnar ({columns, data}) or arrow (Arrow IPC stream)"
+)
+
+
+def columns_from_records(columns: Sequence[str], records: Sequence[Sequence], hidden: Sequence[str] = ()) -> dict:
+    # Transposed straight from the asyncpg records: no dict is built per row
+    values = zip(*records) if records else [() for _ in columns]
+    data = {column: list(column_values) for column, column_values in zip(columns, values) if column not in hidden}
+    return {"columns": list(data), "data": data}
+
+
+def columns_from_rows(rows: Sequence[dict]) -> dict:
+    # For results already shaped in Python (e.g. cached analytics)
+    columns = list(rows[0]) if rows else []
+    return {"columns": columns, "data": {column: [row[column] for row in rows] for column in columns}}
+
+
+async def list_response(
+    query: str, *args, output_format: str, hidden: Sequence[str] = (), headers: Optional[dict] = None
+) -> tuple[Response, Sequence]:
+    # Returns the response and the fetched rows (dicts or records), which both
+    # support row[column] for set_next_cursor
+    if output_format == "columnar":
+        columns, records = await execute_records(query, *args)
+        return TrustedJSONResponse(columns_from_records(columns, records, hidden), headers=headers), records
+    rows = await execute_query(query, *args)
+    return TrustedJSONResponse(drop_columns(rows, hidden), headers=headers), rows
+
+
+def arrow_ipc(rows: Sequence[dict]) -> bytes:
+    if pyarrow is None:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail="Arrow output is not available on this server (pyarrow is not installed)"
+        )
+    table = pyarrow.Table.from_pylist(list(rows))
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def analytics_response(rows: Any, output_format: str, response: Response) -> Any:
+    # Tabular analytics results in the requested format; headers already set on the
+    # injected response (e.g. Age) are carried over
+    if output_format == "json":
+        return rows
+    if output_format == "arrow":
+        return Response(arrow_ipc(rows), media_type=ARROW_MEDIA_TYPE, headers=dict(response.headers))
+    return TrustedJSONResponse(columns_from_rows(rows), headers=dict(response.headers))
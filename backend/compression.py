@@ -0,0 +1,136 @@
+# Response compression (brotli when the client accepts it and the brotli package is
+# installed, gzip otherwise). Pure ASGI like MetricsMiddleware; bodies below the size
+# threshold, already-encoded responses and event streams pass through untouched.
+import gzip
+import io
+from typing import Optional
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only without it
+    brotli = None
+
+MINIMUM_SIZE = 1024
+GZIP_LEVEL = 6
+# Quality 4 keeps brotli's CPU cost near gzip -6 while still compressing JSON better
+BROTLI_QUALITY = 4
+UNCOMPRESSED_TYPES = ("text/event-stream", "application/vnd.apache.arrow.stream")
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = set()
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        name, _, quality = params.strip().partition("=")
+        try:
+            if name.strip() == "q" and float(quality) == 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(coding.strip().lower())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+class _GzipEncoder:
+    def __init__(self) -> None:
+        self.buffer = io.BytesIO()
+        self.file = gzip.GzipFile(mode="wb", fileobj=self.buffer, compresslevel=GZIP_LEVEL)
+
+    def _drain(self) -> bytes:
+        data = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return data
+
+    def compress(self, data: bytes) -> bytes:
+        self.file.write(data)
+        self.file.flush()
+        return self._drain()
+
+    def finish(self) -> bytes:
+        self.file.close()
+        return self._drain()
+
+
+class _BrotliEncoder:
+    def __init__(self) -> None:
+        self.compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.process(data) + self.compressor.flush()
+
+    def finish(self) -> bytes:
+        return self.compressor.finish()
+
+
+ENCODERS = {"gzip": _GzipEncoder, "br": _BrotliEncoder}
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        encoder = None
+
+        async def send_compressed(message):
+            nonlocal start_message, encoder
+            if message["type"] == "http.response.start":
+                # Held back until the first body chunk shows whether compressing pays off
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+
+            if encoder is None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                body = message.get("body", b"")
+                more_body = message.get("more_body", False)
+                skip = (
+                    "content-encoding" in headers
+                    or headers.get("content-type", "").startswith(UNCOMPRESSED_TYPES)
+                    or start_message["status"] in (204, 304)
+                    or (not more_body and len(body) < self.minimum_size)
+                )
+                if skip:
+                    await send(start_message)
+                    start_message = None
+                    await send(message)
+                    return
+                encoder = ENCODERS[encoding]()
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if "content-length" in headers:
+                    del headers["content-length"]
+                data = encoder.compress(body)
+                if not more_body:
+                    data += encoder.finish()
+                    headers["Content-Length"] = str(len(data))
+                await send(start_message)
+                await send({"type": "http.response.body", "body": data, "more_body": more_body})
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            data = encoder.compress(body)
+            if not more_body:
+                data += encoder.finish()
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
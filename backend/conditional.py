@@ -0,0 +1,57 @@
+# Conditional GET: validators come from data the server already holds (a cached table's
+# or result's content tag, or a cheap aggregate query), so a matching If-None-Match /
+# If-Modified-Since is answered with 304 before the real query or any serialization runs.
+# ETags are weak: CompressionMiddleware may re-encode the same representation.
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Optional
+from fastapi import HTTPException, Request, Response, status
+from serialization import dumps
+
+
+def content_tag(content: Any) -> str:
+    return hashlib.blake2b(dumps(content), digest_size=12).hexdigest()
+
+
+def request_etag(request: Request, tag: str) -> str:
+    # The same data under different filters, pages or formats is a different representation
+    key = f"{tag}|{request.url.path}?{request.url.query}"
+    return f'W/"{hashlib.blake2b(key.encode(), digest_size=12).hexdigest()}"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+
+def _not_modified_since(if_modified_since: str, last_modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # HTTP dates have whole-second precision
+    return last_modified.replace(microsecond=0) <= since
+
+
+def conditional_get(request: Request, response: Response, tag: str, last_modified: Optional[datetime] = None) -> None:
+    # Raises 304 when the client's copy is current; otherwise sets the validators on the response
+    headers = {"ETag": request_etag(request, tag)}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-Modified-Since is ignored when If-None-Match is present
+        current = _etag_matches(if_none_match, headers["ETag"])
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        current = bool(if_modified_since and last_modified) and _not_modified_since(if_modified_since, last_modified)
+    if current:
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
@@ -1,10 +1,21 @@
-from typing import AsyncGenerator, Optional, Union
+from typing import AsyncGenerator, Callable, Optional, Union
+import asyncio
 import asyncpg
 from contextlib import asynccontextmanager
+from contextvars import ContextVar, Token
 from functools import lru_cache
+import json
 import os
+import sys
+import time
 from pydantic_settings import BaseSettings
 from logger_config import get_logger
+from metrics import (
+    db_queries_total,
+    db_query_duration_seconds,
+    db_pool_acquire_duration_seconds,
+    db_slow_queries_total,
+)
 
 logger = get_logger(__name__)
 
@@ -15,6 +26,14 @@ class DatabaseSettings(BaseSettings):
     db_user: str = os.getenv("DB_USER", "analyst_user")
     db_password: str = os.getenv("DB_PASSWORD", "analyst_password")
     db_name: str = os.getenv("DB_NAME", "analyst_platform")
+    # Queries slower than this are logged; 0 disables the slow query log
+    db_slow_query_ms: float = float(os.getenv("DB_SLOW_QUERY_MS", "500"))
+    # Minimum seconds between background refreshes of the customer_stats view
+    customer_stats_refresh_seconds: float = float(os.getenv("CUSTOMER_STATS_REFRESH_SECONDS", "5"))
+    # Processes running liability simulations (started on first use)
+    simulation_workers: int = int(os.getenv("SIMULATION_WORKERS", "2"))
+    # Seconds between customer balance snapshots (ledger mode reads snapshot plus later changes)
+    balance_snapshot_seconds: float = float(os.getenv("BALANCE_SNAPSHOT_SECONDS", "30"))
     
     class Config:
         env_file = ".env"
@@ -29,6 +48,57 @@ def get_db_settings() -> DatabaseSettings:
 # Global connection pool
 _pool: Optional[asyncpg.Pool] = None
 
+# Caps concurrent snapshot groups so their connections (one exporter plus one
+# per query) can never exhaust the pool while waiting on each other
+_snapshot_group_limit = asyncio.Semaphore(2)
+
+# Per-request query counter, installed by the HTTP metrics middleware
+_request_query_count: ContextVar[Optional[list]] = ContextVar("request_query_count", default=None)
+
+
+def begin_query_tracking() -> Token:
+    # A one-element list so tasks spawned from the request share the same counter
+    return _request_query_count.set([0])
+
+
+def end_query_tracking(token: Token) -> int:
+    counter = _request_query_count.get()
+    _request_query_count.reset(token)
+    return counter[0] if counter else 0
+
+
+def _statement_name() -> str:
+    # Name queries after the function that issued them (e.g. "get_bets"),
+    # which is stable across the dynamically built SQL variants
+    return sys._getframe(2).f_code.co_name
+
+
+def _record_query(query: str, statement: str, duration: float) -> None:
+    operation = query.lstrip().split(None, 1)[0].lower() if query.strip() else "unknown"
+    db_queries_total.labels(operation=operation, statement=statement).inc()
+    db_query_duration_seconds.labels(operation=operation, statement=statement).observe(duration)
+    
+    counter = _request_query_count.get()
+    if counter is not None:
+        counter[0] += 1
+    
+    threshold_ms = get_db_settings().db_slow_query_ms
+    if threshold_ms > 0 and duration * 1000 >= threshold_ms:
+        db_slow_queries_total.labels(statement=statement).inc()
+        logger.warning("Slow query - Statement: %s, Duration: %.1fms", statement, duration * 1000)
+
+
+async def _init_connection(conn: asyncpg.Connection) -> None:
+    # JSONB decodes straight to dicts/lists and accepts Python objects as parameters.
+    # money_amount composites and the enum types use asyncpg's built-in binary codecs,
+    # which decode them to (amount, currency) records and plain strings.
+    await conn.set_type_codec(
+        'jsonb',
+        encoder=json.dumps,
+        decoder=json.loads,
+        schema='pg_catalog',
+    )
+
 
 async def create_pool() -> asyncpg.Pool:
     global _pool
@@ -51,6 +121,7 @@ async def create_pool() -> asyncpg.Pool:
             min_size=5,
             max_size=20,
             command_timeout=60,
+            init=_init_connection,
         )
         logger.info("Database connection pool created successfully")
         return _pool
@@ -66,6 +137,19 @@ async def create_pool() -> asyncpg.Pool:
         raise
 
 
+async def connect_listener() -> asyncpg.Connection:
+    # Dedicated connection for LISTEN; it stays open for the life of the worker,
+    # so it is not taken from the pool
+    settings = get_db_settings()
+    return await asyncpg.connect(
+        host=settings.db_host,
+        port=settings.db_port,
+        user=settings.db_user,
+        password=settings.db_password,
+        database=settings.db_name,
+    )
+
+
 async def close_pool() -> None:
     global _pool
     if _pool:
@@ -73,20 +157,132 @@ async def close_pool() -> None:
         _pool = None
 
 
+class UnitOfWork:
+    # One pool connection shared by every query of a request, checked out on first use
+    # and optionally wrapped in a single transaction. Only the task that created the
+    # unit uses it: tasks it spawns (asyncio.gather, background reloads) take their own
+    # connections, since one connection cannot run statements concurrently.
+    def __init__(self) -> None:
+        self.transactional = False
+        self.finished = False
+        self._task = asyncio.current_task()
+        self._acquire = None
+        self._connection: Optional[asyncpg.Connection] = None
+        self._transaction = None
+        self._after_commit: list = []
+    
+    def active(self) -> bool:
+        return not self.finished and asyncio.current_task() is self._task
+    
+    async def connection(self) -> asyncpg.Connection:
+        if self._connection is None:
+            global _pool
+            if _pool is None:
+                await create_pool()
+            start = time.perf_counter()
+            self._acquire = _pool.acquire()
+            self._connection = await self._acquire.__aenter__()
+            db_pool_acquire_duration_seconds.observe(time.perf_counter() - start)
+            if self.transactional:
+                await self._start_transaction()
+        return self._connection
+    
+    async def begin(self) -> None:
+        # Statements already run (e.g. by an earlier dependency) stay outside the transaction
+        self.transactional = True
+        if self._connection is not None and self._transaction is None:
+            await self._start_transaction()
+    
+    async def _start_transaction(self) -> None:
+        self._transaction = self._connection.transaction()
+        await self._transaction.start()
+    
+    def after_commit(self, callback: Callable[[], None]) -> None:
+        if self._transaction is None:
+            callback()
+        else:
+            self._after_commit.append(callback)
+    
+    async def finish(self, commit: bool) -> None:
+        if self.finished:
+            return
+        self.finished = True
+        try:
+            if self._transaction is not None:
+                if commit:
+                    await self._transaction.commit()
+                else:
+                    await self._transaction.rollback()
+        finally:
+            if self._acquire is not None:
+                await self._acquire.__aexit__(None, None, None)
+            self._acquire = self._connection = self._transaction = None
+        if commit:
+            for callback in self._after_commit:
+                callback()
+
+
+_unit_of_work: ContextVar[Optional[UnitOfWork]] = ContextVar("unit_of_work", default=None)
+
+
+def current_unit_of_work() -> Optional[UnitOfWork]:
+    unit = _unit_of_work.get()
+    return unit if unit is not None and unit.active() else None
+
+
+async def begin_unit_of_work(transactional: bool = False) -> UnitOfWork:
+    # Installs a unit of work for the current task (or reuses the active one)
+    unit = current_unit_of_work()
+    if unit is None:
+        unit = UnitOfWork()
+        _unit_of_work.set(unit)
+    if transactional:
+        await unit.begin()
+    return unit
+
+
+async def finish_unit_of_work(commit: bool) -> None:
+    unit = current_unit_of_work()
+    if unit is not None:
+        await unit.finish(commit)
+
+
+def after_commit(callback: Callable[[], None]) -> None:
+    # Runs callback once the current transaction commits (immediately outside one),
+    # so caches are not invalidated before other connections can see the change
+    unit = current_unit_of_work()
+    if unit is None:
+        callback()
+    else:
+        unit.after_commit(callback)
+
+
 @asynccontextmanager
 async def get_db_connection() -> AsyncGenerator[asyncpg.Connection, None]:
+    unit = current_unit_of_work()
+    if unit is not None:
+        yield await unit.connection()
+        return
+    
     global _pool
     if _pool is None:
         await create_pool()
     
+    start = time.perf_counter()
     async with _pool.acquire() as connection:
+        db_pool_acquire_duration_seconds.observe(time.perf_counter() - start)
         yield connection
 
 
-async def execute_query(query: str, *args) -> list[dict]:
+async def execute_query(query: str, *args, statement: Optional[str] = None) -> list[dict]:
+    statement = statement or _statement_name()
     try:
         async with get_db_connection() as conn:
-            rows = await conn.fetch(query, *args)
+            start = time.perf_counter()
+            try:
+                rows = await conn.fetch(query, *args)
+            finally:
+                _record_query(query, statement, time.perf_counter() - start)
             logger.debug("Query executed successfully - Rows returned: %d", len(rows))
             return [dict(row) for row in rows]
     except Exception as e:
@@ -94,10 +290,38 @@ async def execute_query(query: str, *args) -> list[dict]:
         raise
 
 
-async def execute_one(query: str, *args) -> Optional[dict]:
+async def execute_records(query: str, *args, statement: Optional[str] = None) -> tuple[list[str], list[asyncpg.Record]]:
+    # Column names and raw records, for callers that lay the rows out themselves. fetch()
+    # goes through the connection's statement cache; only an empty result needs the
+    # (uncached) prepare for its column names.
+    statement = statement or _statement_name()
     try:
         async with get_db_connection() as conn:
-            row = await conn.fetchrow(query, *args)
+            start = time.perf_counter()
+            try:
+                records = await conn.fetch(query, *args)
+                if records:
+                    columns = list(records[0].keys())
+                else:
+                    columns = [attribute.name for attribute in (await conn.prepare(query)).get_attributes()]
+            finally:
+                _record_query(query, statement, time.perf_counter() - start)
+            logger.debug("Query executed successfully - Rows returned: %d", len(records))
+            return columns, records
+    except Exception as e:
+        logger.error("Database query error: %s - Query: %s", e, query[:100], exc_info=True)
+        raise
+
+
+async def execute_one(query: str, *args, statement: Optional[str] = None) -> Optional[dict]:
+    statement = statement or _statement_name()
+    try:
+        async with get_db_connection() as conn:
+            start = time.perf_counter()
+            try:
+                row = await conn.fetchrow(query, *args)
+            finally:
+                _record_query(query, statement, time.perf_counter() - start)
             logger.debug("Query executed successfully - Row found: %s", row is not None)
             return dict(row) if row else None
     except Exception as e:
@@ -105,10 +329,15 @@ async def execute_one(query: str, *args) -> Optional[dict]:
         raise
 
 
-async def execute_insert(query: str, *args) -> int:
+async def execute_insert(query: str, *args, statement: Optional[str] = None) -> int:
+    statement = statement or _statement_name()
     try:
         async with get_db_connection() as conn:
-            result = await conn.fetchval(query, *args)
+            start = time.perf_counter()
+            try:
+                result = await conn.fetchval(query, *args)
+            finally:
+                _record_query(query, statement, time.perf_counter() - start)
             logger.debug("Insert executed successfully - Row ID: %s", result)
             return result
     except Exception as e:
@@ -116,10 +345,15 @@ async def execute_insert(query: str, *args) -> int:
         raise
 
 
-async def execute_update(query: str, *args) -> int:
+async def execute_update(query: str, *args, statement: Optional[str] = None) -> int:
+    statement = statement or _statement_name()
     try:
         async with get_db_connection() as conn:
-            result = await conn.execute(query, *args)
+            start = time.perf_counter()
+            try:
+                result = await conn.execute(query, *args)
+            finally:
+                _record_query(query, statement, time.perf_counter() - start)
             affected = int(result.split()[-1]) if result else 0
             logger.debug("Update/Delete executed successfully - Rows affected: %d", affected)
             return affected
@@ -127,3 +361,41 @@ async def execute_update(query: str, *args) -> int:
         logger.error("Database update/delete error: %s - Query: %s", e, query[:100], exc_info=True)
         raise
 
+
+
+async def _fetch_in_snapshot(snapshot_id: str, name: str, query: str, args: tuple) -> tuple[list[dict], float]:
+    async with get_db_connection() as conn:
+        async with conn.transaction(isolation="repeatable_read", readonly=True):
+            # SET TRANSACTION SNAPSHOT does not accept bind parameters
+            await conn.execute("SET TRANSACTION SNAPSHOT '%s'" % snapshot_id.replace("'", "''"))
+            start = time.perf_counter()
+            try:
+                rows = await conn.fetch(query, *args)
+            finally:
+                duration = time.perf_counter() - start
+                _record_query(query, name, duration)
+            return [dict(row) for row in rows], duration
+
+
+async def execute_snapshot_queries(queries: dict[str, tuple]) -> tuple[dict[str, list[dict]], dict[str, float]]:
+    # Runs each named (query, *args) concurrently on its own connection. All of them
+    # import one exported snapshot, so the results are mutually consistent while the
+    # total latency is bounded by the slowest query. Returns rows and seconds per name.
+    async with _snapshot_group_limit:
+        try:
+            async with get_db_connection() as conn:
+                async with conn.transaction(isolation="repeatable_read", readonly=True):
+                    # The exporting transaction must stay open until every importer has
+                    # run SET TRANSACTION SNAPSHOT, so it spans the whole gather
+                    snapshot_id = await conn.fetchval("SELECT pg_export_snapshot()")
+                    results = await asyncio.gather(*(
+                        _fetch_in_snapshot(snapshot_id, name, query, tuple(args))
+                        for name, (query, *args) in queries.items()
+                    ))
+        except Exception as e:
+            logger.error("Snapshot query group error: %s - Queries: %s", e, ", ".join(queries), exc_info=True)
+            raise
+    
+    rows = {name: result[0] for name, result in zip(queries, results)}
+    timings = {name: result[1] for name, result in zip(queries, results)}
+    return rows, timings
@@ -0,0 +1,204 @@
+# In-memory liability per event: what each selection would cost if it won, built from the
+# open (placed, unsettled) bets. Loaded once at startup; afterwards only the events named in
+# bets change notifications (the row_changes channel /api/stream uses) are re-aggregated, so
+# a lookup is a dict read and the top-N ranking is rebuilt at most once per change batch.
+import asyncio
+import heapq
+import json
+from decimal import Decimal
+from itertools import groupby
+from typing import Iterable, Optional
+from database import execute_query
+from notifications import notification_hub
+from stream import STREAM_CHANNEL
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+# Seconds to gather a burst of bet changes before re-aggregating the events they touch
+REFRESH_DELAY_SECONDS = 0.1
+RETRY_SECONDS = 1.0
+
+EXPOSURE_QUERY = """
+    SELECT
+        event_id,
+        bet_type,
+        COALESCE(placement_data->>'selection', '') AS selection,
+        (stake).currency AS currency,
+        COUNT(*) AS bet_count,
+        SUM((stake).amount) AS stake,
+        ROUND(SUM((stake).amount * odds), 4) AS potential_payout
+    FROM bets
+    WHERE placement_status = 'placed' AND outcome IS NULL{condition}
+    GROUP BY 1, 2, 3, 4
+    ORDER BY 1, 2, 3, 4
+"""
+
+
+def build_event_exposure(event_id: int, rows: Iterable[dict]) -> dict:
+    # rows: one per (bet_type, selection, currency), as EXPOSURE_QUERY returns them
+    markets = []
+    totals: dict[str, dict] = {}
+    for bet_type, selections in groupby(rows, key=lambda row: row["bet_type"]):
+        selections = list(selections)
+        market_stake: dict[str, Decimal] = {}
+        for row in selections:
+            market_stake[row["currency"]] = market_stake.get(row["currency"], Decimal(0)) + row["stake"]
+        worst_loss: dict[str, Decimal] = {}
+        market = []
+        for row in selections:
+            currency = row["currency"]
+            # Selections of a market exclude each other: the winner's payout is owed, every stake is kept
+            net_if_wins = market_stake[currency] - row["potential_payout"]
+            worst_loss[currency] = max(worst_loss.get(currency, Decimal(0)), -net_if_wins)
+            market.append({
+                "selection": row["selection"],
+                "currency": currency,
+                "bet_count": row["bet_count"],
+                "stake": row["stake"],
+                "potential_payout": row["potential_payout"],
+                "net_if_wins": net_if_wins,
+            })
+            total = totals.setdefault(currency, {
+                "currency": currency, "bet_count": 0, "stake": Decimal(0), "worst_case_liability": Decimal(0)
+            })
+            total["bet_count"] += row["bet_count"]
+            total["stake"] += row["stake"]
+        for currency, loss in worst_loss.items():
+            totals[currency]["worst_case_liability"] += loss
+        markets.append({"bet_type": bet_type, "selections": market})
+    return {"event_id": event_id, "markets": markets, "totals": [totals[c] for c in sorted(totals)]}
+
+
+def build_exposures(rows: list[dict]) -> dict[int, dict]:
+    return {
+        event_id: build_event_exposure(event_id, event_rows)
+        for event_id, event_rows in groupby(rows, key=lambda row: row["event_id"])
+    }
+
+
+def rank_exposures(exposures: Iterable[dict], currency: str, limit: int) -> list[dict]:
+    liabilities = (
+        {"event_id": exposure["event_id"], **total}
+        for exposure in exposures
+        for total in exposure["totals"]
+        if total["currency"] == currency
+    )
+    return heapq.nlargest(limit, liabilities, key=lambda row: (row["worst_case_liability"], row["stake"]))
+
+
+class ExposureEngine:
+    def __init__(self) -> None:
+        self._events: dict[int, dict] = {}
+        self._dirty: set[int] = set()
+        self._reload_all = False
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        # currency -> events ordered by liability, rebuilt lazily after changes
+        self._rankings: dict[str, list[dict]] = {}
+        self.loaded = False
+
+    async def start(self) -> None:
+        # Subscribed before the initial load, so changes committed meanwhile are re-aggregated after it
+        await notification_hub.subscribe(STREAM_CHANNEL, self._on_notify, resync=self._resync)
+        await self.load()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Exposure engine started - Events with open bets: %d", len(self._events))
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        notification_hub.unsubscribe(STREAM_CHANNEL, self._on_notify)
+        self.loaded = False
+        self._events.clear()
+        self._rankings.clear()
+
+    def get(self, event_id: int) -> Optional[dict]:
+        # None until loaded (callers then aggregate in the database)
+        if not self.loaded:
+            return None
+        return self._events.get(event_id) or build_event_exposure(event_id, ())
+
+    def top(self, currency: str, limit: int) -> Optional[list[dict]]:
+        if not self.loaded:
+            return None
+        ranking = self._rankings.get(currency)
+        if ranking is None:
+            ranking = self._rankings[currency] = rank_exposures(self._events.values(), currency, len(self._events))
+        return ranking[:limit]
+
+    async def load(self) -> None:
+        rows = await execute_query(EXPOSURE_QUERY.format(condition=""), statement="load_exposure")
+        self._events = build_exposures(rows)
+        self._rankings.clear()
+        self.loaded = True
+
+    async def refresh(self, event_ids: set[int]) -> None:
+        rows = await execute_query(
+            EXPOSURE_QUERY.format(condition=" AND event_id = ANY($1::bigint[])"),
+            list(event_ids),
+            statement="refresh_exposure",
+        )
+        exposures = build_exposures(rows)
+        for event_id in event_ids:
+            if event_id in exposures:
+                self._events[event_id] = exposures[event_id]
+            else:
+                self._events.pop(event_id, None)
+        self._rankings.clear()
+
+    def _on_notify(self, payload: str) -> None:
+        change = json.loads(payload)
+        if change["table"] != "bets":
+            return
+        self._dirty.update(row["event_id"] for row in change["rows"])
+        self._wakeup.set()
+
+    def _resync(self) -> None:
+        self._reload_all = True
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            await asyncio.sleep(REFRESH_DELAY_SECONDS)
+            self._wakeup.clear()
+            reload_all, self._reload_all = self._reload_all, False
+            event_ids, self._dirty = self._dirty, set()
+            try:
+                if reload_all:
+                    await self.load()
+                elif event_ids:
+                    await self.refresh(event_ids)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Exposure refresh failed - Events: %d, Error: %s", len(event_ids), e, exc_info=True)
+                self._reload_all = self._reload_all or reload_all
+                self._dirty |= event_ids
+                self._wakeup.set()
+                await asyncio.sleep(RETRY_SECONDS)
+
+
+exposure_engine = ExposureEngine()
+
+
+async def event_exposure(event_id: int) -> dict:
+    exposure = exposure_engine.get(event_id)
+    if exposure is not None:
+        return exposure
+    rows = await execute_query(EXPOSURE_QUERY.format(condition=" AND event_id = $1"), event_id)
+    return build_event_exposure(event_id, rows)
+
+
+async def top_exposures(currency: str, limit: int) -> list[dict]:
+    ranking = exposure_engine.top(currency, limit)
+    if ranking is not None:
+        return ranking
+    rows = await execute_query(EXPOSURE_QUERY.format(condition=""))
+    return rank_exposures(build_exposures(rows).values(), currency, limit)
@@ -0,0 +1,198 @@
+# Idempotency-Key support for write endpoints
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+from fastapi import Header, HTTPException, Response, status
+from pydantic import BaseModel
+from database import begin_unit_of_work, execute_one, execute_update
+from serialization import dumps
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+IDEMPOTENCY_KEY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_KEY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_EVICT_INTERVAL_SECONDS = 300
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+IDEMPOTENCY_KEY_HEADER = Header(
+    None,
+    alias="Idempotency-Key",
+    min_length=1,
+    max_length=255,
+    description="Client-generated key; retries with the same key and body replay the first response"
+)
+
+
+class _StoredResponse:
+    __slots__ = ("request_hash", "status_code", "body", "expires_at")
+
+    def __init__(self, request_hash: bytes, status_code: int, body: bytes, expires_at: float) -> None:
+        self.request_hash = request_hash
+        self.status_code = status_code
+        self.body = body
+        self.expires_at = expires_at
+
+
+class IdempotencyStore:
+    def __init__(self, max_entries: int = 10000) -> None:
+        self.max_entries = max_entries
+        # Completed responses only; the idempotency_keys table is the source of truth
+        self._recent: "OrderedDict[tuple[str, str], _StoredResponse]" = OrderedDict()
+        self._evictor: Optional[asyncio.Task] = None
+
+    def _remember(self, scope: str, key: str, stored: _StoredResponse) -> None:
+        self._recent[(scope, key)] = stored
+        self._recent.move_to_end((scope, key))
+        while len(self._recent) > self.max_entries:
+            self._recent.popitem(last=False)
+
+    def _replay(self, stored: _StoredResponse, request_hash: bytes) -> Response:
+        if stored.request_hash != request_hash:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used with a different request body"
+            )
+        return Response(
+            content=stored.body,
+            status_code=stored.status_code,
+            media_type="application/json",
+            headers={REPLAYED_HEADER: "true"},
+        )
+
+    async def _claim(self, scope: str, key: str, request_hash: bytes) -> Optional[Response]:
+        # Returns the stored response to replay, or None once this request owns the key.
+        # Runs in the request's transaction: a concurrent request with the same key waits
+        # on the row until this one commits (and then replays) or rolls back (and claims).
+        stored = self._recent.get((scope, key))
+        if stored is not None and stored.expires_at > time.time():
+            self._recent.move_to_end((scope, key))
+            return self._replay(stored, request_hash)
+
+        claimed = await execute_one(
+            """
+            INSERT INTO idempotency_keys (scope, key, request_hash, expires_at)
+            VALUES ($1, $2, $3, CURRENT_TIMESTAMP + make_interval(secs => $4))
+            ON CONFLICT (scope, key) DO UPDATE
+                SET request_hash = EXCLUDED.request_hash,
+                    status_code = NULL,
+                    response = NULL,
+                    created_at = CURRENT_TIMESTAMP,
+                    expires_at = EXCLUDED.expires_at
+                WHERE idempotency_keys.expires_at <= CURRENT_TIMESTAMP
+            RETURNING key
+            """,
+            scope, key, request_hash, IDEMPOTENCY_KEY_TTL_SECONDS,
+            statement="claim_idempotency_key"
+        )
+        if claimed:
+            return None
+
+        existing = await execute_one(
+            """
+            SELECT request_hash, status_code, response, EXTRACT(EPOCH FROM expires_at) AS expires_at
+            FROM idempotency_keys
+            WHERE scope = $1 AND key = $2
+            """,
+            scope, key,
+            statement="get_idempotency_key"
+        )
+        if existing is None:
+            # Evicted between the two statements; treat it as a fresh key
+            return await self._claim(scope, key, request_hash)
+        stored = _StoredResponse(
+            bytes(existing['request_hash']),
+            existing['status_code'],
+            dumps(existing['response']),
+            float(existing['expires_at']),
+        )
+        self._remember(scope, key, stored)
+        return self._replay(stored, request_hash)
+
+    async def _complete(self, scope: str, key: str, status_code: int, content) -> None:
+        await execute_update(
+            """
+            UPDATE idempotency_keys
+            SET status_code = $3, response = $4, expires_at = CURRENT_TIMESTAMP + make_interval(secs => $5)
+            WHERE scope = $1 AND key = $2
+            """,
+            scope, key, status_code, content, IDEMPOTENCY_KEY_TTL_SECONDS,
+            statement="complete_idempotency_key"
+        )
+
+    async def run(
+        self,
+        scope: str,
+        key: Optional[str],
+        request: BaseModel,
+        handler: Callable[[], Awaitable[BaseModel]],
+        status_code: int,
+    ):
+        # Without a key the handler runs as before; with one, a replay returns the stored
+        # response without touching the write path (or its triggers) again
+        if key is None:
+            return await handler()
+
+        request_hash = hashlib.sha256(request.model_dump_json().encode()).digest()
+        # The claim, the handler's writes and the stored response commit together, so a
+        # write is never committed without its response and a failure releases the key
+        unit = await begin_unit_of_work(transactional=True)
+        try:
+            replay = await self._claim(scope, key, request_hash)
+            if replay is not None:
+                await unit.finish(commit=True)
+                return replay
+
+            result = await handler()
+            content = result.model_dump(mode="json")
+            await self._complete(scope, key, status_code, content)
+        except BaseException:
+            await unit.finish(commit=False)
+            raise
+        await unit.finish(commit=True)
+
+        body = dumps(content)
+        self._remember(scope, key, _StoredResponse(request_hash, status_code, body, time.time() + IDEMPOTENCY_KEY_TTL_SECONDS))
+        return Response(
+            content=body,
+            status_code=status_code,
+            media_type="application/json",
+            headers={REPLAYED_HEADER: "false"},
+        )
+
+    async def evict_expired(self) -> int:
+        evicted = await execute_update(
+            "DELETE FROM idempotency_keys WHERE expires_at < CURRENT_TIMESTAMP",
+            statement="evict_idempotency_keys"
+        )
+        now = time.time()
+        for cache_key in [k for k, stored in self._recent.items() if stored.expires_at <= now]:
+            del self._recent[cache_key]
+        return evicted
+
+    async def _evict_loop(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                evicted = await self.evict_expired()
+                if evicted:
+                    logger.info("Evicted expired idempotency keys - Count: %d", evicted)
+            except Exception as e:
+                logger.error("Idempotency key eviction failed: %s", e, exc_info=True)
+
+    def start_eviction(self, interval: float = IDEMPOTENCY_EVICT_INTERVAL_SECONDS) -> None:
+        self._evictor = asyncio.create_task(self._evict_loop(interval))
+
+    async def stop_eviction(self) -> None:
+        if self._evictor:
+            self._evictor.cancel()
+            try:
+                await self._evictor
+            except asyncio.CancelledError:
+                pass
+            self._evictor = None
+
+
+idempotency_store = IdempotencyStore()
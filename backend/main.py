@@ -6,7 +6,17 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 from contextlib import asynccontextmanager
-from database import create_pool, close_pool
+from database import create_pool, close_pool, get_db_settings, begin_query_tracking, end_query_tracking
+from notifications import notification_hub
+from refresher import customer_stats_refresher
+from balance_snapshots import balance_snapshotter
+from reference_data import reference_data
+from stream import change_stream
+from exposure import exposure_engine
+from simulation import shutdown_simulation_pool
+from idempotency import REPLAYED_HEADER, idempotency_store
+from pagination import NEXT_CURSOR_HEADER
+from compression import CompressionMiddleware
 from logger_config import setup_logging, get_logger
 from metrics import (
     registry, 
@@ -14,9 +24,9 @@ from metrics import (
     CONTENT_TYPE_LATEST, 
     http_requests_total, 
     http_request_duration_seconds,
+    db_queries_per_request,
     errors_total
 )
-from starlette.middleware.base import BaseHTTPMiddleware
 import time
 
 from routers import (
@@ -32,6 +42,7 @@ from routers import (
     balance_changes,
     audit,
     analytics,
+    stream,
 )
 
 # Set up logging
@@ -49,9 +60,24 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error("Failed to create database connection pool: %s", e, exc_info=True)
         raise
+    await notification_hub.start()
+    await reference_data.start()
+    await change_stream.start()
+    await exposure_engine.start()
+    await customer_stats_refresher.start(get_db_settings().customer_stats_refresh_seconds)
+    await balance_snapshotter.start(get_db_settings().balance_snapshot_seconds)
+    idempotency_store.start_eviction()
     yield
     # Shutdown
     logger.info("Shutting down...")
+    await balance_snapshotter.stop()
+    await customer_stats_refresher.stop()
+    await exposure_engine.stop()
+    await change_stream.stop()
+    await reference_data.stop()
+    await notification_hub.stop()
+    await idempotency_store.stop_eviction()
+    shutdown_simulation_pool()
     try:
         await close_pool()
         logger.info("Database connection pool closed successfully")
@@ -97,48 +123,63 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, REPLAYED_HEADER],
 )
 
-# Prometheus metrics middleware
-class MetricsMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        method = request.method
-        path = request.url.path
-        
+# gzip/brotli above CompressionMiddleware's size threshold
+app.add_middleware(CompressionMiddleware)
+
+# Prometheus metrics middleware. Pure ASGI, so the endpoint runs in the request's own
+# task (BaseHTTPMiddleware hands it to a separate one), and labelled by the matched route
+# template (e.g. /api/teams/{team_id}) so label cardinality is bounded by the route table.
+def route_template(scope) -> str:
+    route = scope.get("route")
+    return route.path if route is not None else "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
         # Skip metrics endpoint itself
-        if path == "/metrics":
-            return await call_next(request)
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+        
+        method = scope["method"]
+        status_code = 500
+        start_time = time.perf_counter()
+        query_tracking = begin_query_tracking()
         
-        start_time = time.time()
-        status_code = 200
-        sanitized_path = self._sanitize_path(path)
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
         
         try:
-            response = await call_next(request)
-            status_code = response.status_code
-            return response
+            await self.app(scope, receive, send_with_status)
         except Exception as e:
             status_code = 500
-            errors_total.labels(type=type(e).__name__, endpoint=sanitized_path).inc()
+            errors_total.labels(type=type(e).__name__, endpoint=route_template(scope)).inc()
             raise
         finally:
-            # Record metrics
-            duration = time.time() - start_time
+            # The router has filled in scope["route"] by now
+            endpoint = route_template(scope)
+            duration = time.perf_counter() - start_time
             http_requests_total.labels(
                 method=method,
-                endpoint=sanitized_path,
+                endpoint=endpoint,
                 status=str(status_code)
             ).inc()
             http_request_duration_seconds.labels(
                 method=method,
-                endpoint=sanitized_path
+                endpoint=endpoint
             ).observe(duration)
-    
-    def _sanitize_path(self, path: str) -> str:
-        import re
-        path = re.sub(r'/\d+', '/:id', path)
-        path = re.sub(r'/[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}', '/:uuid', path, flags=re.IGNORECASE)
-        return path
+            db_queries_per_request.labels(
+                endpoint=endpoint
+            ).observe(end_query_tracking(query_tracking))
 
 app.add_middleware(MetricsMiddleware)
 
@@ -146,7 +187,7 @@ app.add_middleware(MetricsMiddleware)
 # Global exception handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
-    errors_total.labels(type=type(exc).__name__, endpoint=request.url.path).inc()
+    errors_total.labels(type=type(exc).__name__, endpoint=route_template(request.scope)).inc()
     logger.error(
         "Unhandled exception: %s - Path: %s - Method: %s",
         exc,
@@ -235,6 +276,7 @@ app.include_router(bets.router)
 app.include_router(balance_changes.router)
 app.include_router(audit.router)
 app.include_router(analytics.router)
+app.include_router(stream.router)
 
 
 @app.get("/")
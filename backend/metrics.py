@@ -1,6 +1,5 @@
 from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
 from prometheus_client import CollectorRegistry, REGISTRY
-import time
 
 # Create custom registry
 registry = CollectorRegistry()
@@ -24,14 +23,71 @@ http_request_duration_seconds = Histogram(
 db_queries_total = Counter(
     'db_queries_total',
     'Total number of database queries',
-    ['operation'],
+    ['operation', 'statement'],
     registry=registry
 )
 
 db_query_duration_seconds = Histogram(
     'db_query_duration_seconds',
     'Database query duration in seconds',
-    ['operation'],
+    ['operation', 'statement'],
+    registry=registry
+)
+
+db_pool_acquire_duration_seconds = Histogram(
+    'db_pool_acquire_duration_seconds',
+    'Time spent waiting for a connection from the pool in seconds',
+    registry=registry
+)
+
+db_queries_per_request = Histogram(
+    'db_queries_per_request',
+    'Number of database queries issued while serving one HTTP request',
+    ['endpoint'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+    registry=registry
+)
+
+db_slow_queries_total = Counter(
+    'db_slow_queries_total',
+    'Total number of queries slower than the slow query threshold',
+    ['statement'],
+    registry=registry
+)
+
+materialized_view_staleness_seconds = Gauge(
+    'materialized_view_staleness_seconds',
+    'Seconds since the oldest change not yet reflected in the materialized view (0 when fresh)',
+    ['view'],
+    registry=registry
+)
+
+materialized_view_refresh_duration_seconds = Histogram(
+    'materialized_view_refresh_duration_seconds',
+    'Materialized view refresh duration in seconds',
+    ['view'],
+    registry=registry
+)
+
+# Cache Metrics
+analytics_cache_requests_total = Counter(
+    'analytics_cache_requests_total',
+    'Analytics result cache lookups by outcome (hit, miss, coalesced)',
+    ['endpoint', 'result'],
+    registry=registry
+)
+
+# Change Stream Metrics
+stream_subscribers = Gauge(
+    'stream_subscribers',
+    'Open /api/stream connections',
+    registry=registry
+)
+
+stream_notifications_total = Counter(
+    'stream_notifications_total',
+    'Row change notifications received for /api/stream, by table',
+    ['table'],
     registry=registry
 )
 
@@ -82,61 +138,3 @@ errors_total = Counter(
     registry=registry
 )
 
-
-class MetricsMiddleware:
-    
-    def __init__(self, app):
-        self.app = app
-    
-    async def __call__(self, scope, receive, send):
-        if scope["type"] != "http":
-            await self.app(scope, receive, send)
-            return
-        
-        method = scope["method"]
-        path = scope["path"]
-        
-        # Start timer
-        start_time = time.time()
-        
-        # Track request
-        status_code = 200
-        
-        async def send_wrapper(message):
-            nonlocal status_code
-            if message["type"] == "http.response.start":
-                status_code = message["status"]
-                # Record metrics
-                http_requests_total.labels(
-                    method=method,
-                    endpoint=self._sanitize_path(path),
-                    status=str(status_code)
-                ).inc()
-            
-            await send(message)
-        
-        try:
-            await self.app(scope, receive, send_wrapper)
-        except Exception as e:
-            status_code = 500
-            errors_total.labels(
-                type=type(e).__name__,
-                endpoint=self._sanitize_path(path)
-            ).inc()
-            raise
-        finally:
-            # Record duration
-            duration = time.time() - start_time
-            http_request_duration_seconds.labels(
-                method=method,
-                endpoint=self._sanitize_path(path)
-            ).observe(duration)
-    
-    def _sanitize_path(self, path: str) -> str:
-        # Replace numeric IDs with :id
-        import re
-        path = re.sub(r'/\d+', '/:id', path)
-        # Replace UUIDs with :uuid
-        path = re.sub(r'/[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}', '/:uuid', path, flags=re.IGNORECASE)
-        return path
-
@@ -1,5 +1,5 @@
 # Models for Validation 
-from typing import Optional, Any, Literal
+from typing import Optional, Any, Annotated, Literal, Generic, TypeVar
 from datetime import datetime
 from pydantic import BaseModel, Field, field_validator, model_validator
 from decimal import Decimal
@@ -10,6 +10,17 @@ class MoneyAmount(BaseModel):
     amount: Decimal = Field(..., description="Amount value (can be negative for balance changes)")
     currency: str = Field(..., description="Currency code (USD, GBP, EUR)")
     
+    @model_validator(mode='before')
+    @classmethod
+    def from_composite(cls, data: Any) -> Any:
+        # money_amount columns are decoded by asyncpg as (amount, currency) records
+        if isinstance(data, tuple):
+            amount, currency = data
+            return {'amount': amount, 'currency': currency}
+        if not isinstance(data, (dict, BaseModel)) and hasattr(data, 'keys'):
+            return dict(data)
+        return data
+    
     @field_validator('currency')
     @classmethod
     def validate_currency(cls, v: str) -> str:
@@ -207,6 +218,21 @@ class Result(ResultBase):
         from_attributes = True
 
 
+class EventBetSummary(BaseModel):
+    bet_count: int
+    open_bet_count: int = Field(..., description="Placed bets without an outcome")
+    stake_by_currency: dict[str, Decimal]
+
+
+class ExpandedEvent(Event):
+    # Present only when requested through ?expand=
+    team_a: Optional[Team] = None
+    team_b: Optional[Team] = None
+    competition: Optional[Competition] = None
+    result: Optional[Result] = None
+    bet_summary: Optional[EventBetSummary] = None
+
+
 # Customers Models
 class CustomerBase(BaseModel):
     username: str = Field(..., min_length=3, max_length=50, description="Customer username")
@@ -495,6 +521,181 @@ class Bet(BetBase):
         from_attributes = True
 
 
+class BulkBetCreated(BaseModel):
+    index: int
+    id: int
+
+
+class BulkBetRejected(BaseModel):
+    index: int
+    error: str
+
+
+class BulkBetResult(BaseModel):
+    created: list[BulkBetCreated]
+    rejected: list[BulkBetRejected]
+
+
+# Settlement Models
+class EventSettlementRequest(BaseModel):
+    markets: Optional[dict[str, dict[str, str]]] = Field(
+        None,
+        description="Outcome per bet_type and placement_data selection, e.g. "
+                    "{\"match_winner\": {\"home_win\": \"win\", \"draw\": \"lose\"}}. "
+                    "Derived from the event result when omitted"
+    )
+    default_outcome: Optional[str] = Field(
+        None, description="Outcome for bets whose selection is not in markets; they stay unsettled if omitted"
+    )
+
+    @field_validator('markets')
+    @classmethod
+    def validate_markets(cls, v: Optional[dict[str, dict[str, str]]]) -> Optional[dict[str, dict[str, str]]]:
+        if v is not None:
+            valid_outcomes = {'win', 'lose', 'void'}
+            for selections in v.values():
+                for selection, outcome in selections.items():
+                    if outcome.lower() not in valid_outcomes:
+                        raise ValueError(f"Outcome must be one of {valid_outcomes}")
+                    selections[selection] = outcome.lower()
+        return v
+
+    @field_validator('default_outcome', mode='before')
+    @classmethod
+    def validate_default_outcome(cls, v: Optional[str]) -> Optional[str]:
+        if v is not None:
+            valid_outcomes = {'win', 'lose', 'void'}
+            if v.lower() not in valid_outcomes:
+                raise ValueError(f"Outcome must be one of {valid_outcomes}")
+            return v.lower()
+        return v
+
+
+class SettlementOutcomeTotals(BaseModel):
+    count: int
+    total_staked: Decimal
+    total_payout: Decimal
+
+
+class EventSettlement(BaseModel):
+    event_id: int
+    settled_bets: int
+    unsettled_bets: int
+    outcomes: dict[str, SettlementOutcomeTotals]
+
+
+# Exposure Models
+class SelectionExposure(BaseModel):
+    selection: str
+    currency: str
+    bet_count: int
+    stake: Decimal
+    potential_payout: Decimal = Field(..., description="Sum of stake * odds, paid out if the selection wins")
+    net_if_wins: Decimal = Field(..., description="Market stakes kept minus potential_payout (negative = loss)")
+
+
+class MarketExposure(BaseModel):
+    bet_type: str
+    selections: list[SelectionExposure]
+
+
+class CurrencyExposure(BaseModel):
+    currency: str
+    bet_count: int
+    stake: Decimal
+    worst_case_liability: Decimal = Field(
+        ..., description="Sum over markets of the largest loss any single selection would cause (0 if none loses)"
+    )
+
+
+class EventExposure(BaseModel):
+    event_id: int
+    markets: list[MarketExposure]
+    totals: list[CurrencyExposure]
+
+
+class EventLiability(CurrencyExposure):
+    event_id: int
+
+
+class LiabilitySimulationRequest(BaseModel):
+    event_id: Optional[int] = Field(None, gt=0, description="Simulate the open bets on this event")
+    competition_id: Optional[int] = Field(None, gt=0, description="Simulate the open bets on this competition's events")
+    currency: str = Field("USD", description="Only bets staked in this currency")
+    simulations: int = Field(10000, ge=100, le=100000, description="Number of simulated settlements")
+    probabilities: Optional[dict[str, dict[str, float]]] = Field(
+        None,
+        description="Win probability per bet_type and selection, e.g. {\"match_winner\": {\"home_win\": 0.45}}; "
+                    "selections not listed use the implied probability 1/odds"
+    )
+    seed: Optional[int] = Field(None, description="Random seed, for reproducible results")
+
+    @field_validator('currency')
+    @classmethod
+    def validate_currency(cls, v: str) -> str:
+        valid_currencies = {'USD', 'GBP', 'EUR'}
+        if v.upper() not in valid_currencies:
+            raise ValueError(f"Currency must be one of {valid_currencies}")
+        return v.upper()
+
+    @field_validator('probabilities')
+    @classmethod
+    def validate_probabilities(cls, v: Optional[dict[str, dict[str, float]]]) -> Optional[dict[str, dict[str, float]]]:
+        if v is not None:
+            for selections in v.values():
+                if any(p < 0 or p > 1 for p in selections.values()):
+                    raise ValueError("Probabilities must be between 0 and 1")
+                if sum(selections.values()) > 1 + 1e-9:
+                    raise ValueError("Probabilities of one bet_type must not add up to more than 1")
+        return v
+
+    @model_validator(mode='after')
+    def validate_scope(self):
+        if (self.event_id is None) == (self.competition_id is None):
+            raise ValueError("Provide exactly one of event_id and competition_id")
+        return self
+
+
+class LiabilitySimulation(BaseModel):
+    currency: str
+    simulations: int
+    bet_count: int
+    market_count: int
+    total_stake: float
+    expected_payout: float
+    max_payout: float
+    expected_pnl: float = Field(..., description="Mean of total stake minus payout (positive = house wins)")
+    pnl_std: float
+    pnl_percentiles: dict[str, float]
+    value_at_risk_95: float = Field(..., description="Loss exceeded in 5% of simulations (0 if none)")
+    value_at_risk_99: float
+    expected_shortfall_95: float = Field(..., description="Mean loss in the worst 5% of simulations")
+    probability_of_loss: float
+
+
+# Batch Get Models
+BATCH_GET_MAX_IDS = 1000
+# Ids are bigint columns; larger values would fail in the query instead of validation
+BatchGetId = Annotated[int, Field(gt=0, le=2**63 - 1)]
+
+ItemT = TypeVar("ItemT")
+
+
+class BatchGetRequest(BaseModel):
+    ids: list[BatchGetId] = Field(..., min_length=1, max_length=BATCH_GET_MAX_IDS)
+
+    @field_validator('ids')
+    @classmethod
+    def dedupe_ids(cls, v: list[int]) -> list[int]:
+        # Keep the first occurrence so the response follows the request order
+        return list(dict.fromkeys(v))
+
+
+class BatchGetResult(BaseModel, Generic[ItemT]):
+    items: list[ItemT] = Field(..., description="Found rows, in the order their ids were requested")
+    missing: list[int] = Field(..., description="Requested ids with no row, in request order")
+
+
 # Audit Log Models
 class AuditLog(BaseModel):
     id: int
@@ -0,0 +1,94 @@
+# One LISTEN connection per worker, fanning Postgres notifications out to in-process subscribers
+import asyncio
+from typing import Callable, Optional
+import asyncpg
+from database import connect_listener
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+# Seconds between reconnect attempts after the LISTEN connection drops
+RECONNECT_DELAY_SECONDS = 1.0
+
+
+class NotificationHub:
+    def __init__(self) -> None:
+        self._conn: Optional[asyncpg.Connection] = None
+        self._subscribers: dict[str, list[Callable[[str], None]]] = {}
+        # Called after a reconnect: notifications sent while disconnected are lost,
+        # so subscribers must treat their state as stale
+        self._resync: dict[Callable[[str], None], Callable[[], None]] = {}
+        self._lost = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def connected(self) -> bool:
+        return self._conn is not None and not self._conn.is_closed()
+
+    async def start(self) -> None:
+        await self._connect()
+        self._task = asyncio.create_task(self._supervise())
+        logger.info("Notification listener started - Channels: %s", ", ".join(self._subscribers) or "none")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.connected:
+            await self._conn.close()
+        self._conn = None
+
+    async def subscribe(
+        self,
+        channel: str,
+        callback: Callable[[str], None],
+        resync: Optional[Callable[[], None]] = None,
+    ) -> None:
+        # Callbacks run on the event loop with the notification payload and must not block
+        first = channel not in self._subscribers
+        self._subscribers.setdefault(channel, []).append(callback)
+        if resync is not None:
+            self._resync[callback] = resync
+        if first and self.connected:
+            await self._conn.add_listener(channel, self._dispatch)
+
+    def unsubscribe(self, channel: str, callback: Callable[[str], None]) -> None:
+        callbacks = self._subscribers.get(channel, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+        self._resync.pop(callback, None)
+
+    def _dispatch(self, connection, pid: int, channel: str, payload: str) -> None:
+        for callback in list(self._subscribers.get(channel, ())):
+            try:
+                callback(payload)
+            except Exception as e:
+                logger.error("Notification handler failed - Channel: %s, Error: %s", channel, e, exc_info=True)
+
+    async def _connect(self) -> None:
+        self._conn = await connect_listener()
+        self._lost.clear()
+        self._conn.add_termination_listener(lambda _: self._lost.set())
+        for channel in self._subscribers:
+            await self._conn.add_listener(channel, self._dispatch)
+
+    async def _supervise(self) -> None:
+        while True:
+            await self._lost.wait()
+            logger.warning("Notification listener connection lost, reconnecting")
+            while True:
+                try:
+                    await self._connect()
+                    break
+                except Exception as e:
+                    logger.error("Notification listener reconnect failed: %s", e)
+                    await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+            for resync in list(self._resync.values()):
+                resync()
+
+
+notification_hub = NotificationHub()
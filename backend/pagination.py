@@ -0,0 +1,53 @@
+# Keyset (cursor) pagination helpers
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, Optional, Sequence
+from fastapi import HTTPException, Response, status
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(sort_value: Any, row_id: Any) -> str:
+    if isinstance(sort_value, (datetime, date)):
+        sort_value = sort_value.isoformat()
+    payload = json.dumps([sort_value, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_type: type = datetime) -> tuple[Any, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if sort_type is datetime:
+            sort_value = datetime.fromisoformat(sort_value)
+        elif not isinstance(sort_value, sort_type):
+            raise ValueError("Unexpected cursor value type")
+        return sort_value, int(row_id)
+    except (ValueError, TypeError, json.JSONDecodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+
+
+def keyset_condition(sort_column: str, id_column: str, param_idx: int, descending: bool = True) -> str:
+    # Row comparison lets Postgres seek straight into the (sort_column, id_column) index
+    operator = "<" if descending else ">"
+    return f" AND ({sort_column}, {id_column}) {operator} (${param_idx}, ${param_idx + 1})"
+
+
+def set_next_cursor(
+    response: Response,
+    rows: Sequence[dict],
+    limit: int,
+    sort_key: str,
+    id_key: str = "id",
+) -> Optional[str]:
+    # A short page means there is nothing left to fetch
+    if len(rows) < limit:
+        return None
+    last = rows[-1]
+    next_cursor = encode_cursor(last[sort_key], last[id_key])
+    response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return next_cursor
@@ -0,0 +1,37 @@
+# Sparse fieldsets: ?fields= narrows the SELECT list, so unrequested columns
+# (large JSONB in particular) are neither read, decoded nor encoded
+from typing import Optional, Sequence
+from fastapi import HTTPException, Query, status
+
+FIELDS_QUERY = Query(
+    None,
+    description="Comma-separated fields to return (default: all); id is always included"
+)
+
+
+def select_fields(fields: Optional[str], columns: Sequence[str]) -> list[str]:
+    # Requested columns in their canonical order
+    if not fields:
+        return list(columns)
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested.difference(columns)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown field(s): {', '.join(sorted(unknown))}. Allowed: {', '.join(columns)}"
+        )
+    return [column for column in columns if column == "id" or column in requested]
+
+
+def select_list(selected: Sequence[str], *required: str) -> tuple[str, list[str]]:
+    # Adds columns the endpoint itself needs (e.g. the cursor sort key); returns the
+    # SELECT list and the extra columns to drop from the rows before responding
+    hidden = [column for column in required if column not in selected]
+    return ", ".join([*selected, *hidden]), hidden
+
+
+def drop_columns(rows: list[dict], hidden: Sequence[str]) -> list[dict]:
+    # New row dicts, so the originals can still feed the next-page cursor
+    if not hidden:
+        return rows
+    return [{key: value for key, value in row.items() if key not in hidden} for row in rows]
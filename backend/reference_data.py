@@ -0,0 +1,146 @@
+# In-memory copy of the small, read-mostly reference tables (sports, bookies, competitions, teams).
+# Every worker loads them at startup and reloads a table when the notify_reference_data_changed
+# trigger reports a write to it, so all workers converge on the committed state.
+import asyncio
+from bisect import bisect_left
+from typing import Optional
+from database import execute_query
+from conditional import content_tag
+from notifications import notification_hub
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+REFERENCE_DATA_CHANNEL = "reference_data_changed"
+RELOAD_RETRY_SECONDS = 1.0
+
+# table -> (query in the order the list endpoints return rows, primary key, sort key, indexed columns)
+REFERENCE_TABLES = {
+    "sports": (
+        "SELECT name FROM sports ORDER BY name",
+        "name", ("name",), (),
+    ),
+    "bookies": (
+        "SELECT name, description, preferences FROM bookies ORDER BY name",
+        "name", ("name",), (),
+    ),
+    "competitions": (
+        "SELECT id, name, country, sport, active FROM competitions ORDER BY name, id",
+        "id", ("name", "id"), ("sport", "country"),
+    ),
+    "teams": (
+        "SELECT id, name, country, sport, created_at, updated_at FROM teams ORDER BY name, id",
+        "id", ("name", "id"), ("sport", "country"),
+    ),
+}
+
+
+class ReferenceTable:
+    def __init__(self, rows: list[dict], key: str, sort_key: tuple, indexed: tuple) -> None:
+        self.rows = rows
+        self.key = key
+        self.sort_key = sort_key
+        self.by_key = {row[key]: row for row in rows}
+        # HTTP validators for everything served from this copy, computed once per load
+        self.tag = content_tag(rows)
+        self.last_modified = max((row["updated_at"] for row in rows if "updated_at" in row), default=None)
+        # Positions in database order, so keyset seeks never compare strings in Python
+        # (whose ordering differs from the database collation)
+        self.position = {row[key]: i for i, row in enumerate(rows)}
+        # column -> value -> rows, each list kept in the table's sort order
+        self.indexes: dict[str, dict] = {column: {} for column in indexed}
+        for row in rows:
+            for column, index in self.indexes.items():
+                index.setdefault(row[column], []).append(row)
+
+    def get(self, key) -> Optional[dict]:
+        return self.by_key.get(key)
+
+    def select(self, after: Optional[tuple] = None, **filters) -> Optional[list[dict]]:
+        # Equality filters (None = unfiltered), seeking past the row identified by the
+        # keyset cursor `after` when given; rows keep the table's sort order. Returns None
+        # when the cursor row has since changed or disappeared, leaving the seek to the database.
+        start = 0
+        if after is not None:
+            anchor = self.by_key.get(after[-1])
+            if anchor is None or tuple(anchor[c] for c in self.sort_key) != after:
+                return None
+            start = self.position[after[-1]] + 1
+        candidates = self.rows
+        others = {}
+        for column, value in filters.items():
+            if value is None:
+                continue
+            if column in self.indexes and candidates is self.rows:
+                candidates = self.indexes[column].get(value, [])
+            else:
+                others[column] = value
+        if start:
+            position, key = self.position, self.key
+            candidates = candidates[bisect_left(candidates, start, key=lambda row: position[row[key]]):]
+        if others:
+            candidates = [row for row in candidates if all(row[c] == v for c, v in others.items())]
+        return candidates
+
+
+class ReferenceDataCache:
+    def __init__(self) -> None:
+        self._tables: dict[str, ReferenceTable] = {}
+        # Bumped on every invalidation so a load that raced with a write is discarded
+        self._versions = {name: 0 for name in REFERENCE_TABLES}
+        self._reloads: dict[str, asyncio.Task] = {}
+        self._started = False
+
+    def table(self, name: str) -> Optional[ReferenceTable]:
+        # None until loaded (or while reloading after a change): callers then read the database
+        return self._tables.get(name)
+
+    async def start(self) -> None:
+        await notification_hub.subscribe(REFERENCE_DATA_CHANNEL, self._on_notify, resync=self.invalidate)
+        self._started = True
+        await asyncio.gather(*(self.load(name) for name in REFERENCE_TABLES))
+        logger.info("Reference data loaded - %s", ", ".join(
+            f"{name}: {len(table.rows)}" for name, table in self._tables.items()
+        ))
+
+    async def stop(self) -> None:
+        self._started = False
+        notification_hub.unsubscribe(REFERENCE_DATA_CHANNEL, self._on_notify)
+        for task in list(self._reloads.values()):
+            task.cancel()
+        await asyncio.gather(*self._reloads.values(), return_exceptions=True)
+        self._reloads.clear()
+        self._tables.clear()
+
+    async def load(self, name: str) -> None:
+        query, key, sort_key, indexed = REFERENCE_TABLES[name]
+        version = self._versions[name]
+        rows = [dict(row) for row in await execute_query(query, statement=f"load_{name}")]
+        if version == self._versions[name]:
+            self._tables[name] = ReferenceTable(rows, key, sort_key, indexed)
+
+    def invalidate(self, *names: str) -> None:
+        # Drops the tables at once (reads fall back to the database) and reloads them in the background
+        for name in names or REFERENCE_TABLES:
+            self._versions[name] += 1
+            self._tables.pop(name, None)
+            if self._started and name not in self._reloads:
+                self._reloads[name] = asyncio.create_task(self._reload(name))
+
+    def _on_notify(self, payload: str) -> None:
+        if payload in REFERENCE_TABLES:
+            self.invalidate(payload)
+
+    async def _reload(self, name: str) -> None:
+        try:
+            while name not in self._tables:
+                try:
+                    await self.load(name)
+                except Exception as e:
+                    logger.error("Reference data reload failed - Table: %s, Error: %s", name, e)
+                    await asyncio.sleep(RELOAD_RETRY_SECONDS)
+        finally:
+            self._reloads.pop(name, None)
+
+
+reference_data = ReferenceDataCache()
@@ -0,0 +1,101 @@
+# Debounced background refresh of materialized views marked dirty via NOTIFY
+import asyncio
+import time
+from typing import Optional
+from database import get_db_connection
+from notifications import notification_hub
+from logger_config import get_logger
+from metrics import materialized_view_staleness_seconds, materialized_view_refresh_duration_seconds
+
+logger = get_logger(__name__)
+
+
+class MaterializedViewRefresher:
+    def __init__(self, view: str, channel: str) -> None:
+        self.view = view
+        self.channel = channel
+        self.min_interval = 5.0
+        # Monotonic time of the oldest change not yet refreshed; None while fresh
+        self._dirty_since: Optional[float] = None
+        self._last_refresh = 0.0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        materialized_view_staleness_seconds.labels(view=view).set_function(self.staleness)
+
+    def staleness(self) -> float:
+        if self._dirty_since is None:
+            return 0.0
+        return time.monotonic() - self._dirty_since
+
+    def mark_dirty(self, *_) -> None:
+        if self._dirty_since is None:
+            self._dirty_since = time.monotonic()
+        self._wakeup.set()
+
+    async def start(self, min_interval: float) -> None:
+        self.min_interval = min_interval
+        # A reconnect may have missed notifications, so it marks the view dirty as well
+        await notification_hub.subscribe(self.channel, self.mark_dirty, resync=self.mark_dirty)
+        # Changes made while nobody was listening are unknown, so assume the view is stale
+        self.mark_dirty()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Materialized view refresher started - View: %s, Interval: %ss", self.view, min_interval)
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        notification_hub.unsubscribe(self.channel, self.mark_dirty)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._wakeup.wait()
+                # Every change that arrives before the interval elapses is folded into one refresh
+                delay = self._last_refresh + self.min_interval - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Materialized view refresh failed - View: %s, Error: %s", self.view, e, exc_info=True)
+                await asyncio.sleep(max(self.min_interval, 1.0))
+
+    async def refresh(self) -> None:
+        # Notifications received from here on belong to the next refresh
+        self._wakeup.clear()
+        dirty_since, self._dirty_since = self._dirty_since, None
+        start = time.perf_counter()
+        try:
+            async with get_db_connection() as conn:
+                async with conn.transaction():
+                    # Every worker hears every notification, so while another one holds the
+                    # lock its refresh (or the next one it is woken for) covers this round
+                    refreshing = await conn.fetchval(
+                        "SELECT pg_try_advisory_xact_lock(hashtext('refresh_materialized_view'), hashtext($1))",
+                        self.view
+                    )
+                    if refreshing:
+                        await conn.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {self.view}")
+        except Exception:
+            if dirty_since is not None:
+                self._dirty_since = min(dirty_since, self._dirty_since or dirty_since)
+            self._wakeup.set()
+            raise
+        finally:
+            self._last_refresh = time.monotonic()
+
+        if not refreshing:
+            logger.debug("Materialized view refresh skipped, another worker is refreshing - View: %s", self.view)
+            return
+        duration = time.perf_counter() - start
+        materialized_view_refresh_duration_seconds.labels(view=self.view).observe(duration)
+        logger.debug("Materialized view refreshed - View: %s, Duration: %.1fms", self.view, duration * 1000)
+
+
+customer_stats_refresher = MaterializedViewRefresher("customer_stats", "customer_stats_dirty")
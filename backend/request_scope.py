@@ -0,0 +1,45 @@
+# Request-scoped database unit of work
+from typing import AsyncGenerator, Callable
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from database import UnitOfWork, begin_unit_of_work, finish_unit_of_work
+
+
+class RequestScopedRoute(APIRoute):
+    # Finishes the request's unit of work (commit on success, rollback on error
+    # responses and exceptions) before the response is sent. Dependency teardown
+    # alone would run only after sending, acknowledging writes before they commit.
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def scoped_handler(request: Request) -> Response:
+            try:
+                response = await handler(request)
+            except BaseException:
+                await finish_unit_of_work(commit=False)
+                raise
+            await finish_unit_of_work(commit=response.status_code < 400)
+            return response
+
+        return scoped_handler
+
+
+def unit_of_work_dependency(transactional: bool) -> Callable[[], AsyncGenerator[UnitOfWork, None]]:
+    async def dependency() -> AsyncGenerator[UnitOfWork, None]:
+        unit = await begin_unit_of_work(transactional)
+        try:
+            yield unit
+        except BaseException:
+            await unit.finish(commit=False)
+            raise
+        else:
+            # Already finished under RequestScopedRoute; this covers other routes
+            await unit.finish(commit=True)
+
+    return dependency
+
+
+# Every query of the request shares one pool connection, checked out on first use
+request_connection = unit_of_work_dependency(transactional=False)
+# As request_connection, with all of the request's queries in one transaction
+request_transaction = unit_of_work_dependency(transactional=True)
@@ -1,36 +1,86 @@
-from fastapi import APIRouter, HTTPException, status, Query
+from fastapi import APIRouter, HTTPException, status, Query, Request, Response, Depends
 from typing import List, Optional
-from database import execute_query, execute_one
+from database import execute_query, execute_one, execute_snapshot_queries
+from cache import analytics_cache
 from logger_config import get_logger
 from decimal import Decimal
 from datetime import datetime, timedelta
+import time
+from request_scope import RequestScopedRoute, request_connection
+from columnar import ANALYTICS_FORMAT_QUERY, analytics_response
+from conditional import conditional_get
+from exposure import top_exposures
+from models import EventLiability, LiabilitySimulationRequest, LiabilitySimulation
+from simulation import simulate_liability
+from serialization import TrustedJSONResponse
 
 logger = get_logger(__name__)
 
-router = APIRouter(prefix="/api/analytics", tags=["analytics"])
+router = APIRouter(
+    prefix="/api/analytics", tags=["analytics"],
+    route_class=RequestScopedRoute,
+    dependencies=[Depends(request_connection)]
+)
+
+# Seconds a cached result may be served, and the tables each result is computed from
+# (write routes invalidate by table through analytics_cache.invalidate)
+CACHE_TTL_SECONDS = {
+    "bets_summary": 30,
+    "bets_by_sport": 60,
+    "bets_by_bookie": 60,
+    "top_customers": 60,
+    "dashboard": 15,
+}
+CACHE_TABLES = {
+    "bets_summary": ("bets",),
+    "bets_by_sport": ("bets",),
+    "bets_by_bookie": ("bets",),
+    "top_customers": ("bets", "customers"),
+    "dashboard": ("bets", "customers", "events", "results"),
+}
+
+MAX_STALENESS_QUERY = Query(
+    None, ge=0,
+    description="Maximum acceptable age in seconds of a cached result; 0 forces a fresh query"
+)
+
+
+async def cached(request: Request, response: Response, name: str, loader, *args, max_staleness: Optional[float] = None):
+    key = (name, *args)
+    value, age = await analytics_cache.get_or_load(
+        key,
+        lambda: loader(*args),
+        ttl=CACHE_TTL_SECONDS[name],
+        tables=CACHE_TABLES[name],
+        max_staleness=max_staleness,
+    )
+    # Pollers re-requesting an unchanged result get a 304 without re-serializing it
+    conditional_get(request, response, analytics_cache.tag(key, value))
+    response.headers["Age"] = str(int(age))
+    return value
 
 
 # Summary of Bets 
-@router.get("/bets/summary")
-async def get_bets_summary():
-    query = """
+BETS_SUMMARY_QUERY = """
         SELECT 
-            COUNT(*) as total_bets,
-            COUNT(*) FILTER (WHERE placement_status = 'placed') as placed_bets,
-            COUNT(*) FILTER (WHERE placement_status = 'pending') as pending_bets,
-            COUNT(*) FILTER (WHERE placement_status = 'failed') as failed_bets,
-            COUNT(*) FILTER (WHERE outcome = 'win') as winning_bets,
-            COUNT(*) FILTER (WHERE outcome = 'lose') as losing_bets,
-            COUNT(*) FILTER (WHERE outcome = 'void') as void_bets,
-            SUM((stake).amount) FILTER (WHERE placement_status = 'placed') as total_staked,
-            SUM((stake).amount * odds) FILTER (WHERE placement_status = 'placed' AND outcome = 'win') as total_won,
-            SUM((stake).amount) FILTER (WHERE placement_status = 'placed' AND outcome = 'lose') as total_lost,
-            AVG((stake).amount) FILTER (WHERE placement_status = 'placed') as avg_stake,
-            AVG(odds) as avg_odds
-        FROM bets
-    """
-    result = await execute_one(query)
-    
+            COALESCE(SUM(bet_count), 0)::bigint as total_bets,
+            COALESCE(SUM(bet_count) FILTER (WHERE placement_status = 'placed'), 0)::bigint as placed_bets,
+            COALESCE(SUM(bet_count) FILTER (WHERE placement_status = 'pending'), 0)::bigint as pending_bets,
+            COALESCE(SUM(bet_count) FILTER (WHERE placement_status = 'failed'), 0)::bigint as failed_bets,
+            COALESCE(SUM(bet_count) FILTER (WHERE outcome = 'win'), 0)::bigint as winning_bets,
+            COALESCE(SUM(bet_count) FILTER (WHERE outcome = 'lose'), 0)::bigint as losing_bets,
+            COALESCE(SUM(bet_count) FILTER (WHERE outcome = 'void'), 0)::bigint as void_bets,
+            SUM(stake_sum) FILTER (WHERE placement_status = 'placed') as total_staked,
+            SUM(payout_sum) FILTER (WHERE placement_status = 'placed' AND outcome = 'win') as total_won,
+            SUM(stake_sum) FILTER (WHERE placement_status = 'placed' AND outcome = 'lose') as total_lost,
+            SUM(stake_sum) FILTER (WHERE placement_status = 'placed')
+                / NULLIF(SUM(bet_count) FILTER (WHERE placement_status = 'placed'), 0) as avg_stake,
+            SUM(odds_sum) / NULLIF(SUM(bet_count), 0) as avg_odds
+        FROM bet_daily_rollups
+"""
+
+
+def format_bets_summary(result: Optional[dict]) -> dict:
     if not result:
         return {
             "total_bets": 0,
@@ -70,27 +120,38 @@ async def get_bets_summary():
         "win_rate": (result.get('winning_bets', 0) / max(result.get('placed_bets', 1), 1)) * 100
     }
 
+
+async def load_bets_summary() -> dict:
+    result = await execute_one(BETS_SUMMARY_QUERY, statement="get_bets_summary")
+    return format_bets_summary(result)
+
+
+@router.get("/bets/summary")
+async def get_bets_summary(request: Request, response: Response, max_staleness: Optional[float] = MAX_STALENESS_QUERY):
+    return await cached(request, response, "bets_summary", load_bets_summary, max_staleness=max_staleness)
+
 # Bets by Sport
-@router.get("/bets/by-sport")
-async def get_bets_by_sport():
-    query = """
+BETS_BY_SPORT_QUERY = """
         SELECT 
             sport,
-            COUNT(*) as total_bets,
-            COUNT(*) FILTER (WHERE placement_status = 'placed') as placed_bets,
-            COUNT(*) FILTER (WHERE outcome = 'win') as winning_bets,
-            COUNT(*) FILTER (WHERE outcome = 'lose') as losing_bets,
-            SUM((stake).amount) FILTER (WHERE placement_status = 'placed') as total_staked,
-            SUM((stake).amount * odds) FILTER (WHERE placement_status = 'placed' AND outcome = 'win') as total_won,
-            SUM((stake).amount) FILTER (WHERE placement_status = 'placed' AND outcome = 'lose') as total_lost,
-            AVG((stake).amount) FILTER (WHERE placement_status = 'placed') as avg_stake,
-            AVG(odds) as avg_odds
-        FROM bets
+            SUM(bet_count)::bigint as total_bets,
+            COALESCE(SUM(bet_count) FILTER (WHERE placement_status = 'placed'), 0)::bigint as placed_bets,
+            COALESCE(SUM(bet_count) FILTER (WHERE outcome = 'win'), 0)::bigint as winning_bets,
+            COALESCE(SUM(bet_count) FILTER (WHERE outcome = 'lose'), 0)::bigint as losing_bets,
+            SUM(stake_sum) FILTER (WHERE placement_status = 'placed') as total_staked,
+            SUM(payout_sum) FILTER (WHERE placement_status = 'placed' AND outcome = 'win') as total_won,
+            SUM(stake_sum) FILTER (WHERE placement_status = 'placed' AND outcome = 'lose') as total_lost,
+            SUM(stake_sum) FILTER (WHERE placement_status = 'placed')
+                / NULLIF(SUM(bet_count) FILTER (WHERE placement_status = 'placed'), 0) as avg_stake,
+            SUM(odds_sum) / NULLIF(SUM(bet_count), 0) as avg_odds
+        FROM bet_daily_rollups
         GROUP BY sport
+        HAVING SUM(bet_count) > 0
         ORDER BY total_bets DESC
-    """
-    results = await execute_query(query)
-    
+"""
+
+
+def format_bets_by_sport(results: list[dict]) -> list[dict]:
     stats = []
     for row in results:
         placed = row.get('placed_bets', 0) or 0
@@ -114,21 +175,37 @@ async def get_bets_by_sport():
     return stats
 
 
-@router.get("/bets/by-status")
-async def get_bets_by_status():
-    """Get bet statistics grouped by placement status."""
-    query = """
+async def load_bets_by_sport() -> list[dict]:
+    results = await execute_query(BETS_BY_SPORT_QUERY, statement="get_bets_by_sport")
+    return format_bets_by_sport(results)
+
+
+@router.get("/bets/by-sport")
+async def get_bets_by_sport(
+    request: Request,
+    response: Response,
+    max_staleness: Optional[float] = MAX_STALENESS_QUERY,
+    output_format: str = ANALYTICS_FORMAT_QUERY
+):
+    rows = await cached(request, response, "bets_by_sport", load_bets_by_sport, max_staleness=max_staleness)
+    return analytics_response(rows, output_format, response)
+
+
+# Bets by Status
+BETS_BY_STATUS_QUERY = """
         SELECT 
             placement_status,
-            COUNT(*) as count,
-            SUM((stake).amount) as total_staked,
-            AVG((stake).amount) as avg_stake
-        FROM bets
+            SUM(bet_count)::bigint as count,
+            SUM(stake_sum) as total_staked,
+            SUM(stake_sum) / NULLIF(SUM(bet_count), 0) as avg_stake
+        FROM bet_daily_rollups
         GROUP BY placement_status
+        HAVING SUM(bet_count) > 0
         ORDER BY count DESC
-    """
-    results = await execute_query(query)
-    
+"""
+
+
+def format_bets_by_status(results: list[dict]) -> list[dict]:
     return [
         {
             "status": row['placement_status'],
@@ -139,26 +216,34 @@ async def get_bets_by_status():
         for row in results
     ]
 
+
+@router.get("/bets/by-status")
+async def get_bets_by_status(response: Response, output_format: str = ANALYTICS_FORMAT_QUERY):
+    """Get bet statistics grouped by placement status."""
+    results = await execute_query(BETS_BY_STATUS_QUERY)
+    return analytics_response(format_bets_by_status(results), output_format, response)
+
 # Bets by Outcome
 @router.get("/bets/by-outcome")
-async def get_bets_by_outcome():
+async def get_bets_by_outcome(response: Response, output_format: str = ANALYTICS_FORMAT_QUERY):
     query = """
         SELECT 
             COALESCE(outcome::text, 'pending') as outcome,
-            COUNT(*) as count,
-            SUM((stake).amount) as total_staked,
-            SUM((stake).amount * odds) FILTER (WHERE outcome = 'win') as total_won,
-            SUM((stake).amount) FILTER (WHERE outcome = 'lose') as total_lost,
-            AVG((stake).amount) as avg_stake,
-            AVG(odds) as avg_odds
-        FROM bets
+            SUM(bet_count)::bigint as count,
+            SUM(stake_sum) as total_staked,
+            SUM(payout_sum) FILTER (WHERE outcome = 'win') as total_won,
+            SUM(stake_sum) FILTER (WHERE outcome = 'lose') as total_lost,
+            SUM(stake_sum) / NULLIF(SUM(bet_count), 0) as avg_stake,
+            SUM(odds_sum) / NULLIF(SUM(bet_count), 0) as avg_odds
+        FROM bet_daily_rollups
         WHERE placement_status = 'placed'
         GROUP BY outcome
+        HAVING SUM(bet_count) > 0
         ORDER BY count DESC
     """
     results = await execute_query(query)
     
-    return [
+    rows = [
         {
             "outcome": row['outcome'],
             "count": row.get('count', 0),
@@ -170,25 +255,27 @@ async def get_bets_by_outcome():
         }
         for row in results
     ]
+    return analytics_response(rows, output_format, response)
 
 # Bets by Bookie
-@router.get("/bets/by-bookie")
-async def get_bets_by_bookie():
-    query = """
+BETS_BY_BOOKIE_QUERY = """
         SELECT 
             bookie,
-            COUNT(*) as total_bets,
-            COUNT(*) FILTER (WHERE placement_status = 'placed') as placed_bets,
-            COUNT(*) FILTER (WHERE outcome = 'win') as winning_bets,
-            SUM((stake).amount) FILTER (WHERE placement_status = 'placed') as total_staked,
-            AVG((stake).amount) FILTER (WHERE placement_status = 'placed') as avg_stake,
-            AVG(odds) as avg_odds
-        FROM bets
+            SUM(bet_count)::bigint as total_bets,
+            COALESCE(SUM(bet_count) FILTER (WHERE placement_status = 'placed'), 0)::bigint as placed_bets,
+            COALESCE(SUM(bet_count) FILTER (WHERE outcome = 'win'), 0)::bigint as winning_bets,
+            SUM(stake_sum) FILTER (WHERE placement_status = 'placed') as total_staked,
+            SUM(stake_sum) FILTER (WHERE placement_status = 'placed')
+                / NULLIF(SUM(bet_count) FILTER (WHERE placement_status = 'placed'), 0) as avg_stake,
+            SUM(odds_sum) / NULLIF(SUM(bet_count), 0) as avg_odds
+        FROM bet_daily_rollups
         GROUP BY bookie
+        HAVING SUM(bet_count) > 0
         ORDER BY total_bets DESC
-    """
-    results = await execute_query(query)
-    
+"""
+
+
+def format_bets_by_bookie(results: list[dict]) -> list[dict]:
     stats = []
     for row in results:
         placed = row.get('placed_bets', 0) or 0
@@ -208,27 +295,46 @@ async def get_bets_by_bookie():
     
     return stats
 
+
+async def load_bets_by_bookie() -> list[dict]:
+    results = await execute_query(BETS_BY_BOOKIE_QUERY, statement="get_bets_by_bookie")
+    return format_bets_by_bookie(results)
+
+
+@router.get("/bets/by-bookie")
+async def get_bets_by_bookie(
+    request: Request,
+    response: Response,
+    max_staleness: Optional[float] = MAX_STALENESS_QUERY,
+    output_format: str = ANALYTICS_FORMAT_QUERY
+):
+    rows = await cached(request, response, "bets_by_bookie", load_bets_by_bookie, max_staleness=max_staleness)
+    return analytics_response(rows, output_format, response)
+
 # Bets Trends
 @router.get("/bets/trends")
 async def get_bets_trends(
-    days: int = Query(30, ge=1, le=365, description="Number of days to look back")
+    response: Response,
+    days: int = Query(30, ge=1, le=365, description="Number of days to look back"),
+    output_format: str = ANALYTICS_FORMAT_QUERY
 ):
     query = """
         SELECT 
-            DATE(created_at) as date,
-            COUNT(*) as total_bets,
-            COUNT(*) FILTER (WHERE placement_status = 'placed') as placed_bets,
-            SUM((stake).amount) FILTER (WHERE placement_status = 'placed') as total_staked,
-            COUNT(*) FILTER (WHERE outcome = 'win') as winning_bets
-        FROM bets
-        WHERE created_at >= CURRENT_DATE - INTERVAL '%s days'
-        GROUP BY DATE(created_at)
+            day as date,
+            SUM(bet_count)::bigint as total_bets,
+            COALESCE(SUM(bet_count) FILTER (WHERE placement_status = 'placed'), 0)::bigint as placed_bets,
+            SUM(stake_sum) FILTER (WHERE placement_status = 'placed') as total_staked,
+            COALESCE(SUM(bet_count) FILTER (WHERE outcome = 'win'), 0)::bigint as winning_bets
+        FROM bet_daily_rollups
+        WHERE day >= (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')::date - $1::int
+        GROUP BY day
+        HAVING SUM(bet_count) > 0
         ORDER BY date ASC
-    """ % days
+    """
     
-    results = await execute_query(query)
+    results = await execute_query(query, days)
     
-    return [
+    rows = [
         {
             "date": row['date'].isoformat() if isinstance(row['date'], datetime) else str(row['date']),
             "total_bets": row.get('total_bets', 0),
@@ -238,11 +344,10 @@ async def get_bets_trends(
         }
         for row in results
     ]
+    return analytics_response(rows, output_format, response)
 
 # Summary of Results
-@router.get("/results/summary")
-async def get_results_summary():
-    query = """
+RESULTS_SUMMARY_QUERY = """
         SELECT 
             COUNT(DISTINCT e.id) as total_events,
             COUNT(DISTINCT e.id) FILTER (WHERE e.status = 'finished') as finished_events,
@@ -256,9 +361,10 @@ async def get_results_summary():
             AVG(r.score_b) as avg_score_b
         FROM events e
         LEFT JOIN results r ON e.id = r.event_id
-    """
-    result = await execute_one(query)
-    
+"""
+
+
+def format_results_summary(result: Optional[dict]) -> dict:
     if not result:
         return {
             "total_events": 0,
@@ -286,9 +392,15 @@ async def get_results_summary():
         "avg_score_b": float(result.get('avg_score_b') or 0)
     }
 
+
+@router.get("/results/summary")
+async def get_results_summary():
+    result = await execute_one(RESULTS_SUMMARY_QUERY)
+    return format_results_summary(result)
+
 # Results by Competition
 @router.get("/results/by-competition")
-async def get_results_by_competition():
+async def get_results_by_competition(response: Response, output_format: str = ANALYTICS_FORMAT_QUERY):
     query = """
         SELECT 
             c.name as competition_name,
@@ -307,7 +419,7 @@ async def get_results_by_competition():
     """
     results = await execute_query(query)
     
-    return [
+    rows = [
         {
             "competition_name": row['competition_name'],
             "sport": row['sport'],
@@ -319,10 +431,11 @@ async def get_results_by_competition():
         }
         for row in results
     ]
+    return analytics_response(rows, output_format, response)
 
 # Score Distribution
 @router.get("/results/score-distribution")
-async def get_score_distribution():
+async def get_score_distribution(response: Response, output_format: str = ANALYTICS_FORMAT_QUERY):
     query = """
         SELECT 
             score_a,
@@ -336,7 +449,7 @@ async def get_score_distribution():
     """
     results = await execute_query(query)
     
-    return [
+    rows = [
         {
             "score_a": row.get('score_a'),
             "score_b": row.get('score_b'),
@@ -345,13 +458,10 @@ async def get_score_distribution():
         }
         for row in results
     ]
+    return analytics_response(rows, output_format, response)
 
 # Top Customers
-@router.get("/top-customers")
-async def get_top_customers(
-    limit: int = Query(10, ge=1, le=100)
-):
-    query = """
+TOP_CUSTOMERS_QUERY = """
         SELECT 
             c.id,
             c.username,
@@ -368,9 +478,10 @@ async def get_top_customers(
         HAVING COUNT(b.id) > 0
         ORDER BY total_bets DESC, total_staked DESC
         LIMIT $1
-    """
-    results = await execute_query(query, limit)
-    
+"""
+
+
+def format_top_customers(results: list[dict]) -> list[dict]:
     customers = []
     for row in results:
         placed = row.get('placed_bets', 0) or 0
@@ -393,21 +504,71 @@ async def get_top_customers(
     
     return customers
 
+
+async def load_top_customers(limit: int) -> list[dict]:
+    results = await execute_query(TOP_CUSTOMERS_QUERY, limit, statement="get_top_customers")
+    return format_top_customers(results)
+
+
+@router.get("/top-customers")
+async def get_top_customers(
+    request: Request,
+    response: Response,
+    limit: int = Query(10, ge=1, le=100),
+    max_staleness: Optional[float] = MAX_STALENESS_QUERY,
+    output_format: str = ANALYTICS_FORMAT_QUERY
+):
+    rows = await cached(request, response, "top_customers", load_top_customers, limit, max_staleness=max_staleness)
+    return analytics_response(rows, output_format, response)
+
 # Dashboard
-@router.get("/dashboard")
-async def get_dashboard_data():
-    bets_summary = await get_bets_summary()
-    results_summary = await get_results_summary()
-    bets_by_sport = await get_bets_by_sport()
-    bets_by_status = await get_bets_by_status()
-    top_customers = await get_top_customers(limit=5)
+async def load_dashboard_data() -> dict:
+    start = time.perf_counter()
+    rows, timings = await execute_snapshot_queries({
+        "bets_summary": (BETS_SUMMARY_QUERY,),
+        "results_summary": (RESULTS_SUMMARY_QUERY,),
+        "bets_by_sport": (BETS_BY_SPORT_QUERY,),
+        "bets_by_status": (BETS_BY_STATUS_QUERY,),
+        "top_customers": (TOP_CUSTOMERS_QUERY, 5),
+    })
+    total = time.perf_counter() - start
     
     return {
-        "bets": bets_summary,
-        "results": results_summary,
-        "bets_by_sport": bets_by_sport[:5],  
-        "bets_by_status": bets_by_status,
-        "top_customers": top_customers,
+        "bets": format_bets_summary(rows["bets_summary"][0] if rows["bets_summary"] else None),
+        "results": format_results_summary(rows["results_summary"][0] if rows["results_summary"] else None),
+        "bets_by_sport": format_bets_by_sport(rows["bets_by_sport"])[:5],
+        "bets_by_status": format_bets_by_status(rows["bets_by_status"]),
+        "top_customers": format_top_customers(rows["top_customers"]),
+        "timings_ms": {
+            **{name: round(seconds * 1000, 2) for name, seconds in timings.items()},
+            "total": round(total * 1000, 2),
+        },
         "generated_at": datetime.now().isoformat()
     }
 
+
+@router.get("/dashboard")
+async def get_dashboard_data(request: Request, response: Response, max_staleness: Optional[float] = MAX_STALENESS_QUERY):
+    return await cached(request, response, "dashboard", load_dashboard_data, max_staleness=max_staleness)
+
+# Exposure
+@router.get("/exposure", response_model=List[EventLiability])
+async def get_top_exposures(
+    currency: str = Query("USD", pattern="^(USD|GBP|EUR)$", description="Currency to rank events in"),
+    limit: int = Query(10, ge=1, le=100)
+):
+    # Events ranked by worst-case liability on their open bets, served from the exposure engine
+    return TrustedJSONResponse(await top_exposures(currency, limit))
+
+
+# Liability Simulation
+@router.post("/liability-simulation", response_model=LiabilitySimulation)
+async def simulate_open_liability(request: LiabilitySimulationRequest):
+    return await simulate_liability(
+        request.currency,
+        request.simulations,
+        event_id=request.event_id,
+        competition_id=request.competition_id,
+        probabilities=request.probabilities,
+        seed=request.seed,
+    )
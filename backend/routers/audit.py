@@ -1,68 +1,94 @@
-from fastapi import APIRouter, HTTPException, status, Query
+from fastapi import APIRouter, HTTPException, status, Query, Response, Depends
 from typing import List, Optional
 from database import execute_query, execute_one
 from models import AuditLog
-import json
+from pagination import decode_cursor, keyset_condition, set_next_cursor
+from export import export_response
+from request_scope import RequestScopedRoute, request_connection
+from columnar import FORMAT_QUERY, list_response
 
-router = APIRouter(prefix="/api/audit", tags=["audit"])
+router = APIRouter(
+    prefix="/api/audit", tags=["audit"],
+    route_class=RequestScopedRoute,
+    dependencies=[Depends(request_connection)]
+)
 
 
-@router.get("", response_model=List[AuditLog])
-async def get_audit_logs(
-    table_name: Optional[str] = Query(None, description="Filter by table name"),
-    operation: Optional[str] = Query(None, description="Filter by operation"),
-    row_id: Optional[int] = Query(None, description="Filter by row ID"),
-    limit: int = Query(100, ge=1, le=1000),
-    offset: int = Query(0, ge=0)
-):
-    query = """
-        SELECT id, table_name, operation, username, changed_at, row_id, old_data, new_data
-        FROM audit_log
-        WHERE 1=1
-    """
+AUDIT_COLUMNS = "id, table_name, operation, username, changed_at, row_id, old_data, new_data"
+
+
+def build_audit_filters(
+    table_name: Optional[str] = None,
+    operation: Optional[str] = None,
+    row_id: Optional[int] = None,
+) -> tuple[str, list]:
+    conditions = ""
     params = []
     param_idx = 1
     
     if table_name:
-        query += f" AND table_name = ${param_idx}"
+        conditions += f" AND table_name = ${param_idx}"
         params.append(table_name)
         param_idx += 1
     
     if operation:
-        query += f" AND operation = ${param_idx}"
+        conditions += f" AND operation = ${param_idx}"
         params.append(operation)
         param_idx += 1
     
     if row_id:
-        query += f" AND row_id = ${param_idx}"
+        conditions += f" AND row_id = ${param_idx}"
         params.append(row_id)
         param_idx += 1
     
-    query += f" ORDER BY changed_at DESC LIMIT ${param_idx} OFFSET ${param_idx + 1}"
-    params.extend([limit, offset])
+    return conditions, params
+
+
+@router.get("", response_model=List[AuditLog])
+async def get_audit_logs(
+    response: Response,
+    table_name: Optional[str] = Query(None, description="Filter by table name"),
+    operation: Optional[str] = Query(None, description="Filter by operation"),
+    row_id: Optional[int] = Query(None, description="Filter by row ID"),
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor; replaces offset"),
+    output_format: str = FORMAT_QUERY
+):
+    conditions, params = build_audit_filters(table_name, operation, row_id)
+    query = f"SELECT {AUDIT_COLUMNS} FROM audit_log WHERE 1=1{conditions}"
+    param_idx = len(params) + 1
+    
+    if cursor:
+        query += keyset_condition("changed_at", "id", param_idx)
+        params.extend(decode_cursor(cursor))
+        param_idx += 2
+        query += f" ORDER BY changed_at DESC, id DESC LIMIT ${param_idx}"
+        params.append(limit)
+    else:
+        query += f" ORDER BY changed_at DESC, id DESC LIMIT ${param_idx} OFFSET ${param_idx + 1}"
+        params.extend([limit, offset])
+    
+    if output_format == "columnar":
+        columnar, records = await list_response(query, *params, output_format=output_format)
+        set_next_cursor(columnar, records, limit, "changed_at")
+        return columnar
     
     results = await execute_query(query, *params)
-    audit_logs = []
-    for row in results:
-        # Parse JSONB fields if they're strings
-        old_data = row.get('old_data')
-        new_data = row.get('new_data')
-        if isinstance(old_data, str):
-            old_data = json.loads(old_data) if old_data else None
-        if isinstance(new_data, str):
-            new_data = json.loads(new_data) if new_data else None
-        
-        audit_logs.append(AuditLog(
-            id=row['id'],
-            table_name=row['table_name'],
-            operation=row['operation'],
-            username=row['username'],
-            changed_at=row['changed_at'],
-            row_id=row.get('row_id'),
-            old_data=old_data,
-            new_data=new_data
-        ))
-    return audit_logs
+    set_next_cursor(response, results, limit, "changed_at")
+    return [AuditLog(**row) for row in results]
+
+
+@router.get("/export")
+async def export_audit_logs(
+    table_name: Optional[str] = Query(None, description="Filter by table name"),
+    operation: Optional[str] = Query(None, description="Filter by operation"),
+    row_id: Optional[int] = Query(None, description="Filter by row ID"),
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$", description="ndjson or csv")
+):
+    conditions, params = build_audit_filters(table_name, operation, row_id)
+    query = f"SELECT {AUDIT_COLUMNS} FROM audit_log WHERE 1=1{conditions} ORDER BY changed_at DESC, id DESC"
+    return export_response(query, *params, export_format=export_format, filename="audit_log")
 
 
 @router.get("/{audit_id}", response_model=AuditLog)
@@ -79,24 +105,7 @@ async def get_audit_log(audit_id: int):
             detail=f"Audit log entry with ID {audit_id} not found"
         )
     
-    # Parse JSONB fields if they're strings
-    old_data = result.get('old_data')
-    new_data = result.get('new_data')
-    if isinstance(old_data, str):
-        old_data = json.loads(old_data) if old_data else None
-    if isinstance(new_data, str):
-        new_data = json.loads(new_data) if new_data else None
-    
-    return AuditLog(
-        id=result['id'],
-        table_name=result['table_name'],
-        operation=result['operation'],
-        username=result['username'],
-        changed_at=result['changed_at'],
-        row_id=result.get('row_id'),
-        old_data=old_data,
-        new_data=new_data
-    )
+    return AuditLog(**result)
 
 
 @router.get("/table/{table_name}/row/{row_id}", response_model=List[AuditLog])
@@ -108,25 +117,5 @@ async def get_audit_logs_for_record(table_name: str, row_id: int):
         ORDER BY changed_at DESC
     """
     results = await execute_query(query, table_name, row_id)
-    audit_logs = []
-    for row in results:
-        # Parse JSONB fields if they're strings
-        old_data = row.get('old_data')
-        new_data = row.get('new_data')
-        if isinstance(old_data, str):
-            old_data = json.loads(old_data) if old_data else None
-        if isinstance(new_data, str):
-            new_data = json.loads(new_data) if new_data else None
-        
-        audit_logs.append(AuditLog(
-            id=row['id'],
-            table_name=row['table_name'],
-            operation=row['operation'],
-            username=row['username'],
-            changed_at=row['changed_at'],
-            row_id=row.get('row_id'),
-            old_data=old_data,
-            new_data=new_data
-        ))
-    return audit_logs
+    return [AuditLog(**row) for row in results]
 
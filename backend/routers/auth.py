@@ -4,10 +4,15 @@ from pydantic import BaseModel
 from auth import create_access_token, get_current_user
 from logger_config import get_logger
 from metrics import auth_logins_total
+from request_scope import RequestScopedRoute, request_connection
 
 logger = get_logger(__name__)
 
-router = APIRouter(prefix="/api/auth", tags=["authentication"])
+router = APIRouter(
+    prefix="/api/auth", tags=["authentication"],
+    route_class=RequestScopedRoute,
+    dependencies=[Depends(request_connection)]
+)
 
 # Hardcoded admin for testing purposes
 ADMIN_USERNAME = "admin"
@@ -1,73 +1,94 @@
-from fastapi import APIRouter, HTTPException, status, Query
+from fastapi import APIRouter, HTTPException, status, Query, Depends
 from typing import List, Optional
 from database import execute_query, execute_one, execute_insert, execute_update
-from models import BalanceChange, BalanceChangeCreate, MoneyAmount
+from models import BalanceChange, BalanceChangeCreate
+from pagination import decode_cursor, keyset_condition, set_next_cursor
+from serialization import TrustedJSONResponse
+from export import export_response
+from idempotency import IDEMPOTENCY_KEY_HEADER, idempotency_store
 from logger_config import get_logger
+from request_scope import RequestScopedRoute, request_connection
+from projection import FIELDS_QUERY, select_fields, select_list
+from columnar import FORMAT_QUERY, list_response
 
 logger = get_logger(__name__)
 
-router = APIRouter(prefix="/api/balance-changes", tags=["balance-changes"])
+router = APIRouter(
+    prefix="/api/balance-changes", tags=["balance-changes"],
+    route_class=RequestScopedRoute,
+    dependencies=[Depends(request_connection)]
+)
 
 
-@router.get("", response_model=List[BalanceChange])
-async def get_balance_changes(
-    customer_id: Optional[int] = Query(None, description="Filter by customer ID"),
-    change_type: Optional[str] = Query(None, description="Filter by change type"),
-    limit: int = Query(100, ge=1, le=1000),
-    offset: int = Query(0, ge=0)
-):
-    query = """
-        SELECT 
-            id, customer_id, change_type,
-            (delta).amount as delta_amount,
-            (delta).currency as delta_currency,
-            reference_id, description, created_at
-        FROM balance_changes
-        WHERE 1=1
-    """
+BALANCE_CHANGE_FIELDS = ("id", "customer_id", "change_type", "delta", "reference_id", "description", "created_at")
+BALANCE_CHANGE_COLUMNS = ", ".join(BALANCE_CHANGE_FIELDS)
+
+
+def build_balance_change_filters(
+    customer_id: Optional[int] = None,
+    change_type: Optional[str] = None,
+) -> tuple[str, list]:
+    conditions = ""
     params = []
     param_idx = 1
     
     if customer_id:
-        query += f" AND customer_id = ${param_idx}"
+        conditions += f" AND customer_id = ${param_idx}"
         params.append(customer_id)
         param_idx += 1
     
     if change_type:
-        query += f" AND change_type = ${param_idx}"
+        conditions += f" AND change_type = ${param_idx}"
         params.append(change_type)
         param_idx += 1
     
-    query += f" ORDER BY created_at DESC LIMIT ${param_idx} OFFSET ${param_idx + 1}"
-    params.extend([limit, offset])
+    return conditions, params
+
+
+@router.get("", response_model=List[BalanceChange])
+async def get_balance_changes(
+    customer_id: Optional[int] = Query(None, description="Filter by customer ID"),
+    change_type: Optional[str] = Query(None, description="Filter by change type"),
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor; replaces offset"),
+    fields: Optional[str] = FIELDS_QUERY,
+    output_format: str = FORMAT_QUERY
+):
+    columns, hidden = select_list(select_fields(fields, BALANCE_CHANGE_FIELDS), "created_at")
+    conditions, params = build_balance_change_filters(customer_id, change_type)
+    query = f"SELECT {columns} FROM balance_changes WHERE 1=1{conditions}"
+    param_idx = len(params) + 1
     
-    results = await execute_query(query, *params)
-    changes = []
-    for row in results:
-        delta = MoneyAmount(amount=row['delta_amount'], currency=row['delta_currency'])
-        changes.append(BalanceChange(
-            id=row['id'],
-            customer_id=row['customer_id'],
-            change_type=row['change_type'],
-            delta=delta,
-            reference_id=row['reference_id'],
-            description=row['description'],
-            created_at=row['created_at']
-        ))
-    return changes
+    if cursor:
+        query += keyset_condition("created_at", "id", param_idx)
+        params.extend(decode_cursor(cursor))
+        param_idx += 2
+        query += f" ORDER BY created_at DESC, id DESC LIMIT ${param_idx}"
+        params.append(limit)
+    else:
+        query += f" ORDER BY created_at DESC, id DESC LIMIT ${param_idx} OFFSET ${param_idx + 1}"
+        params.extend([limit, offset])
+    
+    response, results = await list_response(query, *params, output_format=output_format, hidden=hidden)
+    set_next_cursor(response, results, limit, "created_at")
+    return response
+
+
+@router.get("/export")
+async def export_balance_changes(
+    customer_id: Optional[int] = Query(None, description="Filter by customer ID"),
+    change_type: Optional[str] = Query(None, description="Filter by change type"),
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$", description="ndjson or csv")
+):
+    conditions, params = build_balance_change_filters(customer_id, change_type)
+    query = f"SELECT {BALANCE_CHANGE_COLUMNS} FROM balance_changes WHERE 1=1{conditions} ORDER BY created_at DESC, id DESC"
+    return export_response(query, *params, export_format=export_format, filename="balance_changes")
 
 
 @router.get("/{change_id}", response_model=BalanceChange)
-async def get_balance_change(change_id: int):
-    query = """
-        SELECT 
-            id, customer_id, change_type,
-            (delta).amount as delta_amount,
-            (delta).currency as delta_currency,
-            reference_id, description, created_at
-        FROM balance_changes
-        WHERE id = $1
-    """
+async def get_balance_change(change_id: int, fields: Optional[str] = FIELDS_QUERY):
+    query = f"SELECT {', '.join(select_fields(fields, BALANCE_CHANGE_FIELDS))} FROM balance_changes WHERE id = $1"
     result = await execute_one(query, change_id)
     if not result:
         raise HTTPException(
@@ -75,29 +96,23 @@ async def get_balance_change(change_id: int):
             detail=f"Balance change with ID {change_id} not found"
         )
     
-    delta = MoneyAmount(amount=result['delta_amount'], currency=result['delta_currency'])
-    return BalanceChange(
-        id=result['id'],
-        customer_id=result['customer_id'],
-        change_type=result['change_type'],
-        delta=delta,
-        reference_id=result['reference_id'],
-        description=result['description'],
-        created_at=result['created_at']
-    )
+    return TrustedJSONResponse(result)
 
 
 @router.post("", response_model=BalanceChange, status_code=status.HTTP_201_CREATED)
-async def create_balance_change(change: BalanceChangeCreate):
+async def create_balance_change(change: BalanceChangeCreate, idempotency_key: Optional[str] = IDEMPOTENCY_KEY_HEADER):
+    return await idempotency_store.run(
+        "balance_changes", idempotency_key, change, lambda: insert_balance_change(change), status.HTTP_201_CREATED
+    )
+
+
+async def insert_balance_change(change: BalanceChangeCreate) -> BalanceChange:
     try:
         query = """
             INSERT INTO balance_changes (customer_id, change_type, delta, reference_id, description)
             VALUES ($1, $2, ROW($3, $4)::money_amount, $5, $6)
             RETURNING 
-                id, customer_id, change_type,
-                (delta).amount as delta_amount,
-                (delta).currency as delta_currency,
-                reference_id, description, created_at
+                id, customer_id, change_type, delta, reference_id, description, created_at
         """
         result = await execute_one(
             query,
@@ -108,16 +123,7 @@ async def create_balance_change(change: BalanceChangeCreate):
             change.reference_id,
             change.description
         )
-        delta = MoneyAmount(amount=result['delta_amount'], currency=result['delta_currency'])
-        return BalanceChange(
-            id=result['id'],
-            customer_id=result['customer_id'],
-            change_type=result['change_type'],
-            delta=delta,
-            reference_id=result['reference_id'],
-            description=result['description'],
-            created_at=result['created_at']
-        )
+        return BalanceChange(**result)
     except Exception as e:
         error_str = str(e).lower()
         logger.error(
@@ -1,103 +1,127 @@
 # Bets router endpoints
-from fastapi import APIRouter, HTTPException, status, Query
+from fastapi import APIRouter, HTTPException, status, Query, Request, Depends
 from typing import List, Optional
-from database import execute_query, execute_one, execute_insert, execute_update
-from models import Bet, BetCreate, BetUpdate, MoneyAmount
+import orjson
+from pydantic import ValidationError
+from database import execute_query, execute_one, execute_insert, execute_update, get_db_connection, after_commit
+from models import Bet, BetCreate, BetUpdate, BulkBetCreated, BulkBetRejected, BulkBetResult, BatchGetRequest, BatchGetResult
+from pagination import decode_cursor, keyset_condition, set_next_cursor
+from serialization import TrustedJSONResponse
+from export import export_response
+from cache import analytics_cache
+from idempotency import IDEMPOTENCY_KEY_HEADER, idempotency_store
 from logger_config import get_logger
-import json
-from decimal import Decimal
+from request_scope import RequestScopedRoute, request_connection
+from batch import fetch_by_ids
+from projection import FIELDS_QUERY, select_fields, select_list
+from columnar import FORMAT_QUERY, list_response
 
 logger = get_logger(__name__)
 
-router = APIRouter(prefix="/api/bets", tags=["bets"])
+router = APIRouter(
+    prefix="/api/bets", tags=["bets"],
+    route_class=RequestScopedRoute,
+    dependencies=[Depends(request_connection)]
+)
 
 
-@router.get("", response_model=List[Bet])
-async def get_bets(
-    customer_id: Optional[int] = Query(None, description="Filter by customer ID"),
-    event_id: Optional[int] = Query(None, description="Filter by event ID"),
-    bookie: Optional[str] = Query(None, description="Filter by bookie"),
-    placement_status: Optional[str] = Query(None, description="Filter by placement status"),
-    outcome: Optional[str] = Query(None, description="Filter by outcome"),
-    limit: int = Query(100, ge=1, le=1000),
-    offset: int = Query(0, ge=0)
-):
-    query = """
-        SELECT 
-            id, bookie, customer_id, bookie_bet_id, bet_type, event_id, sport,
-            placement_status, outcome,
-            (stake).amount as stake_amount,
-            (stake).currency as stake_currency,
-            odds, placement_data, created_at, updated_at
-        FROM bets
-        WHERE 1=1
-    """
+BET_FIELDS = (
+    "id", "bookie", "customer_id", "bookie_bet_id", "bet_type", "event_id", "sport",
+    "placement_status", "outcome",
+    "stake", "odds", "placement_data", "created_at", "updated_at",
+)
+BET_COLUMNS = ", ".join(BET_FIELDS)
+
+
+def build_bet_filters(
+    customer_id: Optional[int] = None,
+    event_id: Optional[int] = None,
+    bookie: Optional[str] = None,
+    placement_status: Optional[str] = None,
+    outcome: Optional[str] = None,
+) -> tuple[str, list]:
+    conditions = ""
     params = []
     param_idx = 1
     
     if customer_id:
-        query += f" AND customer_id = ${param_idx}"
+        conditions += f" AND customer_id = ${param_idx}"
         params.append(customer_id)
         param_idx += 1
     
     if event_id:
-        query += f" AND event_id = ${param_idx}"
+        conditions += f" AND event_id = ${param_idx}"
         params.append(event_id)
         param_idx += 1
     
     if bookie:
-        query += f" AND bookie = ${param_idx}"
+        conditions += f" AND bookie = ${param_idx}"
         params.append(bookie)
         param_idx += 1
     
     if placement_status:
-        query += f" AND placement_status = ${param_idx}"
+        conditions += f" AND placement_status = ${param_idx}"
         params.append(placement_status)
         param_idx += 1
     
     if outcome:
-        query += f" AND outcome = ${param_idx}"
+        conditions += f" AND outcome = ${param_idx}"
         params.append(outcome)
         param_idx += 1
     
-    query += f" ORDER BY created_at DESC LIMIT ${param_idx} OFFSET ${param_idx + 1}"
-    params.extend([limit, offset])
+    return conditions, params
+
+
+@router.get("", response_model=List[Bet])
+async def get_bets(
+    customer_id: Optional[int] = Query(None, description="Filter by customer ID"),
+    event_id: Optional[int] = Query(None, description="Filter by event ID"),
+    bookie: Optional[str] = Query(None, description="Filter by bookie"),
+    placement_status: Optional[str] = Query(None, description="Filter by placement status"),
+    outcome: Optional[str] = Query(None, description="Filter by outcome"),
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor; replaces offset"),
+    fields: Optional[str] = FIELDS_QUERY,
+    output_format: str = FORMAT_QUERY
+):
+    columns, hidden = select_list(select_fields(fields, BET_FIELDS), "created_at")
+    conditions, params = build_bet_filters(customer_id, event_id, bookie, placement_status, outcome)
+    query = f"SELECT {columns} FROM bets WHERE 1=1{conditions}"
+    param_idx = len(params) + 1
     
-    results = await execute_query(query, *params)
-    bets = []
-    for row in results:
-        stake = MoneyAmount(amount=row['stake_amount'], currency=row['stake_currency'])
-        bets.append(Bet(
-            id=row['id'],
-            bookie=row['bookie'],
-            customer_id=row['customer_id'],
-            bookie_bet_id=row['bookie_bet_id'],
-            bet_type=row['bet_type'],
-            event_id=row['event_id'],
-            sport=row['sport'],
-            placement_status=row['placement_status'],
-            outcome=row['outcome'],
-            stake=stake,
-            odds=Decimal(str(row['odds'])),
-            placement_data=row['placement_data'] if isinstance(row['placement_data'], dict) else {},
-            created_at=row['created_at'],
-            updated_at=row['updated_at']
-        ))
-    return bets
+    if cursor:
+        query += keyset_condition("created_at", "id", param_idx)
+        params.extend(decode_cursor(cursor))
+        param_idx += 2
+        query += f" ORDER BY created_at DESC, id DESC LIMIT ${param_idx}"
+        params.append(limit)
+    else:
+        query += f" ORDER BY created_at DESC, id DESC LIMIT ${param_idx} OFFSET ${param_idx + 1}"
+        params.extend([limit, offset])
+    
+    response, results = await list_response(query, *params, output_format=output_format, hidden=hidden)
+    set_next_cursor(response, results, limit, "created_at")
+    return response
+
+
+@router.get("/export")
+async def export_bets(
+    customer_id: Optional[int] = Query(None, description="Filter by customer ID"),
+    event_id: Optional[int] = Query(None, description="Filter by event ID"),
+    bookie: Optional[str] = Query(None, description="Filter by bookie"),
+    placement_status: Optional[str] = Query(None, description="Filter by placement status"),
+    outcome: Optional[str] = Query(None, description="Filter by outcome"),
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$", description="ndjson or csv")
+):
+    conditions, params = build_bet_filters(customer_id, event_id, bookie, placement_status, outcome)
+    query = f"SELECT {BET_COLUMNS} FROM bets WHERE 1=1{conditions} ORDER BY created_at DESC, id DESC"
+    return export_response(query, *params, export_format=export_format, filename="bets")
 
 
 @router.get("/{bet_id}", response_model=Bet)
-async def get_bet(bet_id: int):
-    query = """
-        SELECT 
-            id, bookie, customer_id, bookie_bet_id, bet_type, event_id, sport,
-            placement_status, outcome,
-            (stake).amount as stake_amount,
-            (stake).currency as stake_currency,
-            odds, placement_data, created_at, updated_at
-        FROM bets
-        WHERE id = $1
-    """
+async def get_bet(bet_id: int, fields: Optional[str] = FIELDS_QUERY):
+    query = f"SELECT {', '.join(select_fields(fields, BET_FIELDS))} FROM bets WHERE id = $1"
     result = await execute_one(query, bet_id)
     if not result:
         raise HTTPException(
@@ -105,27 +129,31 @@ async def get_bet(bet_id: int):
             detail=f"Bet with ID {bet_id} not found"
         )
     
-    stake = MoneyAmount(amount=result['stake_amount'], currency=result['stake_currency'])
-    return Bet(
-        id=result['id'],
-        bookie=result['bookie'],
-        customer_id=result['customer_id'],
-        bookie_bet_id=result['bookie_bet_id'],
-        bet_type=result['bet_type'],
-        event_id=result['event_id'],
-        sport=result['sport'],
-        placement_status=result['placement_status'],
-        outcome=result['outcome'],
-        stake=stake,
-        odds=Decimal(str(result['odds'])),
-        placement_data=result['placement_data'] if isinstance(result['placement_data'], dict) else {},
-        created_at=result['created_at'],
-        updated_at=result['updated_at']
-    )
+    return TrustedJSONResponse(result)
+
+
+@router.post("/batch-get", response_model=BatchGetResult[Bet])
+async def batch_get_bets(request: BatchGetRequest):
+    query = """
+        SELECT 
+            id, bookie, customer_id, bookie_bet_id, bet_type, event_id, sport,
+            placement_status, outcome,
+            stake, odds, placement_data, created_at, updated_at
+        FROM bets
+        WHERE id = ANY($1::bigint[])
+    """
+    items, missing = await fetch_by_ids(query, request.ids, statement="batch_get_bets")
+    return TrustedJSONResponse({"items": items, "missing": missing})
 
 
 @router.post("", response_model=Bet, status_code=status.HTTP_201_CREATED)
-async def create_bet(bet: BetCreate):
+async def create_bet(bet: BetCreate, idempotency_key: Optional[str] = IDEMPOTENCY_KEY_HEADER):
+    return await idempotency_store.run(
+        "bets", idempotency_key, bet, lambda: insert_bet(bet), status.HTTP_201_CREATED
+    )
+
+
+async def insert_bet(bet: BetCreate) -> Bet:
     try:
         query = """
             INSERT INTO bets (
@@ -136,9 +164,7 @@ async def create_bet(bet: BetCreate):
             RETURNING 
                 id, bookie, customer_id, bookie_bet_id, bet_type, event_id, sport,
                 placement_status, outcome,
-                (stake).amount as stake_amount,
-                (stake).currency as stake_currency,
-                odds, placement_data, created_at, updated_at
+                stake, odds, placement_data, created_at, updated_at
         """
         result = await execute_one(
             query,
@@ -153,25 +179,10 @@ async def create_bet(bet: BetCreate):
             bet.stake.amount,
             bet.stake.currency,
             bet.odds,
-            json.dumps(bet.placement_data)
-        )
-        stake = MoneyAmount(amount=result['stake_amount'], currency=result['stake_currency'])
-        return Bet(
-            id=result['id'],
-            bookie=result['bookie'],
-            customer_id=result['customer_id'],
-            bookie_bet_id=result['bookie_bet_id'],
-            bet_type=result['bet_type'],
-            event_id=result['event_id'],
-            sport=result['sport'],
-            placement_status=result['placement_status'],
-            outcome=result['outcome'],
-            stake=stake,
-            odds=Decimal(str(result['odds'])),
-            placement_data=result['placement_data'] if isinstance(result['placement_data'], dict) else {},
-            created_at=result['created_at'],
-            updated_at=result['updated_at']
+            bet.placement_data
         )
+        after_commit(lambda: analytics_cache.invalidate("bets"))
+        return Bet(**result)
     except Exception as e:
         error_str = str(e).lower()
         logger.error(
@@ -203,6 +214,215 @@ async def create_bet(bet: BetCreate):
         )
 
 
+# Maximum rows accepted by one bulk request
+BULK_MAX_ROWS = 10000
+
+BULK_STAGING_COLUMNS = [
+    "row_index", "bookie", "customer_id", "bookie_bet_id", "bet_type", "event_id", "sport",
+    "placement_status", "outcome", "stake_amount", "stake_currency", "odds", "placement_data",
+]
+
+# placement_data is staged as text: binary COPY has no encoder for the jsonb codec
+CREATE_BULK_STAGING = """
+    CREATE TEMP TABLE bets_staging (
+        row_index INTEGER PRIMARY KEY,
+        bookie TEXT,
+        customer_id BIGINT,
+        bookie_bet_id TEXT,
+        bet_type TEXT,
+        event_id BIGINT,
+        sport TEXT,
+        placement_status TEXT,
+        outcome TEXT,
+        stake_amount NUMERIC,
+        stake_currency TEXT,
+        odds NUMERIC,
+        placement_data TEXT,
+        error TEXT
+    ) ON COMMIT DROP
+"""
+
+# Mirrors the constraints and validation triggers on bets, reporting the first failure per row
+VALIDATE_BULK_STAGING = """
+    UPDATE bets_staging t
+    SET error = v.error
+    FROM (
+        SELECT
+            s.row_index,
+            CASE
+                WHEN s.batch_rank > 1 THEN
+                    format('Duplicate bookie_bet_id %L for bookie %L within the request', s.bookie_bet_id, s.bookie)
+                WHEN EXISTS (SELECT 1 FROM bets b WHERE b.bookie = s.bookie AND b.bookie_bet_id = s.bookie_bet_id) THEN
+                    format('Bet with bookie %L and bookie_bet_id %L already exists', s.bookie, s.bookie_bet_id)
+                WHEN bk.name IS NULL THEN format('Invalid bookie %L', s.bookie)
+                WHEN c.id IS NULL THEN format('Invalid customer_id %s', s.customer_id)
+                WHEN e.id IS NULL THEN format('Invalid event_id %s', s.event_id)
+                WHEN sp.name IS NULL THEN format('Invalid sport %L', s.sport)
+                WHEN comp.sport <> s.sport THEN
+                    format('Bet sport %s does not match event sport %s', s.sport, comp.sport)
+                WHEN s.stake_currency <> c.currency::text THEN
+                    format('Bet stake currency %s does not match customer currency %s', s.stake_currency, c.currency)
+                WHEN s.placement_status <> 'placed' AND s.outcome IS NOT NULL THEN
+                    'Only placed bets can have an outcome'
+                WHEN s.placement_status = 'placed' AND s.outcome IS NULL AND e.status = 'finished' THEN
+                    'Cannot place bet on finished event'
+            END AS error
+        FROM (
+            SELECT *, row_number() OVER (PARTITION BY bookie, bookie_bet_id ORDER BY row_index) AS batch_rank
+            FROM bets_staging
+        ) s
+        LEFT JOIN bookies bk ON bk.name = s.bookie
+        LEFT JOIN customers c ON c.id = s.customer_id
+        LEFT JOIN events e ON e.id = s.event_id
+        LEFT JOIN competitions comp ON comp.id = e.competition_id
+        LEFT JOIN sports sp ON sp.name = s.sport
+    ) v
+    WHERE t.row_index = v.row_index AND v.error IS NOT NULL
+"""
+
+# Placed bets are charged in input order; once a customer's running total of stakes
+# exceeds their (locked) balance, the remaining placed bets for that customer are rejected
+CHECK_BULK_BALANCES = """
+    UPDATE bets_staging t
+    SET error = format('Insufficient balance for customer %s', r.customer_id)
+    FROM (
+        SELECT
+            s.row_index,
+            s.customer_id,
+            SUM(s.stake_amount) OVER (PARTITION BY s.customer_id ORDER BY s.row_index) AS running_stake
+        FROM bets_staging s
+        WHERE s.error IS NULL AND s.placement_status = 'placed'
+    ) r
+    JOIN customers c ON c.id = r.customer_id
+    WHERE t.row_index = r.row_index AND r.running_stake > (customer_balance(c.id, c.balance)).amount
+"""
+
+# Inserts the valid rows, then writes their stake deductions and customer debits set-based
+# (ledger mode derives balances from balance_changes and skips the debits)
+MERGE_BULK_STAGING = """
+    WITH inserted AS (
+        INSERT INTO bets (
+            bookie, customer_id, bookie_bet_id, bet_type, event_id, sport,
+            placement_status, outcome, stake, odds, placement_data
+        )
+        SELECT
+            bookie, customer_id, bookie_bet_id, bet_type, event_id, sport,
+            placement_status::placement_status, outcome::bet_outcome,
+            ROW(stake_amount, stake_currency::currency_code)::money_amount, odds, placement_data::jsonb
+        FROM bets_staging
+        WHERE error IS NULL
+        ORDER BY row_index
+        ON CONFLICT (bookie, bookie_bet_id) DO NOTHING
+        RETURNING id, bookie, bookie_bet_id, customer_id, placement_status, (stake).amount AS stake
+    ),
+    debited AS (
+        INSERT INTO balance_changes (customer_id, change_type, delta, reference_id, description)
+        SELECT
+            i.customer_id,
+            'bet_placed',
+            ROW(-i.stake, c.currency)::money_amount,
+            'bet_' || i.id::TEXT,
+            format('Placed bet %s', i.bookie_bet_id)
+        FROM inserted i
+        JOIN customers c ON c.id = i.customer_id
+        WHERE i.placement_status = 'placed'
+        RETURNING customer_id, (delta).amount AS amount
+    ),
+    charged AS (
+        UPDATE customers c
+        SET balance = ROW((c.balance).amount + t.total, (c.balance).currency)::money_amount,
+            updated_at = CURRENT_TIMESTAMP
+        FROM (SELECT customer_id, SUM(amount) AS total FROM debited GROUP BY customer_id) t
+        WHERE c.id = t.customer_id AND current_setting('app.balance_ledger', true) IS DISTINCT FROM 'on'
+    )
+    SELECT s.row_index, i.id
+    FROM inserted i
+    JOIN bets_staging s ON s.bookie = i.bookie AND s.bookie_bet_id = i.bookie_bet_id AND s.error IS NULL
+    ORDER BY s.row_index
+"""
+
+
+def parse_bulk_rows(body: bytes, content_type: str) -> list:
+    try:
+        if "ndjson" in content_type:
+            return [orjson.loads(line) for line in body.splitlines() if line.strip()]
+        rows = orjson.loads(body)
+    except orjson.JSONDecodeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid JSON body: {e}"
+        )
+    if not isinstance(rows, list):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Expected a JSON array of bets or NDJSON (application/x-ndjson)"
+        )
+    return rows
+
+
+def format_validation_error(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in e['loc']) or 'body'}: {e['msg']}" for e in error.errors()
+    )
+
+
+@router.post("/bulk", response_model=BulkBetResult)
+async def create_bets_bulk(request: Request):
+    rows = parse_bulk_rows(await request.body(), request.headers.get("content-type", ""))
+    if len(rows) > BULK_MAX_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {BULK_MAX_ROWS} bets per request"
+        )
+    
+    rejected = []
+    records = []
+    for index, row in enumerate(rows):
+        try:
+            bet = BetCreate.model_validate(row)
+        except ValidationError as e:
+            rejected.append(BulkBetRejected(index=index, error=format_validation_error(e)))
+            continue
+        records.append((
+            index, bet.bookie, bet.customer_id, bet.bookie_bet_id, bet.bet_type, bet.event_id, bet.sport,
+            bet.placement_status, bet.outcome, bet.stake.amount, bet.stake.currency, bet.odds, orjson.dumps(bet.placement_data).decode(),
+        ))
+    
+    created = []
+    if records:
+        async with get_db_connection() as conn:
+            async with conn.transaction():
+                await conn.execute(CREATE_BULK_STAGING)
+                await conn.copy_records_to_table("bets_staging", records=records, columns=BULK_STAGING_COLUMNS)
+                await conn.execute(VALIDATE_BULK_STAGING)
+                # Lock the affected customers' balances so the check stays true
+                # until the debits below are written
+                await conn.execute(
+                    "SELECT lock_customer_balances(ARRAY(SELECT customer_id FROM bets_staging))"
+                )
+                await conn.execute(CHECK_BULK_BALANCES)
+                # The per-row stake deduction and balance triggers defer to MERGE_BULK_STAGING
+                await conn.execute("SELECT set_config('app.bulk_balance_writes', 'on', true)")
+                inserted = await conn.fetch(MERGE_BULK_STAGING)
+                created = [BulkBetCreated(index=row['row_index'], id=row['id']) for row in inserted]
+    
+                # Rows that failed validation, or lost a race with a concurrent insert
+                inserted_indexes = {row['row_index'] for row in inserted}
+                for row in await conn.fetch("SELECT row_index, bookie, bookie_bet_id, error FROM bets_staging"):
+                    if row['row_index'] in inserted_indexes:
+                        continue
+                    error = row['error'] or (
+                        f"Bet with bookie '{row['bookie']}' and bookie_bet_id '{row['bookie_bet_id']}' already exists"
+                    )
+                    rejected.append(BulkBetRejected(index=row['row_index'], error=error))
+    
+    if created:
+        after_commit(lambda: analytics_cache.invalidate("bets", "customers"))
+    rejected.sort(key=lambda r: r.index)
+    logger.info("Bulk bet import - Rows: %d, Created: %d, Rejected: %d", len(rows), len(created), len(rejected))
+    return BulkBetResult(created=created, rejected=rejected)
+
+
 @router.put("/{bet_id}", response_model=Bet)
 async def update_bet(bet_id: int, bet: BetUpdate):
     updates = []
@@ -262,11 +482,11 @@ async def update_bet(bet_id: int, bet: BetUpdate):
     
     if bet.placement_data is not None:
         updates.append(f"placement_data = ${param_idx}")
-        params.append(json.dumps(bet.placement_data))
+        params.append(bet.placement_data)
         param_idx += 1
     
     if not updates:
-        return await get_bet(bet_id)
+        return await get_bet(bet_id, fields=None)
     
     query = f"""
         UPDATE bets
@@ -275,9 +495,7 @@ async def update_bet(bet_id: int, bet: BetUpdate):
         RETURNING 
             id, bookie, customer_id, bookie_bet_id, bet_type, event_id, sport,
             placement_status, outcome,
-            (stake).amount as stake_amount,
-            (stake).currency as stake_currency,
-            odds, placement_data, created_at, updated_at
+            stake, odds, placement_data, created_at, updated_at
     """
     params.append(bet_id)
     
@@ -288,23 +506,8 @@ async def update_bet(bet_id: int, bet: BetUpdate):
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Bet with ID {bet_id} not found"
             )
-        stake = MoneyAmount(amount=result['stake_amount'], currency=result['stake_currency'])
-        return Bet(
-            id=result['id'],
-            bookie=result['bookie'],
-            customer_id=result['customer_id'],
-            bookie_bet_id=result['bookie_bet_id'],
-            bet_type=result['bet_type'],
-            event_id=result['event_id'],
-            sport=result['sport'],
-            placement_status=result['placement_status'],
-            outcome=result['outcome'],
-            stake=stake,
-            odds=Decimal(str(result['odds'])),
-            placement_data=result['placement_data'] if isinstance(result['placement_data'], dict) else {},
-            created_at=result['created_at'],
-            updated_at=result['updated_at']
-        )
+        after_commit(lambda: analytics_cache.invalidate("bets"))
+        return Bet(**result)
     except Exception as e:
         error_str = str(e).lower()
         if "foreign key" in error_str:
@@ -327,5 +530,6 @@ async def delete_bet(bet_id: int):
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Bet with ID {bet_id} not found"
         )
+    after_commit(lambda: analytics_cache.invalidate("bets"))
     return None
 
@@ -1,10 +1,15 @@
-from fastapi import APIRouter, HTTPException, status, Query
+from fastapi import APIRouter, HTTPException, status, Query, Depends
 from typing import List, Optional
 from database import execute_query, execute_one, execute_insert, execute_update
 from models import Bookie, BookieCreate, BookieUpdate
-import json
+from reference_data import reference_data
+from request_scope import RequestScopedRoute, request_connection
 
-router = APIRouter(prefix="/api/bookies", tags=["bookies"])
+router = APIRouter(
+    prefix="/api/bookies", tags=["bookies"],
+    route_class=RequestScopedRoute,
+    dependencies=[Depends(request_connection)]
+)
 
 
 @router.get("", response_model=List[Bookie])
@@ -12,24 +17,27 @@ async def get_bookies(
     limit: int = Query(100, ge=1, le=1000),
     offset: int = Query(0, ge=0)
 ):
+    bookies = reference_data.table("bookies")
+    if bookies:
+        return [Bookie(**row) for row in bookies.rows[offset:offset + limit]]
+    
     query = "SELECT name, description, preferences FROM bookies ORDER BY name LIMIT $1 OFFSET $2"
     results = await execute_query(query, limit, offset)
-    bookies = []
-    for row in results:
-        # Ensure preferences is a dict, not a string
-        if 'preferences' in row and isinstance(row['preferences'], str):
-            try:
-                row['preferences'] = json.loads(row['preferences'])
-            except (json.JSONDecodeError, TypeError):
-                row['preferences'] = {}
-        elif 'preferences' not in row or row['preferences'] is None:
-            row['preferences'] = {}
-        bookies.append(Bookie(**row))
-    return bookies
+    return [Bookie(**row) for row in results]
 
 
 @router.get("/{name}", response_model=Bookie)
 async def get_bookie(name: str):
+    bookies = reference_data.table("bookies")
+    if bookies:
+        result = bookies.get(name)
+        if not result:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Bookie '{name}' not found"
+            )
+        return Bookie(**result)
+    
     query = "SELECT name, description, preferences FROM bookies WHERE name = $1"
     result = await execute_one(query, name)
     if not result:
@@ -37,14 +45,6 @@ async def get_bookie(name: str):
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Bookie '{name}' not found"
         )
-    # Ensure preferences is a dict, not a string
-    if 'preferences' in result and isinstance(result['preferences'], str):
-        try:
-            result['preferences'] = json.loads(result['preferences'])
-        except (json.JSONDecodeError, TypeError):
-            result['preferences'] = {}
-    elif 'preferences' not in result or result['preferences'] is None:
-        result['preferences'] = {}
     return Bookie(**result)
 
 
@@ -60,8 +60,9 @@ async def create_bookie(bookie: BookieCreate):
             query,
             bookie.name,
             bookie.description,
-            json.dumps(bookie.preferences)
+            bookie.preferences
         )
+        reference_data.invalidate("bookies")
         return Bookie(**result)
     except Exception as e:
         error_str = str(e).lower()
@@ -88,9 +89,8 @@ async def update_bookie(name: str, bookie: BookieUpdate):
         param_idx += 1
     
     if bookie.preferences is not None:
-        updates.append(f"preferences = ${param_idx}::jsonb")
-        prefs_json = json.dumps(bookie.preferences) if isinstance(bookie.preferences, dict) else bookie.preferences
-        params.append(prefs_json)
+        updates.append(f"preferences = ${param_idx}")
+        params.append(bookie.preferences)
         param_idx += 1
     
     if not updates:
@@ -110,14 +110,7 @@ async def update_bookie(name: str, bookie: BookieUpdate):
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Bookie '{name}' not found"
         )
-    # Ensure preferences is a dict
-    if 'preferences' in result and isinstance(result['preferences'], str):
-        try:
-            result['preferences'] = json.loads(result['preferences'])
-        except (json.JSONDecodeError, TypeError):
-            result['preferences'] = {}
-    elif 'preferences' not in result or result['preferences'] is None:
-        result['preferences'] = {}
+    reference_data.invalidate("bookies")
     return Bookie(**result)
 
 
@@ -130,5 +123,6 @@ async def delete_bookie(name: str):
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Bookie '{name}' not found"
         )
+    reference_data.invalidate("bookies")
     return None
 
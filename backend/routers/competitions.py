@@ -1,18 +1,34 @@
-from fastapi import APIRouter, HTTPException, status, Query
+from fastapi import APIRouter, HTTPException, status, Query, Request, Response, Depends
 from typing import List, Optional
 from database import execute_query, execute_one, execute_insert, execute_update
-from models import Competition, CompetitionCreate, CompetitionUpdate
+from models import Competition, CompetitionCreate, CompetitionUpdate, BatchGetRequest, BatchGetResult
+from reference_data import reference_data
+from request_scope import RequestScopedRoute, request_connection
+from batch import fetch_by_ids, order_by_ids
+from conditional import conditional_get
 
-router = APIRouter(prefix="/api/competitions", tags=["competitions"])
+router = APIRouter(
+    prefix="/api/competitions", tags=["competitions"],
+    route_class=RequestScopedRoute,
+    dependencies=[Depends(request_connection)]
+)
 
 
 @router.get("", response_model=List[Competition])
 async def get_competitions(
+    request: Request,
+    response: Response,
     sport: Optional[str] = Query(None, description="Filter by sport"),
     active: Optional[bool] = Query(None, description="Filter by active status"),
     limit: int = Query(100, ge=1, le=1000),
     offset: int = Query(0, ge=0)
 ):
+    competitions = reference_data.table("competitions")
+    if competitions:
+        conditional_get(request, response, competitions.tag)
+        results = competitions.select(sport=sport or None, active=active)[offset:offset + limit]
+        return [Competition(**row) for row in results]
+    
     query = "SELECT id, name, country, sport, active FROM competitions WHERE 1=1"
     params = []
     param_idx = 1
@@ -34,18 +50,41 @@ async def get_competitions(
     return [Competition(**row) for row in results]
 
 
-@router.get("/{competition_id}", response_model=Competition)
-async def get_competition(competition_id: int):
-    query = "SELECT id, name, country, sport, active FROM competitions WHERE id = $1"
-    result = await execute_one(query, competition_id)
+async def load_competition(competition_id: int, competitions=None) -> dict:
+    # From the loaded reference data table when given, else from the database
+    if competitions:
+        result = competitions.get(competition_id)
+    else:
+        query = "SELECT id, name, country, sport, active FROM competitions WHERE id = $1"
+        result = await execute_one(query, competition_id)
     if not result:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Competition with ID {competition_id} not found"
         )
+    return result
+
+
+@router.get("/{competition_id}", response_model=Competition)
+async def get_competition(competition_id: int, request: Request, response: Response):
+    competitions = reference_data.table("competitions")
+    result = await load_competition(competition_id, competitions)
+    if competitions:
+        conditional_get(request, response, competitions.tag)
     return Competition(**result)
 
 
+@router.post("/batch-get", response_model=BatchGetResult[Competition])
+async def batch_get_competitions(request: BatchGetRequest):
+    competitions = reference_data.table("competitions")
+    if competitions:
+        items, missing = order_by_ids(request.ids, competitions.get)
+    else:
+        query = "SELECT id, name, country, sport, active FROM competitions WHERE id = ANY($1::bigint[])"
+        items, missing = await fetch_by_ids(query, request.ids, statement="batch_get_competitions")
+    return BatchGetResult[Competition](items=[Competition(**row) for row in items], missing=missing)
+
+
 @router.post("", response_model=Competition, status_code=status.HTTP_201_CREATED)
 async def create_competition(competition: CompetitionCreate):
     try:
@@ -61,6 +100,7 @@ async def create_competition(competition: CompetitionCreate):
             competition.sport,
             competition.active
         )
+        reference_data.invalidate("competitions")
         return Competition(**result)
     except Exception as e:
         if "foreign key" in str(e).lower():
@@ -101,7 +141,7 @@ async def update_competition(competition_id: int, competition: CompetitionUpdate
         param_idx += 1
     
     if not updates:
-        return await get_competition(competition_id)
+        return Competition(**await load_competition(competition_id))
     
     query = f"""
         UPDATE competitions
@@ -118,6 +158,7 @@ async def update_competition(competition_id: int, competition: CompetitionUpdate
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Competition with ID {competition_id} not found"
             )
+        reference_data.invalidate("competitions")
         return Competition(**result)
     except Exception as e:
         if "foreign key" in str(e).lower():
@@ -140,5 +181,6 @@ async def delete_competition(competition_id: int):
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Competition with ID {competition_id} not found"
         )
+    reference_data.invalidate("competitions")
     return None
 
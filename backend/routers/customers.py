@@ -1,19 +1,43 @@
-from fastapi import APIRouter, HTTPException, status, Query
+from fastapi import APIRouter, HTTPException, status, Query, Depends
 from typing import List, Optional
-from database import execute_query, execute_one, execute_insert, execute_update, get_db_connection
-from models import Customer, CustomerCreate, CustomerUpdate, MoneyAmount
+from database import execute_query, execute_one, execute_insert, execute_update, get_db_connection, after_commit
+from models import Customer, CustomerCreate, CustomerUpdate, BatchGetRequest, BatchGetResult
+from pagination import decode_cursor, keyset_condition, set_next_cursor
+from serialization import TrustedJSONResponse
+from cache import analytics_cache
 from logger_config import get_logger
-import json
+from request_scope import RequestScopedRoute, request_connection, request_transaction
+from batch import fetch_by_ids
+from projection import FIELDS_QUERY, select_fields, select_list
+from columnar import FORMAT_QUERY, list_response
 
 logger = get_logger(__name__)
 
-router = APIRouter(prefix="/api/customers", tags=["customers"])
+router = APIRouter(
+    prefix="/api/customers", tags=["customers"],
+    route_class=RequestScopedRoute,
+    dependencies=[Depends(request_connection)]
+)
 
+CUSTOMER_FIELDS = (
+    "id", "username", "password", "real_name", "currency", "status",
+    "balance", "preferences", "created_at", "updated_at",
+)
 
-def parse_money_amount(money_dict: dict) -> MoneyAmount:
-    if isinstance(money_dict, dict):
-        return MoneyAmount(amount=money_dict['amount'], currency=money_dict['currency'])
-    return MoneyAmount(amount=money_dict[0], currency=money_dict[1])
+# customers.balance is not kept current in ledger mode; customer_balance() then reads
+# the customer's balance snapshot plus the balance changes made since
+BALANCE_COLUMN = "customer_balance(id, balance) AS balance"
+
+# A balance set directly shifts the snapshot by the same amount, so the ledger agrees
+SHIFT_BALANCE_SNAPSHOT_QUERY = """
+    UPDATE customer_balance_snapshots
+    SET amount = amount + $2 - ledger_balance(customer_id)
+    WHERE customer_id = $1
+"""
+
+
+def customer_columns(selected: List[str]) -> List[str]:
+    return [BALANCE_COLUMN if column == "balance" else column for column in selected]
 
 
 @router.get("", response_model=List[Customer])
@@ -21,17 +45,13 @@ async def get_customers(
     status_filter: Optional[str] = Query(None, alias="status", description="Filter by status"),
     currency: Optional[str] = Query(None, description="Filter by currency"),
     limit: int = Query(100, ge=1, le=1000),
-    offset: int = Query(0, ge=0)
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor; replaces offset"),
+    fields: Optional[str] = FIELDS_QUERY,
+    output_format: str = FORMAT_QUERY
 ):
-    query = """
-        SELECT 
-            id, username, password, real_name, currency, status,
-            (balance).amount as balance_amount,
-            (balance).currency as balance_currency,
-            preferences, created_at, updated_at
-        FROM customers
-        WHERE 1=1
-    """
+    columns, hidden = select_list(customer_columns(select_fields(fields, CUSTOMER_FIELDS)), "created_at")
+    query = f"SELECT {columns} FROM customers WHERE 1=1"
     params = []
     param_idx = 1
     
@@ -45,39 +65,24 @@ async def get_customers(
         params.append(currency)
         param_idx += 1
     
-    query += f" ORDER BY created_at DESC LIMIT ${param_idx} OFFSET ${param_idx + 1}"
-    params.extend([limit, offset])
+    if cursor:
+        query += keyset_condition("created_at", "id", param_idx)
+        params.extend(decode_cursor(cursor))
+        param_idx += 2
+        query += f" ORDER BY created_at DESC, id DESC LIMIT ${param_idx}"
+        params.append(limit)
+    else:
+        query += f" ORDER BY created_at DESC, id DESC LIMIT ${param_idx} OFFSET ${param_idx + 1}"
+        params.extend([limit, offset])
     
-    results = await execute_query(query, *params)
-    customers = []
-    for row in results:
-        balance = MoneyAmount(amount=row['balance_amount'], currency=row['balance_currency'])
-        customers.append(Customer(
-            id=row['id'],
-            username=row['username'],
-            password=row['password'],
-            real_name=row['real_name'],
-            currency=row['currency'],
-            status=row['status'],
-            balance=balance,
-            preferences=row['preferences'] if isinstance(row['preferences'], dict) else {},
-            created_at=row['created_at'],
-            updated_at=row['updated_at']
-        ))
-    return customers
+    response, results = await list_response(query, *params, output_format=output_format, hidden=hidden)
+    set_next_cursor(response, results, limit, "created_at")
+    return response
 
 
 @router.get("/{customer_id}", response_model=Customer)
-async def get_customer(customer_id: int):
-    query = """
-        SELECT 
-            id, username, password, real_name, currency, status,
-            (balance).amount as balance_amount,
-            (balance).currency as balance_currency,
-            preferences, created_at, updated_at
-        FROM customers
-        WHERE id = $1
-    """
+async def get_customer(customer_id: int, fields: Optional[str] = FIELDS_QUERY):
+    query = f"SELECT {', '.join(customer_columns(select_fields(fields, CUSTOMER_FIELDS)))} FROM customers WHERE id = $1"
     result = await execute_one(query, customer_id)
     if not result:
         raise HTTPException(
@@ -85,19 +90,20 @@ async def get_customer(customer_id: int):
             detail=f"Customer with ID {customer_id} not found"
         )
     
-    balance = MoneyAmount(amount=result['balance_amount'], currency=result['balance_currency'])
-    return Customer(
-        id=result['id'],
-        username=result['username'],
-        password=result['password'],
-        real_name=result['real_name'],
-        currency=result['currency'],
-        status=result['status'],
-        balance=balance,
-        preferences=result['preferences'] if isinstance(result['preferences'], dict) else {},
-        created_at=result['created_at'],
-        updated_at=result['updated_at']
-    )
+    return TrustedJSONResponse(result)
+
+
+@router.post("/batch-get", response_model=BatchGetResult[Customer])
+async def batch_get_customers(request: BatchGetRequest):
+    query = """
+        SELECT 
+            id, username, password, real_name, currency, status,
+            customer_balance(id, balance) AS balance, preferences, created_at, updated_at
+        FROM customers
+        WHERE id = ANY($1::bigint[])
+    """
+    items, missing = await fetch_by_ids(query, request.ids, statement="batch_get_customers")
+    return TrustedJSONResponse({"items": items, "missing": missing})
 
 
 @router.post("", response_model=Customer, status_code=status.HTTP_201_CREATED)
@@ -108,9 +114,7 @@ async def create_customer(customer: CustomerCreate):
             VALUES ($1, $2, $3, $4, $5, ROW($6, $7)::money_amount, $8)
             RETURNING 
                 id, username, password, real_name, currency, status,
-                (balance).amount as balance_amount,
-                (balance).currency as balance_currency,
-                preferences, created_at, updated_at
+                balance, preferences, created_at, updated_at
         """
         result = await execute_one(
             query,
@@ -121,21 +125,10 @@ async def create_customer(customer: CustomerCreate):
             customer.status,
             customer.balance.amount,
             customer.balance.currency,
-            json.dumps(customer.preferences)
-        )
-        balance = MoneyAmount(amount=result['balance_amount'], currency=result['balance_currency'])
-        return Customer(
-            id=result['id'],
-            username=result['username'],
-            password=result['password'],
-            real_name=result['real_name'],
-            currency=result['currency'],
-            status=result['status'],
-            balance=balance,
-            preferences=result['preferences'] if isinstance(result['preferences'], dict) else {},
-            created_at=result['created_at'],
-            updated_at=result['updated_at']
+            customer.preferences
         )
+        after_commit(lambda: analytics_cache.invalidate("customers"))
+        return Customer(**result)
     except Exception as e:
         error_str = str(e).lower()
         logger.error(
@@ -155,7 +148,7 @@ async def create_customer(customer: CustomerCreate):
         )
 
 
-@router.put("/{customer_id}", response_model=Customer)
+@router.put("/{customer_id}", response_model=Customer, dependencies=[Depends(request_transaction)])
 async def update_customer(customer_id: int, customer: CustomerUpdate):
     updates = []
     params = []
@@ -194,11 +187,11 @@ async def update_customer(customer_id: int, customer: CustomerUpdate):
     
     if customer.preferences is not None:
         updates.append(f"preferences = ${param_idx}")
-        params.append(json.dumps(customer.preferences))
+        params.append(customer.preferences)
         param_idx += 1
     
     if not updates:
-        return await get_customer(customer_id)
+        return await get_customer(customer_id, fields=None)
     
     query = f"""
         UPDATE customers
@@ -206,32 +199,22 @@ async def update_customer(customer_id: int, customer: CustomerUpdate):
         WHERE id = ${param_idx}
         RETURNING 
             id, username, password, real_name, currency, status,
-            (balance).amount as balance_amount,
-            (balance).currency as balance_currency,
-            preferences, created_at, updated_at
+            customer_balance(id, balance) AS balance, preferences, created_at, updated_at
     """
     params.append(customer_id)
     
     try:
+        if customer.balance is not None:
+            await execute_query("SELECT lock_customer_balances(ARRAY[$1]::bigint[])", customer_id)
+            await execute_update(SHIFT_BALANCE_SNAPSHOT_QUERY, customer_id, customer.balance.amount)
         result = await execute_one(query, *params)
         if not result:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Customer with ID {customer_id} not found"
             )
-        balance = MoneyAmount(amount=result['balance_amount'], currency=result['balance_currency'])
-        return Customer(
-            id=result['id'],
-            username=result['username'],
-            password=result['password'],
-            real_name=result['real_name'],
-            currency=result['currency'],
-            status=result['status'],
-            balance=balance,
-            preferences=result['preferences'] if isinstance(result['preferences'], dict) else {},
-            created_at=result['created_at'],
-            updated_at=result['updated_at']
-        )
+        after_commit(lambda: analytics_cache.invalidate("customers"))
+        return Customer(**result)
     except Exception as e:
         error_str = str(e).lower()
         if "duplicate key" in error_str:
@@ -245,10 +228,15 @@ async def update_customer(customer_id: int, customer: CustomerUpdate):
         )
 
 
-@router.delete("/{customer_id}", status_code=status.HTTP_204_NO_CONTENT)
+@router.delete(
+    "/{customer_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[Depends(request_transaction)]
+)
 async def delete_customer(customer_id: int):
-    # First check if customer exists
-    customer_query = "SELECT id, username FROM customers WHERE id = $1"
+    # First check if customer exists; the row lock keeps new bets and balance
+    # changes from referencing it until the delete commits
+    customer_query = "SELECT id, username FROM customers WHERE id = $1 FOR UPDATE"
     customer_result = await execute_one(customer_query, customer_id)
     if not customer_result:
         raise HTTPException(
@@ -299,5 +287,6 @@ async def delete_customer(customer_id: int):
             detail=f"Failed to delete customer: {str(e)}"
         )
     
+    after_commit(lambda: analytics_cache.invalidate("customers"))
     return None
 
@@ -1,58 +1,208 @@
-from fastapi import APIRouter, HTTPException, status, Query
+from fastapi import APIRouter, HTTPException, status, Query, Response, Depends
 from typing import List, Optional
-from database import execute_query, execute_one, execute_insert, execute_update, get_db_connection
-from models import Event, EventCreate, EventUpdate
+from database import (
+    execute_query, execute_one, execute_insert, execute_update, execute_records, get_db_connection, after_commit
+)
+from models import (
+    Event, EventCreate, EventUpdate, EventSettlementRequest, EventSettlement, SettlementOutcomeTotals,
+    BatchGetRequest, BatchGetResult, ExpandedEvent, EventExposure,
+)
+from pagination import decode_cursor, keyset_condition, set_next_cursor
+from cache import analytics_cache
 from datetime import datetime
+from logger_config import get_logger
+from request_scope import RequestScopedRoute, request_connection, request_transaction
+from batch import fetch_by_ids
+from reference_data import reference_data
+from exposure import event_exposure
+from serialization import TrustedJSONResponse
+from columnar import FORMAT_QUERY, columns_from_records
 
-router = APIRouter(prefix="/api/events", tags=["events"])
+logger = get_logger(__name__)
 
+router = APIRouter(
+    prefix="/api/events", tags=["events"],
+    route_class=RequestScopedRoute,
+    dependencies=[Depends(request_connection)]
+)
 
-@router.get("", response_model=List[Event])
+EXPAND_QUERY = Query(
+    None,
+    description="Comma-separated related objects to embed: teams, competition, result, bet_summary"
+)
+
+EVENT_COLUMNS = "e.id, e.date, e.competition_id, e.team_a_id, e.team_b_id, e.status, e.created_at, e.updated_at"
+
+# expansion -> (extra select columns, joins); related rows come back as jsonb objects
+EVENT_EXPANSIONS = {
+    "teams": (
+        ", to_jsonb(ta) AS team_a, to_jsonb(tb) AS team_b",
+        """
+        LEFT JOIN teams ta ON ta.id = e.team_a_id
+        LEFT JOIN teams tb ON tb.id = e.team_b_id
+        """,
+    ),
+    "competition": (
+        ", to_jsonb(c) AS competition",
+        " LEFT JOIN competitions c ON c.id = e.competition_id",
+    ),
+    "result": (
+        ", to_jsonb(r) AS result",
+        " LEFT JOIN results r ON r.event_id = e.id",
+    ),
+    "bet_summary": (
+        ", bs.bet_summary",
+        """
+        LEFT JOIN LATERAL (
+            SELECT jsonb_build_object(
+                'bet_count', COALESCE(SUM(s.bet_count), 0),
+                'open_bet_count', COALESCE(SUM(s.open_bet_count), 0),
+                'stake_by_currency', COALESCE(jsonb_object_agg(s.currency, s.stake), '{}'::jsonb)
+            ) AS bet_summary
+            FROM (
+                SELECT
+                    (b.stake).currency AS currency,
+                    COUNT(*) AS bet_count,
+                    COUNT(*) FILTER (WHERE b.placement_status = 'placed' AND b.outcome IS NULL) AS open_bet_count,
+                    -- As text, so the amount is not rounded through a JSON float
+                    SUM((b.stake).amount)::text AS stake
+                FROM bets b
+                WHERE b.event_id = e.id
+                GROUP BY (b.stake).currency
+            ) s
+        ) bs ON true
+        """,
+    ),
+}
+
+
+def parse_expand(expand: Optional[str]) -> set[str]:
+    if not expand:
+        return set()
+    requested = {part.strip() for part in expand.split(",") if part.strip()}
+    unknown = requested - EVENT_EXPANSIONS.keys()
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown expand value(s): {', '.join(sorted(unknown))}. Allowed: {', '.join(EVENT_EXPANSIONS)}"
+        )
+    return requested
+
+
+def expanded_event_query(expand: set[str]) -> tuple[str, set[str]]:
+    # Teams and competitions come from the reference-data cache when it is loaded;
+    # everything else is joined. Returns the SELECT ... FROM prefix and the cached expansions.
+    cached = set()
+    if "teams" in expand and reference_data.table("teams"):
+        cached.add("teams")
+    if "competition" in expand and reference_data.table("competitions"):
+        cached.add("competition")
+    columns = joins = ""
+    for name in EVENT_EXPANSIONS:
+        if name in expand and name not in cached:
+            columns += EVENT_EXPANSIONS[name][0]
+            joins += EVENT_EXPANSIONS[name][1]
+    return f"SELECT {EVENT_COLUMNS}{columns} FROM events e {joins}", cached
+
+
+def embed_cached(rows: list[dict], cached: set[str]) -> None:
+    if "teams" in cached:
+        teams = reference_data.table("teams")
+        for row in rows:
+            row["team_a"] = teams.get(row["team_a_id"])
+            row["team_b"] = teams.get(row["team_b_id"])
+    if "competition" in cached:
+        competitions = reference_data.table("competitions")
+        for row in rows:
+            row["competition"] = competitions.get(row["competition_id"])
+
+
+def embed_cached_columns(table: dict, cached: set[str]) -> None:
+    # embed_cached for a columnar result: one list per expansion instead of a key per row
+    data = table["data"]
+    if "teams" in cached:
+        teams = reference_data.table("teams")
+        data["team_a"] = [teams.get(team_id) for team_id in data["team_a_id"]]
+        data["team_b"] = [teams.get(team_id) for team_id in data["team_b_id"]]
+    if "competition" in cached:
+        competitions = reference_data.table("competitions")
+        data["competition"] = [competitions.get(competition_id) for competition_id in data["competition_id"]]
+    table["columns"] = list(data)
+
+
+@router.get("", response_model=List[ExpandedEvent], response_model_exclude_unset=True)
 async def get_events(
+    response: Response,
     competition_id: Optional[int] = Query(None, description="Filter by competition"),
     status_filter: Optional[str] = Query(None, alias="status", description="Filter by status"),
     limit: int = Query(100, ge=1, le=1000),
-    offset: int = Query(0, ge=0)
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor; replaces offset"),
+    expand: Optional[str] = EXPAND_QUERY,
+    output_format: str = FORMAT_QUERY
 ):
-    query = """
-        SELECT id, date, competition_id, team_a_id, team_b_id, status, created_at, updated_at
-        FROM events
-        WHERE 1=1
-    """
+    expansions = parse_expand(expand)
+    select, cached = expanded_event_query(expansions)
+    query = select + " WHERE 1=1"
     params = []
     param_idx = 1
     
     if competition_id:
-        query += f" AND competition_id = ${param_idx}"
+        query += f" AND e.competition_id = ${param_idx}"
         params.append(competition_id)
         param_idx += 1
     
     if status_filter:
-        query += f" AND status = ${param_idx}"
+        query += f" AND e.status = ${param_idx}"
         params.append(status_filter)
         param_idx += 1
     
-    query += f" ORDER BY date DESC LIMIT ${param_idx} OFFSET ${param_idx + 1}"
-    params.extend([limit, offset])
+    if cursor:
+        query += keyset_condition("e.date", "e.id", param_idx)
+        params.extend(decode_cursor(cursor))
+        param_idx += 2
+        query += f" ORDER BY e.date DESC, e.id DESC LIMIT ${param_idx}"
+        params.append(limit)
+    else:
+        query += f" ORDER BY e.date DESC, e.id DESC LIMIT ${param_idx} OFFSET ${param_idx + 1}"
+        params.extend([limit, offset])
+    
+    if output_format == "columnar":
+        columns, records = await execute_records(query, *params)
+        table = columns_from_records(columns, records)
+        embed_cached_columns(table, cached)
+        columnar = TrustedJSONResponse(table)
+        set_next_cursor(columnar, records, limit, "date")
+        return columnar
     
     results = await execute_query(query, *params)
-    return [Event(**row) for row in results]
+    embed_cached(results, cached)
+    set_next_cursor(response, results, limit, "date")
+    return [ExpandedEvent(**row) for row in results]
 
 
-@router.get("/{event_id}", response_model=Event)
-async def get_event(event_id: int):
-    query = """
-        SELECT id, date, competition_id, team_a_id, team_b_id, status, created_at, updated_at
-        FROM events
-        WHERE id = $1
-    """
-    result = await execute_one(query, event_id)
+@router.get("/{event_id}", response_model=ExpandedEvent, response_model_exclude_unset=True)
+async def get_event(event_id: int, expand: Optional[str] = EXPAND_QUERY):
+    select, cached = expanded_event_query(parse_expand(expand))
+    result = await execute_one(select + " WHERE e.id = $1", event_id)
     if not result:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Event with ID {event_id} not found"
         )
-    return Event(**result)
+    embed_cached([result], cached)
+    return ExpandedEvent(**result)
+
+
+@router.post("/batch-get", response_model=BatchGetResult[Event])
+async def batch_get_events(request: BatchGetRequest):
+    query = """
+        SELECT id, date, competition_id, team_a_id, team_b_id, status, created_at, updated_at
+        FROM events
+        WHERE id = ANY($1::bigint[])
+    """
+    items, missing = await fetch_by_ids(query, request.ids, statement="batch_get_events")
+    return BatchGetResult[Event](items=[Event(**row) for row in items], missing=missing)
 
 
 @router.post("", response_model=Event, status_code=status.HTTP_201_CREATED)
@@ -71,6 +221,7 @@ async def create_event(event: EventCreate):
             event.team_b_id,
             event.status
         )
+        after_commit(lambda: analytics_cache.invalidate("events"))
         return Event(**result)
     except Exception as e:
         error_str = str(e).lower()
@@ -127,7 +278,7 @@ async def update_event(event_id: int, event: EventUpdate):
         param_idx += 1
     
     if not updates:
-        return await get_event(event_id)
+        return await get_event(event_id, expand=None)
     
     query = f"""
         UPDATE events
@@ -144,6 +295,7 @@ async def update_event(event_id: int, event: EventUpdate):
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Event with ID {event_id} not found"
             )
+        after_commit(lambda: analytics_cache.invalidate("events"))
         return Event(**result)
     except Exception as e:
         error_str = str(e).lower()
@@ -158,10 +310,15 @@ async def update_event(event_id: int, event: EventUpdate):
         )
 
 
-@router.delete("/{event_id}", status_code=status.HTTP_204_NO_CONTENT)
+@router.delete(
+    "/{event_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[Depends(request_transaction)]
+)
 async def delete_event(event_id: int):
-    # First check if event exists
-    event_query = "SELECT id FROM events WHERE id = $1"
+    # First check if event exists; the row lock keeps new bets and results from
+    # referencing it until the delete commits
+    event_query = "SELECT id FROM events WHERE id = $1 FOR UPDATE"
     event_result = await execute_one(event_query, event_id)
     if not event_result:
         raise HTTPException(
@@ -210,5 +367,152 @@ async def delete_event(event_id: int):
             detail=f"Failed to delete event: {str(e)}"
         )
     
+    after_commit(lambda: analytics_cache.invalidate("events"))
     return None
 
+
+def derive_markets_from_result(score_a: Optional[int], score_b: Optional[int]) -> dict[str, dict[str, str]]:
+    if score_a is None or score_b is None:
+        return {}
+    winner = "home_win" if score_a > score_b else "away_win" if score_b > score_a else "draw"
+    return {
+        "match_winner": {
+            selection: "win" if selection == winner else "lose"
+            for selection in ("home_win", "draw", "away_win")
+        }
+    }
+
+
+# Settles every unsettled placed bet on the event in one statement: the bets update,
+# their balance changes and the customer credits are each written set-based (ledger
+# mode only appends the balance changes, so settling takes no customer locks at all)
+SETTLE_EVENT_QUERY = """
+    WITH market_outcomes AS (
+        SELECT * FROM unnest($2::text[], $3::text[], $4::text[]) AS m(bet_type, selection, outcome)
+    ),
+    targets AS (
+        SELECT b.id, COALESCE(m.outcome, $5)::bet_outcome AS outcome
+        FROM bets b
+        LEFT JOIN market_outcomes m
+            ON m.bet_type = b.bet_type AND m.selection = b.placement_data->>'selection'
+        WHERE b.event_id = $1 AND b.placement_status = 'placed' AND b.outcome IS NULL
+    ),
+    settled AS (
+        UPDATE bets b
+        SET outcome = t.outcome, updated_at = CURRENT_TIMESTAMP
+        FROM targets t
+        WHERE b.id = t.id AND b.outcome IS NULL AND t.outcome IS NOT NULL
+        RETURNING b.id, b.customer_id, b.outcome, (b.stake).amount AS stake, b.odds
+    ),
+    inserted AS (
+        INSERT INTO balance_changes (customer_id, change_type, delta, reference_id, description)
+        SELECT
+            s.customer_id,
+            'bet_settled',
+            ROW(
+                CASE s.outcome WHEN 'win' THEN s.stake * s.odds WHEN 'void' THEN s.stake ELSE 0 END,
+                c.currency
+            )::money_amount,
+            'bet_' || s.id::TEXT,
+            CASE s.outcome
+                WHEN 'win' THEN format('Bet %s won - payout at odds %s', s.id, s.odds)
+                WHEN 'void' THEN format('Bet %s voided - stake returned', s.id)
+                ELSE format('Bet %s settled as loss', s.id)
+            END
+        FROM settled s
+        JOIN customers c ON c.id = s.customer_id
+        RETURNING reference_id, customer_id, (delta).amount AS amount
+    ),
+    credited AS (
+        UPDATE customers c
+        SET balance = ROW((c.balance).amount + t.total, (c.balance).currency)::money_amount,
+            updated_at = CURRENT_TIMESTAMP
+        FROM (
+            SELECT customer_id, SUM(amount) AS total
+            FROM inserted
+            GROUP BY customer_id
+            HAVING SUM(amount) <> 0
+        ) t
+        WHERE c.id = t.customer_id AND current_setting('app.balance_ledger', true) IS DISTINCT FROM 'on'
+    )
+    SELECT
+        s.outcome::text AS outcome,
+        COUNT(*) AS count,
+        SUM(s.stake) AS total_staked,
+        SUM(i.amount) AS total_payout
+    FROM settled s
+    JOIN inserted i ON i.reference_id = 'bet_' || s.id::TEXT
+    GROUP BY s.outcome
+"""
+
+
+@router.post("/{event_id}/settle", response_model=EventSettlement)
+async def settle_event(event_id: int, settlement: EventSettlementRequest):
+    async with get_db_connection() as conn:
+        async with conn.transaction():
+            # Serializes settlements of the same event without blocking new bets on it
+            event = await conn.fetchrow(
+                "SELECT id FROM events WHERE id = $1 FOR NO KEY UPDATE", event_id
+            )
+            if not event:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Event with ID {event_id} not found"
+                )
+            
+            markets = settlement.markets
+            if markets is None:
+                result = await conn.fetchrow(
+                    "SELECT score_a, score_b FROM results WHERE event_id = $1", event_id
+                )
+                if not result or result['score_a'] is None or result['score_b'] is None:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=f"Event {event_id} has no final score; provide markets to settle it"
+                    )
+                markets = derive_markets_from_result(result['score_a'], result['score_b'])
+            
+            bet_types, selections, outcomes = [], [], []
+            for bet_type, market in markets.items():
+                for selection, outcome in market.items():
+                    bet_types.append(bet_type)
+                    selections.append(selection)
+                    outcomes.append(outcome)
+            
+            # The per-row outcome and balance triggers defer to the set-based writes above
+            await conn.execute("SELECT set_config('app.bulk_balance_writes', 'on', true)")
+            rows = await conn.fetch(
+                SETTLE_EVENT_QUERY, event_id, bet_types, selections, outcomes, settlement.default_outcome
+            )
+            unsettled = await conn.fetchval(
+                "SELECT COUNT(*) FROM bets WHERE event_id = $1 AND placement_status = 'placed' AND outcome IS NULL",
+                event_id
+            )
+    
+    after_commit(lambda: analytics_cache.invalidate("bets", "customers"))
+    totals = {
+        row['outcome']: SettlementOutcomeTotals(
+            count=row['count'],
+            total_staked=row['total_staked'],
+            total_payout=row['total_payout']
+        )
+        for row in rows
+    }
+    logger.info(
+        "Event settled - Event ID: %s, Settled: %d, Unsettled: %d",
+        event_id,
+        sum(t.count for t in totals.values()),
+        unsettled
+    )
+    return EventSettlement(
+        event_id=event_id,
+        settled_bets=sum(t.count for t in totals.values()),
+        unsettled_bets=unsettled,
+        outcomes=totals
+    )
+
+
+@router.get("/{event_id}/exposure", response_model=EventExposure)
+async def get_event_exposure(event_id: int):
+    # Open (placed, unsettled) bets only; an event without any has no markets
+    return TrustedJSONResponse(await event_exposure(event_id))
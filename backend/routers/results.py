@@ -1,16 +1,27 @@
-from fastapi import APIRouter, HTTPException, status, Query
+from fastapi import APIRouter, HTTPException, status, Query, Response, Depends
 from typing import List, Optional
-from database import execute_query, execute_one, execute_insert, execute_update
+from database import execute_query, execute_one, execute_insert, execute_update, after_commit
 from models import Result, ResultCreate, ResultUpdate
+from pagination import decode_cursor, keyset_condition, set_next_cursor
+from cache import analytics_cache
+from request_scope import RequestScopedRoute, request_connection
+from columnar import FORMAT_QUERY, list_response
 
-router = APIRouter(prefix="/api/results", tags=["results"])
+router = APIRouter(
+    prefix="/api/results", tags=["results"],
+    route_class=RequestScopedRoute,
+    dependencies=[Depends(request_connection)]
+)
 
 
 @router.get("", response_model=List[Result])
 async def get_results(
+    response: Response,
     event_id: Optional[int] = Query(None, description="Filter by event ID"),
     limit: int = Query(100, ge=1, le=1000),
-    offset: int = Query(0, ge=0)
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor; replaces offset"),
+    output_format: str = FORMAT_QUERY
 ):
     query = "SELECT event_id, score_a, score_b, created_at, updated_at FROM results WHERE 1=1"
     params = []
@@ -21,10 +32,23 @@ async def get_results(
         params.append(event_id)
         param_idx += 1
     
-    query += f" ORDER BY created_at DESC LIMIT ${param_idx} OFFSET ${param_idx + 1}"
-    params.extend([limit, offset])
+    if cursor:
+        query += keyset_condition("created_at", "event_id", param_idx)
+        params.extend(decode_cursor(cursor))
+        param_idx += 2
+        query += f" ORDER BY created_at DESC, event_id DESC LIMIT ${param_idx}"
+        params.append(limit)
+    else:
+        query += f" ORDER BY created_at DESC, event_id DESC LIMIT ${param_idx} OFFSET ${param_idx + 1}"
+        params.extend([limit, offset])
+    
+    if output_format == "columnar":
+        columnar, records = await list_response(query, *params, output_format=output_format)
+        set_next_cursor(columnar, records, limit, "created_at", "event_id")
+        return columnar
     
     results = await execute_query(query, *params)
+    set_next_cursor(response, results, limit, "created_at", "event_id")
     return [Result(**row) for row in results]
 
 
@@ -54,6 +78,7 @@ async def create_result(result: ResultCreate):
             result.score_a,
             result.score_b
         )
+        after_commit(lambda: analytics_cache.invalidate("results"))
         return Result(**db_result)
     except Exception as e:
         error_str = str(e).lower()
@@ -106,6 +131,7 @@ async def update_result(event_id: int, result: ResultUpdate):
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Result for event ID {event_id} not found"
         )
+    after_commit(lambda: analytics_cache.invalidate("results"))
     return Result(**result_row)
 
 
@@ -118,5 +144,6 @@ async def delete_result(event_id: int):
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Result for event ID {event_id} not found"
         )
+    after_commit(lambda: analytics_cache.invalidate("results"))
     return None
 
@@ -3,12 +3,22 @@ from typing import List
 from database import execute_query, execute_one, execute_insert, execute_update
 from models import Sport, SportBase
 from auth import get_current_user
+from reference_data import reference_data
+from request_scope import RequestScopedRoute, request_connection
 
-router = APIRouter(prefix="/api/sports", tags=["sports"])
+router = APIRouter(
+    prefix="/api/sports", tags=["sports"],
+    route_class=RequestScopedRoute,
+    dependencies=[Depends(request_connection)]
+)
 
 
 @router.get("", response_model=List[Sport])
 async def get_sports(current_user: dict = Depends(get_current_user)):
+    sports = reference_data.table("sports")
+    if sports:
+        return [Sport(**row) for row in sports.rows]
+    
     query = "SELECT name FROM sports ORDER BY name"
     results = await execute_query(query)
     return [Sport(**row) for row in results]
@@ -16,8 +26,12 @@ async def get_sports(current_user: dict = Depends(get_current_user)):
 
 @router.get("/{name}", response_model=Sport)
 async def get_sport(name: str, current_user: dict = Depends(get_current_user)):
-    query = "SELECT name FROM sports WHERE name = $1"
-    result = await execute_one(query, name)
+    sports = reference_data.table("sports")
+    if sports:
+        result = sports.get(name)
+    else:
+        query = "SELECT name FROM sports WHERE name = $1"
+        result = await execute_one(query, name)
     if not result:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -31,6 +45,7 @@ async def create_sport(sport: SportBase, current_user: dict = Depends(get_curren
     try:
         query = "INSERT INTO sports (name) VALUES ($1) RETURNING name"
         result = await execute_insert(query, sport.name)
+        reference_data.invalidate("sports")
         return Sport(name=sport.name)
     except Exception as e:
         if "duplicate key" in str(e).lower() or "unique constraint" in str(e).lower():
@@ -53,5 +68,6 @@ async def delete_sport(name: str, current_user: dict = Depends(get_current_user)
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Sport '{name}' not found"
         )
+    reference_data.invalidate("sports")
     return None
 
@@ -0,0 +1,44 @@
+from fastapi import APIRouter, HTTPException, status, Query, Depends
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from stream import STREAM_TOPICS, change_stream
+from request_scope import RequestScopedRoute, request_connection
+
+router = APIRouter(
+    prefix="/api/stream", tags=["stream"],
+    route_class=RequestScopedRoute,
+    dependencies=[Depends(request_connection)]
+)
+
+
+@router.get("")
+async def stream_changes(
+    topics: str = Query(",".join(STREAM_TOPICS), description=f"Comma-separated topics: {', '.join(STREAM_TOPICS)}"),
+    event_id: Optional[int] = Query(None, description="Only changes for this event (bets, events, results)"),
+    customer_id: Optional[int] = Query(None, description="Only changes for this customer (bets, balance_changes)"),
+    competition_id: Optional[int] = Query(None, description="Only changes for this competition (events)")
+):
+    requested = {topic.strip() for topic in topics.split(",") if topic.strip()}
+    unknown = requested.difference(STREAM_TOPICS)
+    if unknown or not requested:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown topic(s): {', '.join(sorted(unknown))}. Allowed: {', '.join(STREAM_TOPICS)}"
+        )
+    if not change_stream.started:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Change stream is not running on this server"
+        )
+    
+    filters = {
+        column: value
+        for column, value in (("event_id", event_id), ("customer_id", customer_id), ("competition_id", competition_id))
+        if value is not None
+    }
+    return StreamingResponse(
+        change_stream.events(requested, filters),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,20 +1,59 @@
-from fastapi import APIRouter, HTTPException, status, Query
+from fastapi import APIRouter, HTTPException, status, Query, Request, Response, Depends
 from typing import List, Optional
 from database import execute_query, execute_one, execute_insert, execute_update
-from models import Team, TeamCreate, TeamUpdate
+from models import Team, TeamCreate, TeamUpdate, BatchGetRequest, BatchGetResult
+from pagination import decode_cursor, keyset_condition, set_next_cursor
+from reference_data import reference_data
 from datetime import datetime
+from request_scope import RequestScopedRoute, request_connection
+from batch import fetch_by_ids, order_by_ids
+from conditional import conditional_get
+from columnar import FORMAT_QUERY, columns_from_records, list_response
+from serialization import TrustedJSONResponse
 
-router = APIRouter(prefix="/api/teams", tags=["teams"])
+router = APIRouter(
+    prefix="/api/teams", tags=["teams"],
+    route_class=RequestScopedRoute,
+    dependencies=[Depends(request_connection)]
+)
+
+# Validators for when the reference cache is not loaded: an insert or update moves
+# max(updated_at), a delete changes the count
+TEAM_COLUMNS = ("id", "name", "country", "sport", "created_at", "updated_at")
+TEAMS_VALIDATOR_QUERY = "SELECT count(*) AS row_count, max(updated_at) AS last_modified FROM teams"
 
 
 @router.get("", response_model=List[Team])
 async def get_teams(
+    request: Request,
+    response: Response,
     sport: Optional[str] = Query(None, description="Filter by sport"),
     country: Optional[str] = Query(None, description="Filter by country"),
     limit: int = Query(100, ge=1, le=1000),
-    offset: int = Query(0, ge=0)
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor; replaces offset"),
+    output_format: str = FORMAT_QUERY
 ):
-    query = "SELECT id, name, country, sport, created_at, updated_at FROM teams WHERE 1=1"
+    after = decode_cursor(cursor, sort_type=str) if cursor else None
+    teams = reference_data.table("teams")
+    if teams:
+        conditional_get(request, response, teams.tag, teams.last_modified)
+    else:
+        validators = await execute_one(TEAMS_VALIDATOR_QUERY, statement="get_teams_validators")
+        conditional_get(
+            request, response,
+            f"teams:{validators['row_count']}:{validators['last_modified']}", validators["last_modified"]
+        )
+    cached = teams.select(after, sport=sport or None, country=country or None) if teams else None
+    if cached is not None:
+        results = cached[:limit] if after else cached[offset:offset + limit]
+        set_next_cursor(response, results, limit, "name")
+        if output_format == "columnar":
+            records = [[row[column] for column in TEAM_COLUMNS] for row in results]
+            return TrustedJSONResponse(columns_from_records(TEAM_COLUMNS, records), headers=dict(response.headers))
+        return [Team(**row) for row in results]
+    
+    query = f"SELECT {', '.join(TEAM_COLUMNS)} FROM teams WHERE 1=1"
     params = []
     param_idx = 1
     
@@ -28,25 +67,64 @@ async def get_teams(
         params.append(country)
         param_idx += 1
     
-    query += f" ORDER BY name LIMIT ${param_idx} OFFSET ${param_idx + 1}"
-    params.extend([limit, offset])
+    if cursor:
+        query += keyset_condition("name", "id", param_idx, descending=False)
+        params.extend(after)
+        param_idx += 2
+        query += f" ORDER BY name, id LIMIT ${param_idx}"
+        params.append(limit)
+    else:
+        query += f" ORDER BY name, id LIMIT ${param_idx} OFFSET ${param_idx + 1}"
+        params.extend([limit, offset])
+    
+    if output_format == "columnar":
+        # Carries over the conditional GET headers set above
+        columnar, records = await list_response(
+            query, *params, output_format=output_format, headers=dict(response.headers)
+        )
+        set_next_cursor(columnar, records, limit, "name")
+        return columnar
     
     results = await execute_query(query, *params)
+    set_next_cursor(response, results, limit, "name")
     return [Team(**row) for row in results]
 
 
-@router.get("/{team_id}", response_model=Team)
-async def get_team(team_id: int):
-    query = "SELECT id, name, country, sport, created_at, updated_at FROM teams WHERE id = $1"
-    result = await execute_one(query, team_id)
+async def load_team(team_id: int, teams=None) -> dict:
+    # From the loaded reference data table when given, else from the database
+    if teams:
+        result = teams.get(team_id)
+    else:
+        query = "SELECT id, name, country, sport, created_at, updated_at FROM teams WHERE id = $1"
+        result = await execute_one(query, team_id)
     if not result:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Team with ID {team_id} not found"
         )
+    return result
+
+
+@router.get("/{team_id}", response_model=Team)
+async def get_team(team_id: int, request: Request, response: Response):
+    teams = reference_data.table("teams")
+    result = await load_team(team_id, teams)
+    if teams:
+        conditional_get(request, response, teams.tag, result["updated_at"])
     return Team(**result)
 
 
+@router.post("/batch-get", response_model=BatchGetResult[Team])
+async def batch_get_teams(request: BatchGetRequest):
+    teams = reference_data.table("teams")
+    if teams:
+        items, missing = order_by_ids(request.ids, teams.get)
+    else:
+        query = "SELECT id, name, country, sport, created_at, updated_at FROM teams WHERE id = ANY($1::bigint[])"
+        items, missing = await fetch_by_ids(query, request.ids, statement="batch_get_teams")
+    return BatchGetResult[Team](items=[Team(**row) for row in items], missing=missing)
+
+
 @router.post("", response_model=Team, status_code=status.HTTP_201_CREATED)
 async def create_team(team: TeamCreate):
     try:
@@ -56,6 +134,7 @@ async def create_team(team: TeamCreate):
             RETURNING id, name, country, sport, created_at, updated_at
         """
         result = await execute_one(query, team.name, team.country, team.sport)
+        reference_data.invalidate("teams")
         return Team(**result)
     except Exception as e:
         if "foreign key" in str(e).lower():
@@ -97,7 +176,7 @@ async def update_team(team_id: int, team: TeamUpdate):
     
     if not updates:
         # No updates provided, return current team
-        return await get_team(team_id)
+        return Team(**await load_team(team_id))
     
     query = f"""
         UPDATE teams
@@ -114,6 +193,7 @@ async def update_team(team_id: int, team: TeamUpdate):
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Team with ID {team_id} not found"
             )
+        reference_data.invalidate("teams")
         return Team(**result)
     except Exception as e:
         if "foreign key" in str(e).lower():
@@ -136,5 +216,6 @@ async def delete_team(team_id: int):
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Team with ID {team_id} not found"
         )
+    reference_data.invalidate("teams")
     return None
 
@@ -0,0 +1,148 @@
+# Monte Carlo P&L of open bets. Each market (event, bet_type) settles to one of its backed
+# selections, or to an outcome nobody backed, with implied (1/odds) or supplied probabilities.
+# Bets on one selection win or lose together, so they are summed per selection first: a path
+# costs O(markets) however many bets there are. The NumPy kernel runs in a process pool so a
+# large simulation never blocks the event loop.
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from typing import Optional
+import numpy as np
+from database import execute_query, finish_unit_of_work, get_db_settings
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+# Upper bound on (paths x markets x selections) comparisons held in memory at once
+CHUNK_CELLS = 4_000_000
+
+SIMULATION_QUERY = """
+    SELECT
+        b.event_id,
+        b.bet_type,
+        COALESCE(b.placement_data->>'selection', '') AS selection,
+        COUNT(*) AS bet_count,
+        SUM((b.stake).amount)::float8 AS stake,
+        SUM((b.stake).amount * b.odds)::float8 AS potential_payout,
+        -- Stake-weighted implied probability of the selection
+        (SUM((b.stake).amount / b.odds) / SUM((b.stake).amount))::float8 AS implied_probability
+    FROM bets b{join}
+    WHERE b.placement_status = 'placed' AND b.outcome IS NULL AND (b.stake).currency = $1 AND {scope}
+    GROUP BY 1, 2, 3
+    ORDER BY 1, 2, 3
+"""
+
+
+def build_markets(rows: list[dict], probabilities: Optional[dict] = None) -> tuple[np.ndarray, np.ndarray]:
+    # payouts[m, k]: paid if selection k of market m wins (the last column, nobody's
+    # selection, pays nothing); cumulative[m, k]: P(winner <= k), padded past each
+    # market's selections with an unreachable 2.0
+    probabilities = probabilities or {}
+    markets = [list(rows) for _, rows in groupby(rows, key=lambda row: (row["event_id"], row["bet_type"]))]
+    width = max(len(market) for market in markets)
+    payouts = np.zeros((len(markets), width + 1))
+    cumulative = np.full((len(markets), width), 2.0)
+    for m, market in enumerate(markets):
+        supplied = probabilities.get(market[0]["bet_type"], {})
+        p = np.array([supplied.get(row["selection"], row["implied_probability"]) for row in market])
+        # The bookmaker margin makes implied probabilities add up to more than 1
+        total = p.sum()
+        if total > 1:
+            p /= total
+        cumulative[m, :len(market)] = np.cumsum(p)
+        payouts[m, :len(market)] = [row["potential_payout"] for row in market]
+    return payouts, cumulative
+
+
+def simulate_pnl(payouts: np.ndarray, cumulative: np.ndarray, total_stake: float, simulations: int, seed: Optional[int]) -> dict:
+    # Runs in a pool process; returns plain floats
+    rng = np.random.default_rng(seed)
+    market_index = np.arange(len(payouts))
+    paid = np.empty(simulations)
+    chunk = max(1, CHUNK_CELLS // max(cumulative.size, 1))
+    for start in range(0, simulations, chunk):
+        count = min(chunk, simulations - start)
+        draws = rng.random((count, len(payouts)))
+        # Winner of each market on each path: how many cumulative bounds the draw passed
+        winners = (draws[:, :, None] >= cumulative[None, :, :]).sum(axis=2)
+        paid[start:start + count] = payouts[market_index, winners].sum(axis=1)
+
+    pnl = total_stake - paid
+    values = np.percentile(pnl, PERCENTILES)
+    percentiles = {f"p{p}": float(v) for p, v in zip(PERCENTILES, values)}
+    var_95 = -percentiles["p5"]
+    return {
+        "expected_payout": float(paid.mean()),
+        "max_payout": float(paid.max()),
+        "expected_pnl": float(pnl.mean()),
+        "pnl_std": float(pnl.std()),
+        "pnl_percentiles": percentiles,
+        "value_at_risk_95": max(var_95, 0.0),
+        "value_at_risk_99": max(-percentiles["p1"], 0.0),
+        "expected_shortfall_95": max(float(-pnl[pnl <= -var_95].mean()), 0.0),
+        "probability_of_loss": float((pnl < 0).mean()),
+    }
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_simulation_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: forking a process that runs an event loop and holds pool sockets is unsafe
+        _pool = ProcessPoolExecutor(
+            max_workers=get_db_settings().simulation_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def shutdown_simulation_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+async def simulate_liability(
+    currency: str,
+    simulations: int,
+    event_id: Optional[int] = None,
+    competition_id: Optional[int] = None,
+    probabilities: Optional[dict] = None,
+    seed: Optional[int] = None,
+) -> dict:
+    if event_id is not None:
+        query = SIMULATION_QUERY.format(join="", scope="b.event_id = $2")
+        rows = await execute_query(query, currency, event_id, statement="simulate_event_liability")
+    else:
+        query = SIMULATION_QUERY.format(join=" JOIN events e ON e.id = b.event_id", scope="e.competition_id = $2")
+        rows = await execute_query(query, currency, competition_id, statement="simulate_competition_liability")
+
+    result = {
+        "currency": currency,
+        "simulations": simulations,
+        "bet_count": sum(row["bet_count"] for row in rows),
+        "market_count": len({(row["event_id"], row["bet_type"]) for row in rows}),
+        "total_stake": sum(row["stake"] for row in rows),
+    }
+    if not rows:
+        return {
+            **result,
+            "expected_payout": 0.0, "max_payout": 0.0, "expected_pnl": 0.0, "pnl_std": 0.0,
+            "pnl_percentiles": {f"p{p}": 0.0 for p in PERCENTILES},
+            "value_at_risk_95": 0.0, "value_at_risk_99": 0.0, "expected_shortfall_95": 0.0,
+            "probability_of_loss": 0.0,
+        }
+
+    # Hand the request's connection back to the pool before the long CPU-bound part
+    await finish_unit_of_work(commit=True)
+    payouts, cumulative = build_markets(rows, probabilities)
+    loop = asyncio.get_running_loop()
+    summary = await loop.run_in_executor(
+        get_simulation_pool(), simulate_pnl, payouts, cumulative, result["total_stake"], simulations, seed
+    )
+    return {**result, **summary}
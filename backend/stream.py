@@ -0,0 +1,151 @@
+# Server-Sent Events fan-out of row changes. The notify_row_changes triggers publish the
+# keys of changed rows on one channel; each worker hears them once through the
+# notification hub and hands every subscriber the rows matching its topics and filters.
+# Bursts are coalesced per subscriber into one event per (table, op) every COALESCE_SECONDS.
+import asyncio
+import json
+from typing import AsyncIterator, Iterable, Optional
+from notifications import notification_hub
+from serialization import dumps
+from logger_config import get_logger
+from metrics import stream_subscribers, stream_notifications_total
+
+logger = get_logger(__name__)
+
+STREAM_CHANNEL = "row_changes"
+# topic -> columns its notifications carry (the notify_row_changes trigger arguments)
+STREAM_TOPICS = {
+    "bets": ("id", "event_id", "customer_id"),
+    "events": ("id", "competition_id"),
+    "results": ("event_id",),
+    "balance_changes": ("id", "customer_id"),
+}
+# Filters named after another table's key, per topic (an event's own key is its id)
+FILTER_ALIASES = {"events": {"event_id": "id"}}
+COALESCE_SECONDS = 0.25
+KEEPALIVE_SECONDS = 15.0
+# A subscriber this far behind gets a resync event (refetch everything) instead of the rows
+MAX_PENDING_ROWS = 5000
+
+
+class Subscription:
+    def __init__(self, topics: Iterable[str], filters: dict) -> None:
+        self.topics = frozenset(topics)
+        # topic -> {column: value}; a filter applies to the topics whose rows carry its column
+        self.filters = {}
+        for topic in self.topics:
+            aliases = FILTER_ALIASES.get(topic, {})
+            columns = {aliases.get(column, column): value for column, value in filters.items()}
+            self.filters[topic] = {c: v for c, v in columns.items() if c in STREAM_TOPICS[topic]}
+        self.pending: dict[tuple[str, str], dict[tuple, dict]] = {}
+        self.pending_rows = 0
+        self.overflowed = False
+        self.wakeup = asyncio.Event()
+
+    def add(self, table: str, op: str, rows: list[dict]) -> None:
+        if self.overflowed:
+            return
+        filters = self.filters[table]
+        batch = self.pending.setdefault((table, op), {})
+        for row in rows:
+            if filters and not all(row.get(column) == value for column, value in filters.items()):
+                continue
+            # Repeated changes to one row within the window are reported once
+            key = tuple(row.values())
+            if key not in batch:
+                batch[key] = row
+                self.pending_rows += 1
+        if not batch:
+            del self.pending[(table, op)]
+            return
+        if self.pending_rows > MAX_PENDING_ROWS:
+            self.resync()
+        self.wakeup.set()
+
+    def resync(self) -> None:
+        self.overflowed = True
+        self.pending.clear()
+        self.pending_rows = 0
+        self.wakeup.set()
+
+    def drain(self) -> tuple[bool, dict]:
+        overflowed, pending = self.overflowed, self.pending
+        self.overflowed, self.pending, self.pending_rows = False, {}, 0
+        self.wakeup.clear()
+        return overflowed, pending
+
+
+def sse_event(event: str, data) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+class ChangeStream:
+    def __init__(self) -> None:
+        # topic -> subscriptions, so a notification only visits interested subscribers
+        self._by_topic: dict[str, set[Subscription]] = {topic: set() for topic in STREAM_TOPICS}
+        self.started = False
+
+    async def start(self) -> None:
+        await notification_hub.subscribe(STREAM_CHANNEL, self._on_notify, resync=self._resync_all)
+        self.started = True
+
+    async def stop(self) -> None:
+        self.started = False
+        notification_hub.unsubscribe(STREAM_CHANNEL, self._on_notify)
+        # Wake every open stream so it ends
+        for subscription in self._subscriptions():
+            subscription.wakeup.set()
+
+    def subscribe(self, topics: Iterable[str], filters: Optional[dict] = None) -> Subscription:
+        subscription = Subscription(topics, filters or {})
+        for topic in subscription.topics:
+            self._by_topic[topic].add(subscription)
+        stream_subscribers.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        for topic in subscription.topics:
+            self._by_topic[topic].discard(subscription)
+        stream_subscribers.dec()
+
+    async def events(self, topics: Iterable[str], filters: Optional[dict] = None) -> AsyncIterator[bytes]:
+        # Subscribes on the first iteration, so a response that never starts leaks nothing
+        subscription = self.subscribe(topics, filters)
+        try:
+            yield sse_event("ready", {"topics": sorted(subscription.topics)})
+            while self.started:
+                try:
+                    await asyncio.wait_for(subscription.wakeup.wait(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                # Let the rest of the burst arrive before sending
+                await asyncio.sleep(COALESCE_SECONDS)
+                overflowed, pending = subscription.drain()
+                if overflowed:
+                    yield sse_event("resync", {})
+                    continue
+                for (table, op), rows in pending.items():
+                    yield sse_event(table, {"op": op, "rows": list(rows.values())})
+        finally:
+            self.unsubscribe(subscription)
+
+    def _subscriptions(self) -> set[Subscription]:
+        return set().union(*self._by_topic.values())
+
+    def _on_notify(self, payload: str) -> None:
+        change = json.loads(payload)
+        subscriptions = self._by_topic.get(change["table"])
+        stream_notifications_total.labels(table=change["table"]).inc()
+        if not subscriptions:
+            return
+        for subscription in subscriptions:
+            subscription.add(change["table"], change["op"], change["rows"])
+
+    def _resync_all(self) -> None:
+        # The listener reconnected and may have missed changes
+        for subscription in self._subscriptions():
+            subscription.resync()
+
+
+change_stream = ChangeStream()
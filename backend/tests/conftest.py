@@ -163,7 +163,7 @@ async def clean_db(test_db_pool):
             
             # Delete all data (in reverse order to respect foreign keys)
             table_order = [
-                'audit_log', 'bets', 'balance_changes', 'results', 'events', 
+                'audit_log', 'idempotency_keys', 'bet_daily_rollups', 'bets', 'balance_changes', 'results', 'events', 
                 'customers', 'teams', 'competitions', 'bookies', 'sports'
             ]
             for table_name in table_order:
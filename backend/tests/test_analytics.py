@@ -0,0 +1,181 @@
+import asyncio
+import pytest
+from httpx import AsyncClient
+from cache import ResultCache
+from tests.test_bets import create_test_bet
+
+
+@pytest.mark.asyncio
+async def test_dashboard(client: AsyncClient):
+    response = await client.get("/api/analytics/dashboard")
+    assert response.status_code == 200
+    data = response.json()
+    assert "total_bets" in data["bets"]
+    assert "total_events" in data["results"]
+    assert isinstance(data["bets_by_sport"], list)
+    assert isinstance(data["top_customers"], list)
+    
+    timings = data["timings_ms"]
+    for name in ("bets_summary", "results_summary", "bets_by_sport", "bets_by_status", "top_customers", "total"):
+        assert timings[name] >= 0
+
+
+@pytest.mark.asyncio
+async def test_dashboard_matches_bets_summary(client: AsyncClient):
+    dashboard = (await client.get("/api/analytics/dashboard")).json()
+    summary = (await client.get("/api/analytics/bets/summary")).json()
+    assert dashboard["bets"]["total_bets"] == summary["total_bets"]
+
+
+@pytest.mark.asyncio
+async def test_bets_summary_cache_invalidated_by_bet_write(client: AsyncClient):
+    before = (await client.get("/api/analytics/bets/summary")).json()
+    response = await client.get("/api/analytics/bets/summary")
+    assert response.json() == before
+    assert "age" in response.headers
+    
+    await create_test_bet(client, "TEST-CACHE-001")
+    after = (await client.get("/api/analytics/bets/summary")).json()
+    assert after["total_bets"] == before["total_bets"] + 1
+
+
+@pytest.mark.asyncio
+async def test_max_staleness_validation(client: AsyncClient):
+    response = await client.get("/api/analytics/bets/summary?max_staleness=-1")
+    assert response.status_code == 422
+    
+    response = await client.get("/api/analytics/bets/summary?max_staleness=0")
+    assert response.status_code == 200
+    assert response.headers["age"] == "0"
+
+
+@pytest.mark.asyncio
+async def test_result_cache_coalesces_and_evicts():
+    cache = ResultCache(max_entries=2)
+    calls = []
+    
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return len(calls)
+    
+    results = await asyncio.gather(*(
+        cache.get_or_load(("key",), loader, ttl=60, tables=("bets",)) for _ in range(5)
+    ))
+    assert [value for value, _ in results] == [1] * 5
+    assert len(calls) == 1
+    
+    await cache.get_or_load(("other", 1), loader, ttl=60, tables=("customers",))
+    await cache.get_or_load(("other", 2), loader, ttl=60, tables=("customers",))
+    assert len(cache) == 2
+    
+    cache.invalidate("customers")
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_bet_rollups_follow_settlement_and_delete(client: AsyncClient):
+    before = (await client.get("/api/analytics/bets/summary")).json()
+    bet = await create_test_bet(client, "TEST-ROLLUP-001")
+    
+    response = await client.put(f"/api/bets/{bet['id']}", json={"outcome": "win"})
+    assert response.status_code == 200, response.text
+    settled = (await client.get("/api/analytics/bets/summary")).json()
+    assert settled["total_bets"] == before["total_bets"] + 1
+    assert settled["winning_bets"] == before["winning_bets"] + 1
+    assert settled["total_won"] == pytest.approx(before["total_won"] + 20.0)
+    
+    outcomes = (await client.get("/api/analytics/bets/by-outcome")).json()
+    assert any(row["outcome"] == "win" and row["count"] >= 1 for row in outcomes)
+    
+    response = await client.delete(f"/api/bets/{bet['id']}")
+    assert response.status_code == 204
+    after = (await client.get("/api/analytics/bets/summary")).json()
+    assert after["total_bets"] == before["total_bets"]
+    assert after["winning_bets"] == before["winning_bets"]
+    assert after["total_staked"] == pytest.approx(before["total_staked"])
+
+
+@pytest.mark.asyncio
+async def test_bet_rollups_keep_payout_delta(client: AsyncClient):
+    from database import execute_query, execute_update
+    
+    first = await create_test_bet(client, "TEST-ROLLUP-PAYOUT-1")
+    second = await create_test_bet(client, "TEST-ROLLUP-PAYOUT-2")
+    await execute_update(
+        "UPDATE bets SET stake = ROW(20, 'USD')::money_amount, odds = 3.0 WHERE id = $1", second["id"]
+    )
+    
+    # Swapping the stakes leaves the group's count, stake and odds sums unchanged, not its payout
+    await execute_update(
+        """
+        UPDATE bets b SET stake = o.stake
+        FROM bets o
+        WHERE (b.id, o.id) IN (($1, $2), ($2, $1))
+        """,
+        first["id"], second["id"]
+    )
+    rollup_columns = "day, sport, bookie, placement_status, outcome, currency, bet_count, stake_sum, odds_sum, payout_sum"
+    rollups = await execute_query(f"SELECT {rollup_columns} FROM bet_daily_rollups WHERE bet_count <> 0 ORDER BY 1, 2, 3, 4, 5, 6")
+    await execute_update("SELECT rebuild_bet_daily_rollups()")
+    assert rollups == await execute_query(f"SELECT {rollup_columns} FROM bet_daily_rollups ORDER BY 1, 2, 3, 4, 5, 6")
+
+
+@pytest.mark.asyncio
+async def test_analytics_columnar(client: AsyncClient):
+    await create_test_bet(client, "ANALYTICS-COLUMNAR")
+    
+    rows = (await client.get("/api/analytics/bets/by-sport?max_staleness=0")).json()
+    response = await client.get("/api/analytics/bets/by-sport?format=columnar")
+    assert response.status_code == 200
+    assert "Age" in response.headers
+    body = response.json()
+    assert body["columns"] == list(rows[0])
+    assert body["data"]["sport"] == [row["sport"] for row in rows]
+    
+    response = await client.get("/api/analytics/bets/by-status?format=xml")
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_analytics_conditional_get(client: AsyncClient):
+    response = await client.get("/api/analytics/bets/summary")
+    etag = response.headers["ETag"]
+    response = await client.get("/api/analytics/bets/summary", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    
+    await create_test_bet(client, "ANALYTICS-ETAG")
+    response = await client.get("/api/analytics/bets/summary", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+@pytest.mark.asyncio
+async def test_liability_simulation(client: AsyncClient):
+    bet = await create_test_bet(client, "SIMULATION-1")
+    request = {"event_id": bet["event_id"], "simulations": 2000, "seed": 7}
+    
+    # A certain winner makes every path identical: stake 10 kept, 10 * 2.0 paid
+    response = await client.post("/api/analytics/liability-simulation", json={
+        **request, "probabilities": {"match_winner": {"home_win": 1.0}}
+    })
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["bet_count"] == 1
+    assert data["market_count"] == 1
+    assert data["expected_payout"] == 20.0
+    assert data["expected_pnl"] == -10.0
+    assert data["value_at_risk_99"] == 10.0
+    assert data["probability_of_loss"] == 1.0
+    
+    # Implied probability 1/2.0: about half the paths pay out
+    data = (await client.post("/api/analytics/liability-simulation", json=request)).json()
+    assert 0.4 < data["probability_of_loss"] < 0.6
+    assert data["pnl_percentiles"]["p1"] == -10.0
+    assert data["pnl_percentiles"]["p99"] == 10.0
+    
+    data = (await client.post("/api/analytics/liability-simulation", json={**request, "currency": "EUR"})).json()
+    assert data["bet_count"] == 0
+    
+    response = await client.post("/api/analytics/liability-simulation", json={**request, "competition_id": 1})
+    assert response.status_code == 422
@@ -1,5 +1,6 @@
 import pytest
 from httpx import AsyncClient
+from datetime import datetime, timedelta
 
 
 @pytest.mark.asyncio
@@ -58,3 +59,78 @@ async def test_get_audit_logs_for_record(client: AsyncClient):
             assert all(log["table_name"] == table_name for log in data)
             assert all(log["row_id"] == row_id for log in data)
 
+
+
+@pytest.mark.asyncio
+async def test_export_audit_logs(client: AsyncClient):
+    import json
+    response = await client.get("/api/audit/export?table_name=customers")
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert all(row["table_name"] == "customers" for row in rows)
+    
+    response = await client.get("/api/audit/export?format=csv")
+    assert response.status_code == 200
+    assert response.text.splitlines()[0] == "id,table_name,operation,username,changed_at,row_id,old_data,new_data"
+    
+    response = await client.get("/api/audit/export?format=xml")
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_audit_logs_for_bulk_settlement(client: AsyncClient):
+    teams = (await client.get("/api/teams")).json()
+    comp = (await client.get("/api/competitions")).json()[0]
+    event = (await client.post("/api/events", json={
+        "date": (datetime.now() + timedelta(days=1)).isoformat(),
+        "competition_id": comp["id"],
+        "team_a_id": teams[0]["id"],
+        "team_b_id": teams[1]["id"],
+        "status": "prematch"
+    })).json()
+    customer = (await client.get("/api/customers")).json()[0]
+    
+    bet_ids = {}
+    for bet_id, selection in [("AUDIT-1", "home_win"), ("AUDIT-2", "draw"), ("AUDIT-3", "away_win")]:
+        response = await client.post("/api/bets", json={
+            "bookie": "TestBookie",
+            "customer_id": customer["id"],
+            "bookie_bet_id": bet_id,
+            "bet_type": "match_winner",
+            "event_id": event["id"],
+            "sport": "Football",
+            "placement_status": "placed",
+            "stake": {"amount": 10.0, "currency": "USD"},
+            "odds": 2.5,
+            "placement_data": {"selection": selection}
+        })
+        assert response.status_code == 201, response.text
+        bet_ids[selection] = response.json()["id"]
+    
+    # One UPDATE settles all three bets; each gets its own audit row with its old and new version
+    response = await client.post(f"/api/events/{event['id']}/settle", json={
+        "markets": {"match_winner": {"home_win": "win", "draw": "lose", "away_win": "lose"}}
+    })
+    assert response.status_code == 200
+    
+    for selection, outcome in [("home_win", "win"), ("draw", "lose"), ("away_win", "lose")]:
+        logs = (await client.get(f"/api/audit/table/bets/row/{bet_ids[selection]}")).json()
+        assert sorted(log["operation"] for log in logs) == ["INSERT", "UPDATE"]
+        update = next(log for log in logs if log["operation"] == "UPDATE")
+        assert update["old_data"]["id"] == update["new_data"]["id"] == bet_ids[selection]
+        assert update["old_data"]["outcome"] is None
+        assert update["new_data"]["outcome"] == outcome
+    
+    response = await client.get("/api/audit?table_name=balance_changes&operation=INSERT")
+    settled = [log for log in response.json() if log["new_data"]["change_type"] == "bet_settled"]
+    assert sorted(log["new_data"]["reference_id"] for log in settled) == sorted(f"bet_{i}" for i in bet_ids.values())
+
+
+@pytest.mark.asyncio
+async def test_get_audit_logs_columnar(client: AsyncClient):
+    rows = (await client.get("/api/audit?limit=2")).json()
+    response = await client.get("/api/audit?limit=2&format=columnar")
+    assert response.status_code == 200
+    body = response.json()
+    assert sorted(body["columns"]) == sorted(rows[0])
+    assert body["data"] == {column: [row[column] for row in rows] for column in rows[0]}
@@ -0,0 +1,98 @@
+import asyncio
+import pytest
+from httpx import AsyncClient
+from idempotency import idempotency_store
+
+
+@pytest.mark.asyncio
+async def test_create_balance_change_idempotency_key(client: AsyncClient):
+    customer = (await client.get("/api/customers")).json()[0]
+    change = {
+        "customer_id": customer["id"],
+        "change_type": "top_up",
+        "delta": {"amount": 25.0, "currency": customer["currency"]},
+        "reference_id": "topup-retry",
+        "description": "Retried top up"
+    }
+    headers = {"Idempotency-Key": "balance-key-1"}
+    
+    first = await client.post("/api/balance-changes", json=change, headers=headers)
+    assert first.status_code == 201, first.text
+    replay = await client.post("/api/balance-changes", json=change, headers=headers)
+    assert replay.status_code == 201
+    assert replay.json()["id"] == first.json()["id"]
+    
+    # The balance is only credited once
+    updated = (await client.get(f"/api/customers/{customer['id']}")).json()
+    assert float(updated["balance"]["amount"]) == float(customer["balance"]["amount"]) + 25.0
+
+
+@pytest.mark.asyncio
+async def test_failed_request_releases_idempotency_key(client: AsyncClient):
+    change = {
+        "customer_id": 999999,
+        "change_type": "top_up",
+        "delta": {"amount": 25.0, "currency": "USD"},
+    }
+    headers = {"Idempotency-Key": "balance-key-2"}
+    
+    response = await client.post("/api/balance-changes", json=change, headers=headers)
+    assert response.status_code == 400
+    
+    customer = (await client.get("/api/customers")).json()[0]
+    response = await client.post(
+        "/api/balance-changes",
+        json={**change, "customer_id": customer["id"], "delta": {"amount": 25.0, "currency": customer["currency"]}},
+        headers=headers
+    )
+    assert response.status_code == 201
+
+
+@pytest.mark.asyncio
+async def test_concurrent_idempotency_key_requests_write_once(client: AsyncClient):
+    customer = (await client.get("/api/customers")).json()[0]
+    change = {
+        "customer_id": customer["id"],
+        "change_type": "top_up",
+        "delta": {"amount": 10.0, "currency": customer["currency"]},
+    }
+    headers = {"Idempotency-Key": "balance-key-3"}
+    
+    # The second request waits for the first to commit, then replays its response
+    responses = await asyncio.gather(*(
+        client.post("/api/balance-changes", json=change, headers=headers) for _ in range(2)
+    ))
+    assert [response.status_code for response in responses] == [201, 201]
+    assert sorted(response.headers["idempotent-replayed"] for response in responses) == ["false", "true"]
+    assert responses[0].json()["id"] == responses[1].json()["id"]
+    
+    updated = (await client.get(f"/api/customers/{customer['id']}")).json()
+    assert float(updated["balance"]["amount"]) == float(customer["balance"]["amount"]) + 10.0
+
+
+@pytest.mark.asyncio
+async def test_idempotent_write_rolls_back_without_stored_response(client: AsyncClient, monkeypatch):
+    customer = (await client.get("/api/customers")).json()[0]
+    change = {
+        "customer_id": customer["id"],
+        "change_type": "top_up",
+        "delta": {"amount": 10.0, "currency": customer["currency"]},
+    }
+    headers = {"Idempotency-Key": "balance-key-4"}
+    
+    async def fail_complete(*args):
+        raise RuntimeError("response not stored")
+    
+    with monkeypatch.context() as patch:
+        patch.setattr(idempotency_store, "_complete", fail_complete)
+        with pytest.raises(RuntimeError):
+            await client.post("/api/balance-changes", json=change, headers=headers)
+    unchanged = (await client.get(f"/api/customers/{customer['id']}")).json()
+    assert unchanged["balance"] == customer["balance"]
+    
+    # The key was released with the write, so the retry credits the customer once
+    response = await client.post("/api/balance-changes", json=change, headers=headers)
+    assert response.status_code == 201
+    assert response.headers["idempotent-replayed"] == "false"
+    updated = (await client.get(f"/api/customers/{customer['id']}")).json()
+    assert float(updated["balance"]["amount"]) == float(customer["balance"]["amount"]) + 10.0
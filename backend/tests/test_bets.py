@@ -1,3 +1,4 @@
+import json
 import pytest
 from httpx import AsyncClient
 from decimal import Decimal
@@ -60,6 +61,9 @@ async def test_create_bet(client: AsyncClient):
     assert data["bookie"] == "TestBookie"
     assert data["bookie_bet_id"] == "TEST-001"
     assert data["placement_status"] == "placed"
+    assert data["stake"]["currency"] == "USD"
+    assert float(data["stake"]["amount"]) == 100.0
+    assert data["placement_data"] == {"selection": "home_win"}
     assert "id" in data
 
 
@@ -119,3 +123,227 @@ async def test_delete_bet(client: AsyncClient):
         response = await client.get(f"/api/bets/{bet_id}")
         assert response.status_code == 404
 
+
+
+async def create_test_bet(client: AsyncClient, bookie_bet_id: str, placement_status: str = "placed") -> dict:
+    from datetime import datetime, timedelta
+    teams = (await client.get("/api/teams")).json()
+    comp = (await client.get("/api/competitions")).json()[0]
+    event_response = await client.post("/api/events", json={
+        "date": (datetime.now() + timedelta(days=1)).isoformat(),
+        "competition_id": comp["id"],
+        "team_a_id": teams[0]["id"],
+        "team_b_id": teams[1]["id"],
+        "status": "prematch"
+    })
+    customer_id = (await client.get("/api/customers")).json()[0]["id"]
+    response = await client.post("/api/bets", json={
+        "bookie": "TestBookie",
+        "customer_id": customer_id,
+        "bookie_bet_id": bookie_bet_id,
+        "bet_type": "match_winner",
+        "event_id": event_response.json()["id"],
+        "sport": "Football",
+        "placement_status": placement_status,
+        "stake": {"amount": 10.0, "currency": "USD"},
+        "odds": 2.0,
+        "placement_data": {"selection": "home_win"}
+    })
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+@pytest.mark.asyncio
+async def test_get_bets_matches_created_bet(client: AsyncClient):
+    created = await create_test_bet(client, "TEST-LIST-001")
+    
+    response = await client.get(f"/api/bets/{created['id']}")
+    assert response.status_code == 200
+    assert response.json() == created
+    
+    response = await client.get("/api/bets")
+    assert response.status_code == 200
+    assert response.json()[0] == created
+
+
+@pytest.mark.asyncio
+async def test_export_bets_ndjson(client: AsyncClient):
+    import json
+    created = await create_test_bet(client, "TEST-EXPORT-001")
+    
+    response = await client.get("/api/bets/export", params={"bookie": "TestBookie"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert rows == [created]
+    
+    response = await client.get("/api/bets/export", params={"bookie": "NoSuchBookie"})
+    assert response.status_code == 200
+    assert response.text == ""
+
+
+@pytest.mark.asyncio
+async def test_export_bets_csv(client: AsyncClient):
+    import csv
+    import io
+    created = await create_test_bet(client, "TEST-EXPORT-002")
+    
+    response = await client.get("/api/bets/export?format=csv")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == 1
+    assert rows[0]["id"] == str(created["id"])
+    assert rows[0]["stake_currency"] == "USD"
+    assert rows[0]["placement_data"] == '{"selection":"home_win"}'
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_bets_reports_rejected_rows(client: AsyncClient):
+    existing = await create_test_bet(client, "BULK-EXISTING")
+    customer = (await client.get(f"/api/customers/{existing['customer_id']}")).json()
+    
+    def bet(bookie_bet_id, **overrides):
+        row = {
+            "bookie": "TestBookie",
+            "customer_id": existing["customer_id"],
+            "bookie_bet_id": bookie_bet_id,
+            "bet_type": "match_winner",
+            "event_id": existing["event_id"],
+            "sport": "Football",
+            "placement_status": "placed",
+            "stake": {"amount": 5.0, "currency": "USD"},
+            "odds": 1.5,
+            "placement_data": {"selection": "draw"}
+        }
+        row.update(overrides)
+        return row
+    
+    response = await client.post("/api/bets/bulk", json=[
+        bet("BULK-1"),
+        bet("BULK-EXISTING"),
+        bet("BULK-1"),
+        bet("BULK-2", customer_id=999999),
+        bet("BULK-3", stake={"amount": 5.0, "currency": "EUR"}),
+        bet("BULK-4", odds=0.5),
+        bet("BULK-5", placement_status="pending"),
+    ])
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert [row["index"] for row in data["created"]] == [0, 6]
+    errors = {row["index"]: row["error"] for row in data["rejected"]}
+    assert set(errors) == {1, 2, 3, 4, 5}
+    assert "already exists" in errors[1]
+    assert "within the request" in errors[2]
+    assert "customer_id" in errors[3]
+    assert "currency" in errors[4]
+    assert "odds" in errors[5]
+    
+    created = (await client.get(f"/api/bets/{data['created'][0]['id']}")).json()
+    assert created["bookie_bet_id"] == "BULK-1"
+    assert created["placement_data"] == {"selection": "draw"}
+    
+    # Only the placed bet is charged, through one balance change
+    updated = (await client.get(f"/api/customers/{existing['customer_id']}")).json()
+    assert float(updated["balance"]["amount"]) == float(customer["balance"]["amount"]) - 5.0
+    changes = (await client.get(
+        f"/api/balance-changes?customer_id={existing['customer_id']}&change_type=bet_placed"
+    )).json()
+    assert len(changes) == 2
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_bets_ndjson(client: AsyncClient):
+    existing = await create_test_bet(client, "BULK-NDJSON-BASE", placement_status="pending")
+    lines = [
+        json.dumps({
+            **{key: existing[key] for key in ("bookie", "customer_id", "bet_type", "event_id", "sport", "stake", "odds")},
+            "bookie_bet_id": f"BULK-ND-{i}",
+            "placement_status": "pending"
+        })
+        for i in range(3)
+    ]
+    response = await client.post(
+        "/api/bets/bulk",
+        content="\n".join(lines) + "\n",
+        headers={"Content-Type": "application/x-ndjson"}
+    )
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert len(data["created"]) == 3
+    assert data["rejected"] == []
+    
+    response = await client.post("/api/bets/bulk", content="{not json", headers={"Content-Type": "application/json"})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_create_bet_idempotency_key_replays_response(client: AsyncClient):
+    existing = await create_test_bet(client, "IDEMPOTENT-BASE")
+    bet_data = {
+        **{key: existing[key] for key in ("bookie", "customer_id", "bet_type", "event_id", "sport", "stake", "odds")},
+        "bookie_bet_id": "IDEMPOTENT-1",
+        "placement_status": "placed"
+    }
+    headers = {"Idempotency-Key": "bet-key-1"}
+    
+    first = await client.post("/api/bets", json=bet_data, headers=headers)
+    assert first.status_code == 201
+    assert first.headers["idempotent-replayed"] == "false"
+    
+    replay = await client.post("/api/bets", json=bet_data, headers=headers)
+    assert replay.status_code == 201
+    assert replay.headers["idempotent-replayed"] == "true"
+    assert replay.json() == first.json()
+    
+    response = await client.post("/api/bets", json={**bet_data, "odds": 3.0}, headers=headers)
+    assert response.status_code == 422
+    
+    # Without a key the duplicate still reaches the unique constraint
+    response = await client.post("/api/bets", json=bet_data)
+    assert response.status_code == 409
+
+
+@pytest.mark.asyncio
+async def test_get_bets_sparse_fields(client: AsyncClient):
+    await create_test_bet(client, "FIELDS-1")
+    await create_test_bet(client, "FIELDS-2")
+    
+    response = await client.get("/api/bets?fields=placement_status,outcome&limit=1")
+    assert response.status_code == 200
+    bets = response.json()
+    assert bets
+    assert set(bets[0]) == {"id", "placement_status", "outcome"}
+    next_cursor = response.headers.get("X-Next-Cursor")
+    assert next_cursor
+    
+    full = (await client.get("/api/bets?limit=2")).json()
+    response = await client.get(f"/api/bets?fields=stake&limit=1&cursor={next_cursor}")
+    assert [bet["id"] for bet in response.json()] == [full[1]["id"]]
+    
+    response = await client.get(f"/api/bets/{full[0]['id']}?fields=stake")
+    assert response.json() == {"id": full[0]["id"], "stake": full[0]["stake"]}
+    
+    response = await client.get("/api/bets?fields=stake,secret")
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_get_bets_columnar(client: AsyncClient):
+    await create_test_bet(client, "COLUMNAR-1")
+    await create_test_bet(client, "COLUMNAR-2")
+    
+    rows = (await client.get("/api/bets?limit=2")).json()
+    response = await client.get("/api/bets?limit=2&format=columnar")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["columns"] == list(rows[0])
+    assert body["data"]["id"] == [row["id"] for row in rows]
+    assert body["data"]["stake"] == [row["stake"] for row in rows]
+    assert response.headers.get("X-Next-Cursor")
+    
+    response = await client.get("/api/bets?fields=outcome&limit=1&format=columnar")
+    assert response.json()["columns"] == ["id", "outcome"]
+    
+    response = await client.get("/api/bets?customer_id=987654321&format=columnar&fields=outcome")
+    assert response.json() == {"columns": ["id", "outcome"], "data": {"id": [], "outcome": []}}
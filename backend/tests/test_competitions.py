@@ -0,0 +1,28 @@
+import pytest
+from httpx import AsyncClient
+
+
+@pytest.mark.asyncio
+async def test_update_competition(client: AsyncClient):
+    competition_data = {
+        "name": "Championship",
+        "country": "England",
+        "sport": "Football"
+    }
+    response = await client.post("/api/competitions", json=competition_data)
+    assert response.status_code == 201
+    competition_id = response.json()["id"]
+    
+    response = await client.put(f"/api/competitions/{competition_id}", json={"active": False})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["active"] is False
+    assert data["name"] == "Championship"
+    
+    # An empty body changes nothing and returns the current competition
+    response = await client.put(f"/api/competitions/{competition_id}", json={})
+    assert response.status_code == 200
+    assert response.json() == data
+    
+    response = await client.put("/api/competitions/987654321", json={})
+    assert response.status_code == 404
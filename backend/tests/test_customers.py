@@ -1,3 +1,4 @@
+import asyncio
 import pytest
 from httpx import AsyncClient
 
@@ -145,3 +146,163 @@ async def test_delete_customer(client: AsyncClient):
     response = await client.get(f"/api/customers/{customer_id}")
     assert response.status_code == 404
 
+
+
+@pytest.mark.asyncio
+async def test_customer_stats_refreshed_in_background(client: AsyncClient):
+    from database import execute_one
+    from notifications import notification_hub
+    from refresher import MaterializedViewRefresher
+    
+    refresher = MaterializedViewRefresher("customer_stats", "customer_stats_dirty")
+    await notification_hub.start()
+    await refresher.start(0)
+    try:
+        response = await client.post("/api/customers", json={
+            "username": "stats_user",
+            "password": "password123",
+            "real_name": "Stats User",
+            "currency": "USD",
+            "status": "active",
+            "balance": {"amount": 50.0, "currency": "USD"}
+        })
+        assert response.status_code == 201
+        customer_id = response.json()["id"]
+        
+        row = None
+        for _ in range(50):
+            row = await execute_one("SELECT * FROM customer_stats WHERE customer_id = $1", customer_id)
+            if row:
+                break
+            await asyncio.sleep(0.1)
+        assert row is not None
+        assert row["total_bets"] == 0
+    finally:
+        await refresher.stop()
+        await notification_hub.stop()
+
+
+@pytest.mark.asyncio
+async def test_customer_stats_refresh_skipped_while_another_worker_refreshes(client: AsyncClient):
+    from database import get_db_connection
+    from metrics import registry
+    from refresher import MaterializedViewRefresher
+    
+    refresher = MaterializedViewRefresher("customer_stats", "customer_stats_dirty")
+    
+    def refreshes() -> float:
+        return registry.get_sample_value(
+            "materialized_view_refresh_duration_seconds_count", {"view": "customer_stats"}
+        ) or 0.0
+    
+    before = refreshes()
+    # Another worker's refresh holds the lock
+    async with get_db_connection() as conn:
+        async with conn.transaction():
+            await conn.execute(
+                "SELECT pg_advisory_xact_lock(hashtext('refresh_materialized_view'), hashtext('customer_stats'))"
+            )
+            refresher.mark_dirty()
+            await refresher.refresh()
+            assert refresher.staleness() == 0.0
+            assert refreshes() == before
+    
+    await refresher.refresh()
+    assert refreshes() == before + 1
+
+
+@pytest.mark.asyncio
+async def test_batch_get_customers(client: AsyncClient):
+    ids = []
+    for username in ["batch_a", "batch_b"]:
+        response = await client.post("/api/customers", json={
+            "username": username,
+            "password": "password123",
+            "real_name": "Batch User",
+            "currency": "USD",
+            "status": "active",
+            "balance": {"amount": 10.0, "currency": "USD"}
+        })
+        assert response.status_code == 201
+        ids.append(response.json()["id"])
+    
+    response = await client.post("/api/customers/batch-get", json={"ids": [ids[1], 424242, ids[0]]})
+    assert response.status_code == 200
+    data = response.json()
+    assert [customer["username"] for customer in data["items"]] == ["batch_b", "batch_a"]
+    assert data["items"][0]["balance"]["currency"] == "USD"
+    assert data["missing"] == [424242]
+
+
+@pytest.mark.asyncio
+async def test_customer_balance_ledger(client: AsyncClient, test_db_pool):
+    from database import close_pool, create_pool, get_db_settings
+    
+    customer_data = {
+        "username": "ledger_test",
+        "password": "pass123",
+        "real_name": "Ledger Test",
+        "currency": "USD",
+        "status": "active",
+        "balance": {"amount": 100.0, "currency": "USD"},
+        "preferences": {}
+    }
+    response = await client.post("/api/customers", json=customer_data)
+    assert response.status_code == 201
+    customer_id = response.json()["id"]
+    
+    # A balance set directly moves the ledger with it
+    response = await client.put(f"/api/customers/{customer_id}", json={"balance": {"amount": 150.0, "currency": "USD"}})
+    assert response.status_code == 200
+    
+    insert_change = """
+        INSERT INTO balance_changes (customer_id, change_type, delta, description)
+        VALUES ($1, $2, ROW($3, 'USD')::money_amount, 'ledger test')
+    """
+    db_name = get_db_settings().db_name
+    async with test_db_pool.acquire() as conn:
+        await conn.execute(f'ALTER DATABASE "{db_name}" SET app.balance_ledger = \'on\'')
+    try:
+        # Connections opened from here on run in ledger mode
+        await close_pool()
+        await create_pool()
+        
+        response = await client.post("/api/balance-changes", json={
+            "customer_id": customer_id,
+            "change_type": "withdrawal",
+            "delta": {"amount": -40.0, "currency": "USD"},
+        })
+        assert response.status_code == 201
+        
+        response = await client.get(f"/api/customers/{customer_id}")
+        assert response.status_code == 200
+        assert float(response.json()["balance"]["amount"]) == 110.0
+        
+        async with test_db_pool.acquire() as conn:
+            # customers.balance is no longer written; debits are checked against the ledger
+            assert float(await conn.fetchval("SELECT (balance).amount FROM customers WHERE id = $1", customer_id)) == 150.0
+            await conn.execute("SET app.balance_ledger = 'on'")
+            with pytest.raises(Exception, match="Insufficient balance"):
+                await conn.execute(insert_change, customer_id, "withdrawal", -120)
+            await conn.execute(insert_change, customer_id, "top_up", 15)
+            await conn.execute("RESET app.balance_ledger")
+            
+            # Changes older than the snapshot horizon (the oldest open transaction, less a margin) are folded
+            await asyncio.sleep(1.2)
+            assert await conn.fetchval("SELECT snapshot_customer_balances()") >= 1
+            snapshot = await conn.fetchrow(
+                "SELECT amount, as_of FROM customer_balance_snapshots WHERE customer_id = $1", customer_id
+            )
+            assert float(snapshot["amount"]) == 125.0
+            assert await conn.fetchval(
+                "SELECT COUNT(*) FROM balance_changes WHERE customer_id = $1 AND created_at >= $2",
+                customer_id, snapshot["as_of"]
+            ) == 0
+        
+        response = await client.get(f"/api/customers/{customer_id}")
+        assert float(response.json()["balance"]["amount"]) == 125.0
+    finally:
+        async with test_db_pool.acquire() as conn:
+            await conn.execute(f'ALTER DATABASE "{db_name}" RESET app.balance_ledger')
+        await close_pool()
+        await create_pool()
@@ -0,0 +1,47 @@
+import pytest
+from httpx import AsyncClient
+
+
+@pytest.mark.asyncio
+async def test_unit_of_work_shares_one_connection(client: AsyncClient):
+    from database import begin_unit_of_work, execute_one, execute_update, finish_unit_of_work
+    
+    await begin_unit_of_work(transactional=True)
+    first = await execute_one("SELECT pg_backend_pid() AS pid")
+    await execute_update("INSERT INTO sports (name) VALUES ('Unit Of Work Sport')")
+    second = await execute_one("SELECT pg_backend_pid() AS pid, EXISTS (SELECT 1 FROM sports WHERE name = 'Unit Of Work Sport') AS seen")
+    await finish_unit_of_work(commit=False)
+    
+    assert first["pid"] == second["pid"]
+    assert second["seen"]
+    # Rolled back, and later queries go back to the pool
+    assert await execute_one("SELECT 1 FROM sports WHERE name = 'Unit Of Work Sport'") is None
+
+
+@pytest.mark.asyncio
+async def test_unit_of_work_not_shared_with_child_tasks(client: AsyncClient):
+    import asyncio
+    from database import begin_unit_of_work, execute_one, finish_unit_of_work
+    
+    await begin_unit_of_work()
+    try:
+        own = await execute_one("SELECT pg_backend_pid() AS pid")
+        # Concurrent queries from child tasks cannot share one connection
+        rows = await asyncio.gather(*(execute_one("SELECT pg_backend_pid() AS pid, pg_sleep(0.05)") for _ in range(2)))
+        assert own["pid"] not in {row["pid"] for row in rows}
+    finally:
+        await finish_unit_of_work(commit=True)
+
+
+@pytest.mark.asyncio
+async def test_request_queries_share_one_connection(client: AsyncClient):
+    from metrics import registry
+    
+    def acquisitions() -> float:
+        return registry.get_sample_value("db_pool_acquire_duration_seconds_count") or 0.0
+    
+    before = acquisitions()
+    # The validators query and the list query check out one pool connection
+    response = await client.get("/api/teams")
+    assert response.status_code == 200
+    assert acquisitions() - before == 1
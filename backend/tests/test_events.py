@@ -154,3 +154,327 @@ async def test_delete_event(client: AsyncClient):
     response = await client.get(f"/api/events/{event_id}")
     assert response.status_code == 404
 
+
+
+@pytest.mark.asyncio
+async def test_settle_event_from_result(client: AsyncClient):
+    teams = (await client.get("/api/teams")).json()
+    comp = (await client.get("/api/competitions")).json()[0]
+    event = (await client.post("/api/events", json={
+        "date": (datetime.now() + timedelta(days=1)).isoformat(),
+        "competition_id": comp["id"],
+        "team_a_id": teams[0]["id"],
+        "team_b_id": teams[1]["id"],
+        "status": "prematch"
+    })).json()
+    customer = (await client.get("/api/customers")).json()[0]
+    starting_balance = float(customer["balance"]["amount"])
+    
+    for bet_id, bet_type, selection in [
+        ("SETTLE-1", "match_winner", "home_win"),
+        ("SETTLE-2", "match_winner", "draw"),
+        ("SETTLE-3", "total_points", "over_2.5"),
+    ]:
+        response = await client.post("/api/bets", json={
+            "bookie": "TestBookie",
+            "customer_id": customer["id"],
+            "bookie_bet_id": bet_id,
+            "bet_type": bet_type,
+            "event_id": event["id"],
+            "sport": "Football",
+            "placement_status": "placed",
+            "stake": {"amount": 10.0, "currency": "USD"},
+            "odds": 2.5,
+            "placement_data": {"selection": selection}
+        })
+        assert response.status_code == 201, response.text
+    
+    response = await client.post(f"/api/events/{event['id']}/settle", json={})
+    assert response.status_code == 400
+    
+    await client.post("/api/results", json={"event_id": event["id"], "score_a": 2, "score_b": 1})
+    response = await client.post(f"/api/events/{event['id']}/settle", json={})
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["settled_bets"] == 2
+    assert data["unsettled_bets"] == 1
+    assert data["outcomes"]["win"]["count"] == 1
+    assert float(data["outcomes"]["win"]["total_payout"]) == 25.0
+    assert float(data["outcomes"]["lose"]["total_payout"]) == 0.0
+    
+    customer = (await client.get(f"/api/customers/{customer['id']}")).json()
+    assert float(customer["balance"]["amount"]) == starting_balance - 30.0 + 25.0
+    
+    # Remaining bets settle through an explicit market mapping; settled bets are not touched again
+    response = await client.post(f"/api/events/{event['id']}/settle", json={
+        "markets": {"total_points": {"over_2.5": "void"}}
+    })
+    assert response.status_code == 200
+    data = response.json()
+    assert data["settled_bets"] == 1
+    assert data["unsettled_bets"] == 0
+    assert float(data["outcomes"]["void"]["total_payout"]) == 10.0
+    
+    changes = (await client.get(f"/api/balance-changes?customer_id={customer['id']}&change_type=bet_settled")).json()
+    assert len(changes) == 3
+
+
+@pytest.mark.asyncio
+async def test_settle_missing_event(client: AsyncClient):
+    response = await client.post("/api/events/999999/settle", json={"markets": {}})
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_get_events_expand(client: AsyncClient):
+    teams = (await client.get("/api/teams")).json()
+    comp = (await client.get("/api/competitions")).json()[0]
+    event = (await client.post("/api/events", json={
+        "date": (datetime.now() + timedelta(days=2)).isoformat(),
+        "competition_id": comp["id"],
+        "team_a_id": teams[0]["id"],
+        "team_b_id": teams[1]["id"],
+        "status": "prematch"
+    })).json()
+    customer = (await client.get("/api/customers")).json()[0]
+    response = await client.post("/api/bets", json={
+        "bookie": "TestBookie",
+        "customer_id": customer["id"],
+        "bookie_bet_id": "EXPAND-1",
+        "bet_type": "match_winner",
+        "event_id": event["id"],
+        "sport": "Football",
+        "placement_status": "placed",
+        "stake": {"amount": 12.5, "currency": "USD"},
+        "odds": 2.0,
+        "placement_data": {"selection": "home_win"}
+    })
+    assert response.status_code == 201, response.text
+    
+    # Without expand the shape is unchanged
+    data = (await client.get(f"/api/events/{event['id']}")).json()
+    assert "team_a" not in data and "bet_summary" not in data
+    
+    response = await client.get(f"/api/events/{event['id']}?expand=teams,competition,result,bet_summary")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["team_a"]["id"] == teams[0]["id"]
+    assert data["team_b"]["name"] == teams[1]["name"]
+    assert data["competition"]["id"] == comp["id"]
+    assert data["result"] is None
+    assert data["bet_summary"]["bet_count"] == 1
+    assert data["bet_summary"]["open_bet_count"] == 1
+    assert float(data["bet_summary"]["stake_by_currency"]["USD"]) == 12.5
+    
+    response = await client.get("/api/events?expand=competition&limit=5")
+    assert response.status_code == 200
+    assert all(e["competition"]["id"] == e["competition_id"] for e in response.json())
+    
+    response = await client.get("/api/events?expand=venue")
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_get_event_expand_from_reference_cache(client: AsyncClient):
+    from notifications import notification_hub
+    from reference_data import reference_data
+    
+    teams = (await client.get("/api/teams")).json()
+    comp = (await client.get("/api/competitions")).json()[0]
+    event = (await client.post("/api/events", json={
+        "date": (datetime.now() + timedelta(days=2)).isoformat(),
+        "competition_id": comp["id"],
+        "team_a_id": teams[0]["id"],
+        "team_b_id": teams[1]["id"],
+        "status": "prematch"
+    })).json()
+    expected = (await client.get(f"/api/events/{event['id']}?expand=teams,competition")).json()
+    
+    await notification_hub.start()
+    await reference_data.start()
+    try:
+        data = (await client.get(f"/api/events/{event['id']}?expand=teams,competition")).json()
+        assert data == expected
+    finally:
+        await reference_data.stop()
+        await notification_hub.stop()
+
+
+@pytest.mark.asyncio
+async def test_event_exposure(client: AsyncClient):
+    import asyncio
+    from notifications import notification_hub
+    from exposure import exposure_engine
+    
+    teams = (await client.get("/api/teams")).json()
+    comp = (await client.get("/api/competitions")).json()[0]
+    event = (await client.post("/api/events", json={
+        "date": (datetime.now() + timedelta(days=1)).isoformat(),
+        "competition_id": comp["id"],
+        "team_a_id": teams[0]["id"],
+        "team_b_id": teams[1]["id"],
+        "status": "prematch"
+    })).json()
+    customer = (await client.get("/api/customers")).json()[0]
+    
+    async def place(bet_id: str, selection: str, stake: float, odds: float):
+        response = await client.post("/api/bets", json={
+            "bookie": "TestBookie",
+            "customer_id": customer["id"],
+            "bookie_bet_id": bet_id,
+            "bet_type": "match_winner",
+            "event_id": event["id"],
+            "sport": "Football",
+            "placement_status": "placed",
+            "stake": {"amount": stake, "currency": "USD"},
+            "odds": odds,
+            "placement_data": {"selection": selection}
+        })
+        assert response.status_code == 201, response.text
+    
+    await place("EXPOSURE-1", "home_win", 10.0, 3.0)
+    await place("EXPOSURE-2", "home_win", 10.0, 2.0)
+    await place("EXPOSURE-3", "draw", 20.0, 1.5)
+    
+    response = await client.get(f"/api/events/{event['id']}/exposure")
+    assert response.status_code == 200
+    data = response.json()
+    selections = {s["selection"]: s for s in data["markets"][0]["selections"]}
+    assert float(selections["home_win"]["potential_payout"]) == 50.0
+    # Stakes of 40 kept, 50 paid out
+    assert float(selections["home_win"]["net_if_wins"]) == -10.0
+    assert float(selections["draw"]["net_if_wins"]) == 10.0
+    assert data["totals"] == [{"currency": "USD", "bet_count": 3, "stake": "40.0000", "worst_case_liability": "10.0000"}]
+    
+    await notification_hub.start()
+    await exposure_engine.start()
+    try:
+        assert (await client.get(f"/api/events/{event['id']}/exposure")).json() == data
+        
+        # Picked up from the bets notification, without a reload
+        await place("EXPOSURE-4", "draw", 10.0, 4.0)
+        for _ in range(50):
+            data = (await client.get(f"/api/events/{event['id']}/exposure")).json()
+            if data["totals"][0]["bet_count"] == 4:
+                break
+            await asyncio.sleep(0.1)
+        assert data["totals"][0]["worst_case_liability"] == "20.0000"
+        
+        top = (await client.get("/api/analytics/exposure?currency=USD&limit=100")).json()
+        assert {"event_id": event["id"], **data["totals"][0]} in top
+        assert top == sorted(top, key=lambda row: float(row["worst_case_liability"]), reverse=True)
+    finally:
+        await exposure_engine.stop()
+        await notification_hub.stop()
+    
+    assert (await client.get("/api/events/987654321/exposure")).json()["markets"] == []
+
+
+@pytest.mark.asyncio
+async def test_event_exposure_follows_moved_bet(client: AsyncClient):
+    import asyncio
+    from notifications import notification_hub
+    from exposure import exposure_engine
+    
+    teams = (await client.get("/api/teams")).json()
+    comp = (await client.get("/api/competitions")).json()[0]
+    events = []
+    for days in (1, 2):
+        events.append((await client.post("/api/events", json={
+            "date": (datetime.now() + timedelta(days=days)).isoformat(),
+            "competition_id": comp["id"],
+            "team_a_id": teams[0]["id"],
+            "team_b_id": teams[1]["id"],
+            "status": "prematch"
+        })).json())
+    customer = (await client.get("/api/customers")).json()[0]
+    
+    async def exposure_totals(event_id: int) -> list:
+        return (await client.get(f"/api/events/{event_id}/exposure")).json()["totals"]
+    
+    await notification_hub.start()
+    await exposure_engine.start()
+    try:
+        response = await client.post("/api/bets", json={
+            "bookie": "TestBookie",
+            "customer_id": customer["id"],
+            "bookie_bet_id": "EXPOSURE-MOVE-1",
+            "bet_type": "match_winner",
+            "event_id": events[0]["id"],
+            "sport": "Football",
+            "placement_status": "placed",
+            "stake": {"amount": 10.0, "currency": "USD"},
+            "odds": 3.0,
+            "placement_data": {"selection": "home_win"}
+        })
+        assert response.status_code == 201, response.text
+        bet = response.json()
+        for _ in range(50):
+            if await exposure_totals(events[0]["id"]):
+                break
+            await asyncio.sleep(0.1)
+        assert (await exposure_totals(events[0]["id"]))[0]["bet_count"] == 1
+        
+        response = await client.put(f"/api/bets/{bet['id']}", json={"event_id": events[1]["id"]})
+        assert response.status_code == 200, response.text
+        # Both events are refreshed from the update's notification
+        for _ in range(50):
+            old_totals, new_totals = await exposure_totals(events[0]["id"]), await exposure_totals(events[1]["id"])
+            if not old_totals and new_totals:
+                break
+            await asyncio.sleep(0.1)
+        assert old_totals == []
+        assert new_totals[0]["bet_count"] == 1
+        
+        top = (await client.get("/api/analytics/exposure?currency=USD&limit=100")).json()
+        assert events[0]["id"] not in {row["event_id"] for row in top}
+        assert events[1]["id"] in {row["event_id"] for row in top}
+    finally:
+        await exposure_engine.stop()
+        await notification_hub.stop()
+
+
+@pytest.mark.asyncio
+async def test_get_events_and_results_columnar(client: AsyncClient):
+    from notifications import notification_hub
+    from reference_data import reference_data
+    
+    teams = (await client.get("/api/teams")).json()
+    comp = (await client.get("/api/competitions")).json()[0]
+    for days in (1, 2):
+        event = (await client.post("/api/events", json={
+            "date": (datetime.now() + timedelta(days=days)).isoformat(),
+            "competition_id": comp["id"],
+            "team_a_id": teams[0]["id"],
+            "team_b_id": teams[1]["id"],
+            "status": "finished"
+        })).json()
+        await client.post("/api/results", json={"event_id": event["id"], "score_a": days, "score_b": 0})
+    
+    def same_rows(body: dict, rows: list) -> None:
+        # Related rows are compared by id: their timestamps are formatted by the database
+        # in columnar output and by the response model in JSON output
+        assert sorted(body["columns"]) == sorted(rows[0])
+        for column in rows[0]:
+            values = [row[column] for row in rows]
+            if column in ("team_a", "team_b", "competition"):
+                assert [value["id"] for value in body["data"][column]] == [value["id"] for value in values]
+            else:
+                assert body["data"][column] == values
+    
+    for path in ("/api/events?limit=2", "/api/events?limit=2&expand=teams,competition", "/api/results?limit=2"):
+        rows = (await client.get(path)).json()
+        response = await client.get(path + "&format=columnar")
+        assert response.status_code == 200
+        assert response.headers.get("X-Next-Cursor")
+        same_rows(response.json(), rows)
+    
+    # Teams and competition served from the reference data cache
+    rows = (await client.get("/api/events?limit=2&expand=teams,competition")).json()
+    await notification_hub.start()
+    await reference_data.start()
+    try:
+        same_rows((await client.get("/api/events?limit=2&expand=teams,competition&format=columnar")).json(), rows)
+    finally:
+        await reference_data.stop()
+        await notification_hub.stop()
@@ -19,3 +19,46 @@ async def test_health_check(client: AsyncClient):
     data = response.json()
     assert data["status"] == "healthy"
 
+
+
+@pytest.mark.asyncio
+async def test_metrics_record_db_queries(client: AsyncClient):
+    response = await client.get("/api/teams")
+    assert response.status_code == 200
+    
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    body = response.text
+    assert 'db_queries_total{operation="select",statement="get_teams"}' in body
+    assert "db_pool_acquire_duration_seconds" in body
+    assert 'db_queries_per_request_count{endpoint="/api/teams"}' in body
+
+
+@pytest.mark.asyncio
+async def test_metrics_labelled_by_route_template(client: AsyncClient):
+    await client.get("/api/teams/987654")
+    await client.get("/no/such/path")
+    
+    body = (await client.get("/metrics")).text
+    assert 'http_requests_total{endpoint="/api/teams/{team_id}",method="GET",status="404"}' in body
+    assert 'http_requests_total{endpoint="unmatched",method="GET",status="404"}' in body
+    assert "/api/teams/987654" not in body
+    assert 'db_queries_per_request_count{endpoint="/api/teams/{team_id}"}' in body
+
+
+@pytest.mark.asyncio
+async def test_response_compression(client: AsyncClient):
+    for i in range(12):
+        await client.post("/api/teams", json={"name": f"Gzip Rovers {i}", "country": "Gzipland", "sport": "Football"})
+    
+    response = await client.get("/api/teams?country=Gzipland", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert len(response.json()) == 12
+    
+    response = await client.get("/api/teams?country=Gzipland", headers={"Accept-Encoding": "gzip;q=0"})
+    assert "Content-Encoding" not in response.headers
+    
+    # Below the size threshold
+    response = await client.get("/health", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
@@ -0,0 +1,50 @@
+import asyncio
+import json
+import pytest
+from httpx import AsyncClient
+from tests.test_bets import create_test_bet
+
+
+def parse_event(chunk: bytes) -> tuple[str, dict]:
+    lines = dict(line.split(": ", 1) for line in chunk.decode().strip().split("\n"))
+    return lines["event"], json.loads(lines["data"])
+
+
+@pytest.mark.asyncio
+async def test_stream_fans_out_filtered_changes(client: AsyncClient):
+    from notifications import notification_hub
+    from stream import change_stream
+    
+    response = await client.get("/api/stream")
+    assert response.status_code == 503
+    
+    await notification_hub.start()
+    await change_stream.start()
+    customer_id = (await client.get("/api/customers")).json()[0]["id"]
+    subscriber = change_stream.events(["bets", "balance_changes"], {"customer_id": customer_id})
+    bystander = change_stream.events(["bets"], {"customer_id": -1})
+    try:
+        response = await client.get("/api/stream?topics=bets,secrets")
+        assert response.status_code == 400
+        
+        assert parse_event(await anext(subscriber)) == ("ready", {"topics": ["balance_changes", "bets"]})
+        await anext(bystander)
+        
+        bet = await create_test_bet(client, "STREAM-1")
+        received = {}
+        while len(received) < 2:
+            event, data = parse_event(await asyncio.wait_for(anext(subscriber), timeout=5))
+            received[event] = data
+        assert received["bets"] == {
+            "op": "insert",
+            "rows": [{"id": bet["id"], "event_id": bet["event_id"], "customer_id": customer_id}],
+        }
+        assert received["balance_changes"]["rows"][0]["customer_id"] == customer_id
+        
+        # Filtered out: nothing arrives
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(anext(bystander), timeout=0.5)
+    finally:
+        await subscriber.aclose()
+        await change_stream.stop()
+        await notification_hub.stop()
@@ -25,6 +25,33 @@ async def test_get_teams_with_filters(client: AsyncClient):
     assert all(team["country"] == "USA" for team in data)
 
 
+@pytest.mark.asyncio
+async def test_get_teams_cursor_pagination(client: AsyncClient):
+    response = await client.get("/api/teams?limit=1")
+    assert response.status_code == 200
+    first_page = response.json()
+    assert len(first_page) == 1
+    next_cursor = response.headers.get("X-Next-Cursor")
+    assert next_cursor
+    
+    response = await client.get(f"/api/teams?limit=1&cursor={next_cursor}")
+    assert response.status_code == 200
+    second_page = response.json()
+    assert len(second_page) == 1
+    assert second_page[0]["id"] != first_page[0]["id"]
+    assert second_page[0]["name"] >= first_page[0]["name"]
+    
+    # Offset pagination still returns the same rows
+    response = await client.get("/api/teams?limit=1&offset=1")
+    assert response.json()[0]["id"] == second_page[0]["id"]
+
+
+@pytest.mark.asyncio
+async def test_get_teams_invalid_cursor(client: AsyncClient):
+    response = await client.get("/api/teams?cursor=not-a-cursor")
+    assert response.status_code == 400
+
+
 @pytest.mark.asyncio
 async def test_create_team(client: AsyncClient):
     team_data = {
@@ -92,6 +119,11 @@ async def test_update_team(client: AsyncClient):
     data = response.json()
     assert data["country"] == "UK"
     assert data["name"] == "Liverpool"  # Name unchanged
+    
+    # An empty body changes nothing and returns the current team
+    response = await client.put(f"/api/teams/{team_id}", json={})
+    assert response.status_code == 200
+    assert response.json() == data
 
 
 @pytest.mark.asyncio
@@ -114,3 +146,127 @@ async def test_delete_team(client: AsyncClient):
     response = await client.get(f"/api/teams/{team_id}")
     assert response.status_code == 404
 
+
+
+@pytest.mark.asyncio
+async def test_get_teams_from_reference_cache(client: AsyncClient):
+    import asyncio
+    from database import execute_one
+    from notifications import notification_hub
+    from reference_data import reference_data
+    
+    for name in ["Cache United", "Cache City", "Cache Rovers"]:
+        response = await client.post("/api/teams", json={"name": name, "country": "Cacheland", "sport": "Football"})
+        assert response.status_code == 201
+    
+    expected = (await client.get("/api/teams?country=Cacheland&limit=2")).json()
+    
+    await notification_hub.start()
+    await reference_data.start()
+    try:
+        assert reference_data.table("teams") is not None
+        
+        # Same pages and cursors as the database path
+        response = await client.get("/api/teams?country=Cacheland&limit=2")
+        assert response.json() == expected
+        response = await client.get(f"/api/teams?country=Cacheland&limit=2&cursor={response.headers['X-Next-Cursor']}")
+        assert [team["name"] for team in response.json()] == ["Cache United"]
+        
+        # A write from elsewhere (another worker, psql) arrives through NOTIFY
+        team = await execute_one(
+            "INSERT INTO teams (name, country, sport) VALUES ('Cache Athletic', 'Cacheland', 'Football') RETURNING id"
+        )
+        for _ in range(50):
+            response = await client.get(f"/api/teams/{team['id']}")
+            if response.status_code == 200:
+                break
+            await asyncio.sleep(0.1)
+        assert response.status_code == 200
+        assert response.json()["name"] == "Cache Athletic"
+    finally:
+        await reference_data.stop()
+        await notification_hub.stop()
+
+
+@pytest.mark.asyncio
+async def test_batch_get_teams(client: AsyncClient):
+    ids = []
+    for name in ["Batch Rovers", "Batch Albion"]:
+        response = await client.post("/api/teams", json={"name": name, "country": "England", "sport": "Football"})
+        assert response.status_code == 201
+        ids.append(response.json()["id"])
+    
+    response = await client.post("/api/teams/batch-get", json={"ids": [ids[1], 999999, ids[0], ids[1]]})
+    assert response.status_code == 200
+    data = response.json()
+    assert [team["name"] for team in data["items"]] == ["Batch Albion", "Batch Rovers"]
+    assert data["missing"] == [999999]
+    
+    response = await client.post("/api/teams/batch-get", json={"ids": []})
+    assert response.status_code == 422
+    
+    for bad_id in (0, 2**63):
+        response = await client.post("/api/teams/batch-get", json={"ids": [ids[0], bad_id]})
+        assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_get_teams_conditional(client: AsyncClient):
+    from reference_data import reference_data
+    
+    response = await client.post("/api/teams", json={"name": "Etag Town", "country": "Etagland", "sport": "Football"})
+    team_id = response.json()["id"]
+    
+    response = await client.get("/api/teams?country=Etagland")
+    etag = response.headers["ETag"]
+    assert "Last-Modified" in response.headers
+    response = await client.get("/api/teams?country=Etagland", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    # Another page or filter is another representation
+    response = await client.get("/api/teams?country=Etagland&limit=5", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    
+    await client.put(f"/api/teams/{team_id}", json={"name": "Etag City"})
+    response = await client.get("/api/teams?country=Etagland", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()[0]["name"] == "Etag City"
+    
+    await reference_data.load("teams")
+    try:
+        response = await client.get(f"/api/teams/{team_id}")
+        etag = response.headers["ETag"]
+        response = await client.get(f"/api/teams/{team_id}", headers={"If-None-Match": f'"other", {etag}'})
+        assert response.status_code == 304
+    finally:
+        await reference_data.stop()
+
+
+@pytest.mark.asyncio
+async def test_get_teams_columnar(client: AsyncClient):
+    from notifications import notification_hub
+    from reference_data import reference_data
+    
+    for name in ("Columnar Athletic", "Columnar City"):
+        response = await client.post("/api/teams", json={"name": name, "country": "England", "sport": "Football"})
+        assert response.status_code == 201
+    
+    rows = (await client.get("/api/teams?limit=2")).json()
+    response = await client.get("/api/teams?limit=2&format=columnar")
+    assert response.status_code == 200
+    expected = response.json()
+    assert sorted(expected["columns"]) == sorted(rows[0])
+    assert expected["data"] == {column: [row[column] for row in rows] for column in rows[0]}
+    assert response.headers.get("X-Next-Cursor")
+    assert response.headers.get("ETag")
+    
+    await notification_hub.start()
+    await reference_data.start()
+    try:
+        response = await client.get("/api/teams?limit=2&format=columnar")
+        assert response.json() == expected
+        assert response.headers.get("X-Next-Cursor")
+        assert response.headers.get("ETag")
+    finally:
+        await reference_data.stop()
+        await notification_hub.stop()
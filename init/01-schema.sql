@@ -34,6 +34,7 @@ CREATE TABLE teams (
 -- Indexes for teams
 CREATE INDEX idx_teams_sport_country_name ON teams(sport, country, name);
 CREATE INDEX idx_teams_created_at ON teams(created_at);
+CREATE INDEX idx_teams_name_id ON teams(name, id);
 CREATE INDEX idx_teams_updated_at ON teams(updated_at);
 
 -- Competitions table
@@ -63,7 +64,7 @@ CREATE TABLE events (
 );
 
 -- Indexes for events
-CREATE INDEX idx_events_date ON events(date);
+CREATE INDEX idx_events_date_id ON events(date, id);
 CREATE INDEX idx_events_competition_id ON events(competition_id);
 CREATE INDEX idx_events_team_a_id ON events(team_a_id);
 CREATE INDEX idx_events_team_b_id ON events(team_b_id);
@@ -81,7 +82,7 @@ CREATE TABLE results (
 );
 
 -- Indexes for results
-CREATE INDEX idx_results_created_at ON results(created_at);
+CREATE INDEX idx_results_created_at_event_id ON results(created_at, event_id);
 CREATE INDEX idx_results_updated_at ON results(updated_at);
 
 -- Customers table
@@ -100,7 +101,7 @@ CREATE TABLE customers (
 
 -- Indexes for customers
 CREATE INDEX idx_customers_status ON customers(status);
-CREATE INDEX idx_customers_created_at ON customers(created_at);
+CREATE INDEX idx_customers_created_at_id ON customers(created_at, id);
 CREATE INDEX idx_customers_updated_at ON customers(updated_at);
 
 -- Bookies table
@@ -122,9 +123,22 @@ CREATE TABLE balance_changes (
 );
 
 -- Indexes for balance_changes
-CREATE INDEX idx_balance_changes_customer_id ON balance_changes(customer_id);
+CREATE INDEX idx_balance_changes_customer_id_created_at_id ON balance_changes(customer_id, created_at, id);
 CREATE INDEX idx_balance_changes_change_type ON balance_changes(change_type);
-CREATE INDEX idx_balance_changes_created_at ON balance_changes(created_at);
+CREATE INDEX idx_balance_changes_created_at_id ON balance_changes(created_at, id);
+
+-- Per-customer balance snapshots for ledger mode (app.balance_ledger = 'on'), where balance
+-- changes are appended without updating customers.balance: the balance is amount plus every
+-- change created at or after as_of. Opened with the customer ('-infinity': nothing folded yet)
+-- and moved forward by snapshot_customer_balances().
+CREATE TABLE customer_balance_snapshots (
+    customer_id BIGINT PRIMARY KEY REFERENCES customers(id) ON DELETE CASCADE,
+    amount DECIMAL(20, 4) NOT NULL,
+    as_of TIMESTAMP WITH TIME ZONE NOT NULL,
+    taken_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_customer_balance_snapshots_as_of ON customer_balance_snapshots(as_of);
 
 -- Bets table
 CREATE TABLE bets (
@@ -151,15 +165,35 @@ CREATE TABLE bets (
 );
 
 -- Indexes for bets
+-- (sort_column, id) composites back keyset pagination on the list endpoints
 CREATE INDEX idx_bets_bookie ON bets(bookie);
-CREATE INDEX idx_bets_customer_id ON bets(customer_id);
+CREATE INDEX idx_bets_customer_id_created_at_id ON bets(customer_id, created_at, id);
 CREATE INDEX idx_bets_event_id ON bets(event_id);
+-- Open (placed, unsettled) bets per event, aggregated by the exposure engine
+CREATE INDEX idx_bets_open_event_id ON bets(event_id) WHERE placement_status = 'placed' AND outcome IS NULL;
 CREATE INDEX idx_bets_sport ON bets(sport);
 CREATE INDEX idx_bets_placement_status ON bets(placement_status);
 CREATE INDEX idx_bets_outcome ON bets(outcome);
-CREATE INDEX idx_bets_created_at ON bets(created_at);
+CREATE INDEX idx_bets_created_at_id ON bets(created_at, id);
 CREATE INDEX idx_bets_updated_at ON bets(updated_at);
 
+-- Daily bet aggregates, maintained incrementally by the bets rollup triggers.
+-- Each row holds signed sums so inserts, updates and deletes apply as deltas;
+-- analytics read these instead of scanning bets.
+CREATE TABLE bet_daily_rollups (
+    day DATE NOT NULL,
+    sport TEXT NOT NULL,
+    bookie TEXT NOT NULL,
+    placement_status placement_status NOT NULL,
+    outcome bet_outcome,
+    currency currency_code NOT NULL,
+    bet_count BIGINT NOT NULL DEFAULT 0,
+    stake_sum NUMERIC NOT NULL DEFAULT 0,
+    odds_sum NUMERIC NOT NULL DEFAULT 0,
+    payout_sum NUMERIC NOT NULL DEFAULT 0,
+    CONSTRAINT unique_bet_daily_rollup UNIQUE NULLS NOT DISTINCT (day, sport, bookie, placement_status, outcome, currency)
+);
+
 -- Audit log table for important changes
 CREATE TABLE audit_log (
     id BIGSERIAL PRIMARY KEY,
@@ -173,9 +207,25 @@ CREATE TABLE audit_log (
 );
 
 CREATE INDEX idx_audit_log_table_name ON audit_log(table_name);
-CREATE INDEX idx_audit_log_changed_at ON audit_log(changed_at);
+CREATE INDEX idx_audit_log_changed_at_id ON audit_log(changed_at, id);
 CREATE INDEX idx_audit_log_username ON audit_log(username);
 
+-- Stored responses for write requests sent with an Idempotency-Key header.
+-- A key is claimed, written and completed in the request's transaction, so a NULL
+-- status_code is only visible to that transaction.
+CREATE TABLE idempotency_keys (
+    scope TEXT NOT NULL,
+    key TEXT NOT NULL,
+    request_hash BYTEA NOT NULL,
+    status_code SMALLINT,
+    response JSONB,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    PRIMARY KEY (scope, key)
+);
+
+CREATE INDEX idx_idempotency_keys_expires_at ON idempotency_keys(expires_at);
+
 -- ============================================
 -- MATERIALIZED VIEWS
 -- ============================================
@@ -201,5 +251,8 @@ GROUP BY c.id, c.username, c.currency, c.balance;
 
 CREATE UNIQUE INDEX idx_customer_stats_customer_id ON customer_stats(customer_id);
 
+COMMENT ON TABLE bet_daily_rollups IS 'Daily bet counts and stake/odds/payout sums per sport, bookie, status, outcome and currency';
+COMMENT ON TABLE idempotency_keys IS 'Replayable responses for idempotent POST requests, evicted after expires_at';
+COMMENT ON TABLE customer_balance_snapshots IS 'Ledger-mode customer balances up to as_of; later balance_changes are added on read';
 COMMENT ON TABLE audit_log IS 'Audit trail for changes to critical tables';
 COMMENT ON MATERIALIZED VIEW customer_stats IS 'Aggregated betting statistics per customer for reporting';
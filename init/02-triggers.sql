@@ -25,6 +25,130 @@ CREATE TRIGGER update_customers_updated_at BEFORE UPDATE ON customers
 CREATE TRIGGER update_bets_updated_at BEFORE UPDATE ON bets
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- Ledger mode (app.balance_ledger = 'on', set for every writer, e.g. with ALTER DATABASE):
+-- balance changes are appended without updating customers.balance, and a customer's
+-- balance is their snapshot plus the changes created since it
+CREATE OR REPLACE FUNCTION ledger_balance(p_customer_id BIGINT)
+RETURNS DECIMAL(20, 4) AS $$
+    SELECT s.amount + COALESCE(SUM((b.delta).amount), 0)
+    FROM customer_balance_snapshots s
+    LEFT JOIN balance_changes b ON b.customer_id = s.customer_id AND b.created_at >= s.as_of
+    WHERE s.customer_id = p_customer_id
+    GROUP BY s.amount
+$$ LANGUAGE sql STABLE;
+
+-- The customer's current balance in either mode (stored_balance is customers.balance)
+CREATE OR REPLACE FUNCTION customer_balance(p_customer_id BIGINT, stored_balance money_amount)
+RETURNS money_amount AS $$
+    SELECT CASE
+        WHEN current_setting('app.balance_ledger', true) = 'on'
+            THEN ROW(ledger_balance(p_customer_id), (stored_balance).currency)::money_amount
+        ELSE stored_balance
+    END
+$$ LANGUAGE sql STABLE;
+
+-- Holds the customers' balances until commit, in id order to avoid deadlocks: the row
+-- lock balance updates take, or in ledger mode the advisory lock debits take
+CREATE OR REPLACE FUNCTION lock_customer_balances(customer_ids BIGINT[])
+RETURNS VOID AS $$
+DECLARE
+    locked_id BIGINT;
+BEGIN
+    IF current_setting('app.balance_ledger', true) = 'on' THEN
+        FOR locked_id IN SELECT DISTINCT id FROM unnest(customer_ids) AS id ORDER BY id LOOP
+            PERFORM pg_advisory_xact_lock(locked_id);
+        END LOOP;
+    ELSE
+        PERFORM 1 FROM customers WHERE id = ANY(customer_ids) ORDER BY id FOR UPDATE;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Folds the changes made since each customer's snapshot into it, so ledger reads stay
+-- short. created_at is the inserting transaction's start time, so every change created
+-- before the oldest open transaction started is already committed (or rolled back) and
+-- visible here; the margin covers a transaction that has started but not yet shown up in
+-- pg_stat_activity, which must list every writer (one role, or pg_read_all_stats).
+-- Returns the number of snapshots taken.
+CREATE OR REPLACE FUNCTION snapshot_customer_balances()
+RETURNS INTEGER AS $$
+DECLARE
+    previous_as_of TIMESTAMP WITH TIME ZONE;
+    horizon TIMESTAMP WITH TIME ZONE;
+    snapshotted INTEGER;
+BEGIN
+    IF NOT pg_try_advisory_xact_lock(hashtext('snapshot_customer_balances'), 0) THEN
+        RETURN 0;
+    END IF;
+    
+    -- Every change created before the latest snapshot was folded by that run
+    SELECT COALESCE(MAX(as_of), '-infinity') INTO previous_as_of
+    FROM customer_balance_snapshots;
+    
+    SELECT MIN(xact_start) - INTERVAL '1 second' INTO horizon
+    FROM pg_stat_activity
+    WHERE xact_start IS NOT NULL;
+    
+    IF horizon <= previous_as_of THEN
+        RETURN 0;
+    END IF;
+    
+    -- Customers with changes since the latest snapshot, and snapshots never taken (whose
+    -- customer may have been committed after that run)
+    UPDATE customer_balance_snapshots s
+    SET amount = s.amount + d.total,
+        as_of = horizon,
+        taken_at = CURRENT_TIMESTAMP
+    FROM (
+        SELECT s2.customer_id, s2.as_of, COALESCE(SUM((b.delta).amount), 0) AS total
+        FROM customer_balance_snapshots s2
+        LEFT JOIN balance_changes b
+            ON b.customer_id = s2.customer_id AND b.created_at >= s2.as_of AND b.created_at < horizon
+        WHERE s2.as_of = '-infinity'
+           OR s2.customer_id IN (
+               SELECT customer_id FROM balance_changes
+               WHERE created_at >= previous_as_of AND created_at < horizon
+           )
+        GROUP BY s2.customer_id, s2.as_of
+    ) d
+    WHERE s.customer_id = d.customer_id AND s.as_of = d.as_of;
+    
+    GET DIAGNOSTICS snapshotted = ROW_COUNT;
+    RETURN snapshotted;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Writes ledger balances back to customers.balance, e.g. before leaving ledger mode
+CREATE OR REPLACE FUNCTION sync_customer_balances()
+RETURNS INTEGER AS $$
+    WITH synced AS (
+        UPDATE customers c
+        SET balance = ROW(l.amount, c.currency)::money_amount,
+            updated_at = CURRENT_TIMESTAMP
+        FROM (
+            SELECT customer_id, ledger_balance(customer_id) AS amount
+            FROM customer_balance_snapshots
+        ) l
+        WHERE c.id = l.customer_id AND (c.balance).amount <> l.amount
+        RETURNING c.id
+    )
+    SELECT COUNT(*)::INTEGER FROM synced
+$$ LANGUAGE sql;
+
+-- Opens a new customer's ledger at their opening balance
+CREATE OR REPLACE FUNCTION open_customer_balance_snapshot()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO customer_balance_snapshots (customer_id, amount, as_of)
+    VALUES (NEW.id, (NEW.balance).amount, '-infinity');
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER open_customer_balance_snapshot_on_insert
+AFTER INSERT ON customers
+FOR EACH ROW EXECUTE FUNCTION open_customer_balance_snapshot();
+
 -- Function to update customer balance when balance_change is inserted
 CREATE OR REPLACE FUNCTION update_customer_balance()
 RETURNS TRIGGER AS $$
@@ -33,11 +157,32 @@ DECLARE
     current_currency currency_code;
     new_balance_amount DECIMAL(20, 4);
 BEGIN
-    -- Get current balance
+    -- Bulk settlement and bulk bet import apply balances with one set-based UPDATE instead
+    IF current_setting('app.bulk_balance_writes', true) = 'on' THEN
+        RETURN NEW;
+    END IF;
+
+    -- Ledger mode leaves the customer row alone, so a busy customer is not a serialization
+    -- point (nor audited) on every change. Only debits can overdraw: they serialize on the
+    -- customer's advisory lock, held to commit, and check the balance including this change.
+    IF current_setting('app.balance_ledger', true) = 'on' THEN
+        IF (NEW.delta).amount < 0 THEN
+            PERFORM pg_advisory_xact_lock(NEW.customer_id);
+            new_balance_amount := ledger_balance(NEW.customer_id);
+            IF new_balance_amount < 0 THEN
+                RAISE EXCEPTION 'Insufficient balance: operation would result in negative balance %', new_balance_amount;
+            END IF;
+        END IF;
+        RETURN NEW;
+    END IF;
+
+    -- Get current balance, locked since the new balance is written as an absolute value
+    -- (NO KEY UPDATE does not conflict with the key share lock this insert's FK check holds)
     SELECT (balance).amount, (balance).currency 
     INTO current_balance_amount, current_currency
     FROM customers
-    WHERE id = NEW.customer_id;
+    WHERE id = NEW.customer_id
+    FOR NO KEY UPDATE;
     
     IF NOT FOUND THEN
         RAISE EXCEPTION 'Customer with id % not found', NEW.customer_id;
@@ -139,8 +284,9 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Only re-validated when the columns it checks change, so settling bets skips it
 CREATE TRIGGER validate_bet_sport_trigger
-BEFORE INSERT OR UPDATE ON bets
+BEFORE INSERT OR UPDATE OF sport, event_id ON bets
 FOR EACH ROW EXECUTE FUNCTION validate_bet_sport();
 
 -- Validate team consistency in events
@@ -196,66 +342,117 @@ END;
 $$ LANGUAGE plpgsql;
 
 CREATE TRIGGER validate_bet_currency_trigger
-BEFORE INSERT OR UPDATE ON bets
+BEFORE INSERT OR UPDATE OF stake, customer_id ON bets
 FOR EACH ROW EXECUTE FUNCTION validate_bet_currency();
 
--- Audit trigger function
+-- Audit trigger function. Statement-level over the transition tables, so a bulk write is
+-- audited with one set-based INSERT; TG_ARGV[0] names the primary key column (default id).
+-- Updated rows are paired with their previous version by that key.
 CREATE OR REPLACE FUNCTION audit_trigger_function()
 RETURNS TRIGGER AS $$
 DECLARE
-    id_field_name TEXT := TG_ARGV[0];
-    pk_value TEXT;
+    id_field_name TEXT := COALESCE(TG_ARGV[0], 'id');
 BEGIN
-    IF id_field_name IS NULL THEN
-        id_field_name := 'id';
-    END IF;
-
-    -- Dynamically get the primary key value from the NEW or OLD record.
-    -- This is a key step to make the trigger generic.
-    IF TG_OP = 'DELETE' THEN
-        EXECUTE format('SELECT ($1).%I', id_field_name) INTO pk_value USING OLD;
-    ELSE
-        EXECUTE format('SELECT ($1).%I', id_field_name) INTO pk_value USING NEW;
-    END IF;
-
     IF TG_OP = 'INSERT' THEN
-        INSERT INTO audit_log (table_name, operation, row_id, new_data)
-        VALUES (TG_TABLE_NAME, TG_OP::audit_operation, pk_value::bigint, to_jsonb(NEW));
+        EXECUTE format($sql$
+            INSERT INTO audit_log (table_name, operation, row_id, new_data)
+            SELECT %L, 'INSERT', n.%2$I, to_jsonb(n)
+            FROM new_rows n
+        $sql$, TG_TABLE_NAME, id_field_name);
     ELSIF TG_OP = 'UPDATE' THEN
-        INSERT INTO audit_log (table_name, operation, row_id, old_data, new_data)
-        VALUES (TG_TABLE_NAME, TG_OP::audit_operation, pk_value::bigint, to_jsonb(OLD), to_jsonb(NEW));
-    ELSIF TG_OP = 'DELETE' THEN
-        INSERT INTO audit_log (table_name, operation, row_id, old_data)
-        VALUES (TG_TABLE_NAME, TG_OP::audit_operation, pk_value::bigint, to_jsonb(OLD));
-    END IF;
-
-    IF TG_OP = 'DELETE' THEN
-        RETURN OLD;
+        -- A row whose key itself changed has no partner and is logged with one side only
+        EXECUTE format($sql$
+            INSERT INTO audit_log (table_name, operation, row_id, old_data, new_data)
+            SELECT %L, 'UPDATE', COALESCE(n.%2$I, o.%2$I), to_jsonb(o), to_jsonb(n)
+            FROM old_rows o
+            FULL JOIN new_rows n ON n.%2$I = o.%2$I
+        $sql$, TG_TABLE_NAME, id_field_name);
     ELSE
-        RETURN NEW;
+        EXECUTE format($sql$
+            INSERT INTO audit_log (table_name, operation, row_id, old_data)
+            SELECT %L, 'DELETE', o.%2$I, to_jsonb(o)
+            FROM old_rows o
+        $sql$, TG_TABLE_NAME, id_field_name);
     END IF;
+
+    RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
-CREATE TRIGGER audit_events_trigger
-    AFTER INSERT OR UPDATE OR DELETE ON events
-    FOR EACH ROW EXECUTE FUNCTION audit_trigger_function();
+CREATE TRIGGER audit_events_on_insert
+AFTER INSERT ON events
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_trigger_function();
+
+CREATE TRIGGER audit_events_on_update
+AFTER UPDATE ON events
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_trigger_function();
+
+CREATE TRIGGER audit_events_on_delete
+AFTER DELETE ON events
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_trigger_function();
+
+CREATE TRIGGER audit_results_on_insert
+AFTER INSERT ON results
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_trigger_function('event_id');
+
+CREATE TRIGGER audit_results_on_update
+AFTER UPDATE ON results
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_trigger_function('event_id');
+
+CREATE TRIGGER audit_results_on_delete
+AFTER DELETE ON results
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_trigger_function('event_id');
+
+CREATE TRIGGER audit_customers_on_insert
+AFTER INSERT ON customers
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_trigger_function();
+
+CREATE TRIGGER audit_customers_on_update
+AFTER UPDATE ON customers
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_trigger_function();
+
+CREATE TRIGGER audit_customers_on_delete
+AFTER DELETE ON customers
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_trigger_function();
+
+CREATE TRIGGER audit_balance_changes_on_insert
+AFTER INSERT ON balance_changes
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_trigger_function();
 
-CREATE TRIGGER audit_results_trigger
-    AFTER INSERT OR UPDATE OR DELETE ON results
-    FOR EACH ROW EXECUTE FUNCTION audit_trigger_function('event_id');
+CREATE TRIGGER audit_balance_changes_on_update
+AFTER UPDATE ON balance_changes
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_trigger_function();
 
-CREATE TRIGGER audit_customers_trigger
-    AFTER INSERT OR UPDATE OR DELETE ON customers
-    FOR EACH ROW EXECUTE FUNCTION audit_trigger_function();
+CREATE TRIGGER audit_balance_changes_on_delete
+AFTER DELETE ON balance_changes
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_trigger_function();
 
-CREATE TRIGGER audit_balance_changes_trigger
-    AFTER INSERT OR UPDATE OR DELETE ON balance_changes
-    FOR EACH ROW EXECUTE FUNCTION audit_trigger_function();
+CREATE TRIGGER audit_bets_on_insert
+AFTER INSERT ON bets
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_trigger_function();
+
+CREATE TRIGGER audit_bets_on_update
+AFTER UPDATE ON bets
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_trigger_function();
 
-CREATE TRIGGER audit_bets_trigger
-    AFTER INSERT OR UPDATE OR DELETE ON bets
-    FOR EACH ROW EXECUTE FUNCTION audit_trigger_function();
+CREATE TRIGGER audit_bets_on_delete
+AFTER DELETE ON bets
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION audit_trigger_function();
 
 -- Add constraint to ensure events are in the future when created as prematch
 CREATE OR REPLACE FUNCTION validate_prematch_event_date()
@@ -275,19 +472,231 @@ CREATE TRIGGER validate_prematch_event_date_trigger
 BEFORE INSERT OR UPDATE ON events
 FOR EACH ROW EXECUTE FUNCTION validate_prematch_event_date();
 
--- Function to refresh the materialized view
-CREATE OR REPLACE FUNCTION refresh_customer_stats()
+-- Mark customer_stats dirty instead of refreshing it inside the writing transaction.
+-- The backend refresher LISTENs on this channel and rebuilds the view at most every
+-- CUSTOMER_STATS_REFRESH_SECONDS; identical notifications in one transaction are
+-- delivered once, so bulk writes cost a single message.
+CREATE OR REPLACE FUNCTION notify_customer_stats_dirty()
 RETURNS TRIGGER AS $$
 BEGIN
-    REFRESH MATERIALIZED VIEW CONCURRENTLY customer_stats;
+    PERFORM pg_notify('customer_stats_dirty', '');
     RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
--- Refresh stats when bets or balance changes
-CREATE TRIGGER refresh_customer_stats_on_bet
+-- Stats change with bets and with customer balances
+CREATE TRIGGER notify_customer_stats_dirty_on_bet
 AFTER INSERT OR UPDATE OR DELETE ON bets
-FOR EACH STATEMENT EXECUTE FUNCTION refresh_customer_stats();
+FOR EACH STATEMENT EXECUTE FUNCTION notify_customer_stats_dirty();
+
+CREATE TRIGGER notify_customer_stats_dirty_on_customer
+AFTER INSERT OR UPDATE OR DELETE ON customers
+FOR EACH STATEMENT EXECUTE FUNCTION notify_customer_stats_dirty();
+
+-- Tell every backend worker which reference table changed so it reloads its
+-- in-memory copy; the notification is sent on commit, after the change is visible.
+CREATE OR REPLACE FUNCTION notify_reference_data_changed()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('reference_data_changed', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER notify_reference_data_changed_on_sport
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON sports
+FOR EACH STATEMENT EXECUTE FUNCTION notify_reference_data_changed();
+
+CREATE TRIGGER notify_reference_data_changed_on_bookie
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON bookies
+FOR EACH STATEMENT EXECUTE FUNCTION notify_reference_data_changed();
+
+CREATE TRIGGER notify_reference_data_changed_on_competition
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON competitions
+FOR EACH STATEMENT EXECUTE FUNCTION notify_reference_data_changed();
+
+CREATE TRIGGER notify_reference_data_changed_on_team
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON teams
+FOR EACH STATEMENT EXECUTE FUNCTION notify_reference_data_changed();
+
+-- Publish the keys (TG_ARGV) of the rows changed by one statement on the row_changes
+-- channel for /api/stream. Rows go out 100 per notification to stay well under the
+-- 8000-byte payload limit; like every NOTIFY they are delivered on commit. An UPDATE
+-- publishes the keys of the old rows too when they differ (e.g. a bet moved to another
+-- event), so subscribers also refresh what the rows moved away from.
+CREATE OR REPLACE FUNCTION notify_row_changes()
+RETURNS TRIGGER AS $$
+DECLARE
+    keys_query TEXT := $sql$
+        SELECT (SELECT jsonb_object_agg(key, to_jsonb(c) -> key) FROM unnest($1::text[]) AS key) AS keys
+        FROM %I c
+    $sql$;
+    changed TEXT;
+    payload TEXT;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        changed := format(keys_query, 'new_rows');
+    ELSIF TG_OP = 'DELETE' THEN
+        changed := format(keys_query, 'old_rows');
+    ELSE
+        changed := format(keys_query, 'new_rows') || ' UNION ' || format(keys_query, 'old_rows');
+    END IF;
+
+    FOR payload IN EXECUTE format($sql$
+        SELECT json_build_object('table', %L, 'op', %L, 'rows', json_agg(keys ORDER BY n))::text
+        FROM (SELECT row_number() OVER () AS n, keys FROM (%s) changed) numbered
+        GROUP BY (n - 1) / 100
+    $sql$, TG_TABLE_NAME, lower(TG_OP), changed)
+    USING TG_ARGV
+    LOOP
+        PERFORM pg_notify('row_changes', payload);
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER notify_bet_changes_on_insert
+AFTER INSERT ON bets
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION notify_row_changes('id', 'event_id', 'customer_id');
+
+CREATE TRIGGER notify_bet_changes_on_update
+AFTER UPDATE ON bets
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION notify_row_changes('id', 'event_id', 'customer_id');
+
+CREATE TRIGGER notify_bet_changes_on_delete
+AFTER DELETE ON bets
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION notify_row_changes('id', 'event_id', 'customer_id');
+
+CREATE TRIGGER notify_event_changes_on_insert
+AFTER INSERT ON events
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION notify_row_changes('id', 'competition_id');
+
+CREATE TRIGGER notify_event_changes_on_update
+AFTER UPDATE ON events
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION notify_row_changes('id', 'competition_id');
+
+CREATE TRIGGER notify_event_changes_on_delete
+AFTER DELETE ON events
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION notify_row_changes('id', 'competition_id');
+
+CREATE TRIGGER notify_result_changes_on_insert
+AFTER INSERT ON results
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION notify_row_changes('event_id');
+
+CREATE TRIGGER notify_result_changes_on_update
+AFTER UPDATE ON results
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION notify_row_changes('event_id');
+
+CREATE TRIGGER notify_result_changes_on_delete
+AFTER DELETE ON results
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION notify_row_changes('event_id');
+
+CREATE TRIGGER notify_balance_change_changes_on_insert
+AFTER INSERT ON balance_changes
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION notify_row_changes('id', 'customer_id');
+
+CREATE TRIGGER notify_balance_change_changes_on_update
+AFTER UPDATE ON balance_changes
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION notify_row_changes('id', 'customer_id');
+
+CREATE TRIGGER notify_balance_change_changes_on_delete
+AFTER DELETE ON balance_changes
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION notify_row_changes('id', 'customer_id');
+
+-- Apply the rows changed by one bets statement to bet_daily_rollups.
+-- Old rows count negatively and new rows positively, so an UPDATE moves a bet
+-- between rollup keys (e.g. when it is settled) and no-op updates cancel out.
+CREATE OR REPLACE FUNCTION apply_bet_rollup_delta()
+RETURNS TRIGGER AS $$
+DECLARE
+    delta_rows TEXT;
+BEGIN
+    delta_rows := CASE TG_OP
+        WHEN 'INSERT' THEN 'SELECT *, 1 AS sign FROM new_rows'
+        WHEN 'DELETE' THEN 'SELECT *, -1 AS sign FROM old_rows'
+        ELSE 'SELECT *, 1 AS sign FROM new_rows UNION ALL SELECT *, -1 AS sign FROM old_rows'
+    END;
+
+    EXECUTE format($sql$
+        INSERT INTO bet_daily_rollups AS r (
+            day, sport, bookie, placement_status, outcome, currency,
+            bet_count, stake_sum, odds_sum, payout_sum
+        )
+        SELECT
+            (created_at AT TIME ZONE 'UTC')::date, sport, bookie, placement_status, outcome, (stake).currency,
+            SUM(sign), SUM(sign * (stake).amount), SUM(sign * odds), SUM(sign * (stake).amount * odds)
+        FROM (%s) d
+        GROUP BY 1, 2, 3, 4, 5, 6
+        HAVING SUM(sign) <> 0 OR SUM(sign * (stake).amount) <> 0 OR SUM(sign * odds) <> 0
+            OR SUM(sign * (stake).amount * odds) <> 0
+        ON CONFLICT (day, sport, bookie, placement_status, outcome, currency) DO UPDATE SET
+            bet_count = r.bet_count + EXCLUDED.bet_count,
+            stake_sum = r.stake_sum + EXCLUDED.stake_sum,
+            odds_sum = r.odds_sum + EXCLUDED.odds_sum,
+            payout_sum = r.payout_sum + EXCLUDED.payout_sum
+    $sql$, delta_rows);
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Transition tables require one trigger per event
+CREATE TRIGGER bet_rollup_on_insert
+AFTER INSERT ON bets
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION apply_bet_rollup_delta();
+
+CREATE TRIGGER bet_rollup_on_update
+AFTER UPDATE ON bets
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION apply_bet_rollup_delta();
+
+CREATE TRIGGER bet_rollup_on_delete
+AFTER DELETE ON bets
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION apply_bet_rollup_delta();
+
+CREATE OR REPLACE FUNCTION truncate_bet_daily_rollups()
+RETURNS TRIGGER AS $$
+BEGIN
+    TRUNCATE bet_daily_rollups;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER bet_rollup_on_truncate
+AFTER TRUNCATE ON bets
+FOR EACH STATEMENT EXECUTE FUNCTION truncate_bet_daily_rollups();
+
+-- Recompute bet_daily_rollups from scratch (backfill or repair after drift)
+CREATE OR REPLACE FUNCTION rebuild_bet_daily_rollups()
+RETURNS VOID AS $$
+BEGIN
+    LOCK TABLE bets IN SHARE MODE;
+    DELETE FROM bet_daily_rollups;
+    INSERT INTO bet_daily_rollups (
+        day, sport, bookie, placement_status, outcome, currency,
+        bet_count, stake_sum, odds_sum, payout_sum
+    )
+    SELECT
+        (created_at AT TIME ZONE 'UTC')::date, sport, bookie, placement_status, outcome, (stake).currency,
+        COUNT(*), SUM((stake).amount), SUM(odds), SUM((stake).amount * odds)
+    FROM bets
+    GROUP BY 1, 2, 3, 4, 5, 6;
+END;
+$$ LANGUAGE plpgsql;
 
 -- Function to deduct stake when bet is placed
 CREATE OR REPLACE FUNCTION handle_bet_placement()
@@ -295,6 +704,11 @@ RETURNS TRIGGER AS $$
 DECLARE
     customer_currency currency_code;
 BEGIN
+    -- Bulk bet import writes the stake deductions for all placed bets in one statement
+    IF current_setting('app.bulk_balance_writes', true) = 'on' THEN
+        RETURN NEW;
+    END IF;
+
     -- Only process when a bet is successfully placed (not for failed bets)
     IF NEW.placement_status = 'placed' THEN
         -- Get customer currency
@@ -335,6 +749,11 @@ DECLARE
     customer_currency currency_code;
     change_description TEXT;
 BEGIN
+    -- Bulk settlement writes the balance changes for all settled bets in one statement
+    IF current_setting('app.bulk_balance_writes', true) = 'on' THEN
+        RETURN NEW;
+    END IF;
+
     -- Only process when outcome changes from NULL to a non-NULL value
     IF OLD.outcome IS NULL AND NEW.outcome IS NOT NULL THEN
         -- Get customer currency for the balance change
@@ -388,12 +807,44 @@ COMMENT ON TRIGGER validate_bet_placement_trigger ON bets IS 'Ensures bets can o
 COMMENT ON TRIGGER validate_bet_sport_trigger ON bets IS 'Ensures bet sport matches the event competition sport';
 COMMENT ON TRIGGER validate_event_teams_trigger ON events IS 'Ensures teams in an event play the same sport as the competition';
 COMMENT ON TRIGGER validate_bet_currency_trigger ON bets IS 'Ensures bet stakes use the same currency as the customer';
-COMMENT ON TRIGGER audit_events_trigger ON events IS 'Tracks all changes to events table for audit purposes';
-COMMENT ON TRIGGER audit_results_trigger ON results IS 'Tracks all changes to results table for audit purposes';
-COMMENT ON TRIGGER audit_customers_trigger ON customers IS 'Tracks all changes to customers table for audit purposes';
-COMMENT ON TRIGGER audit_balance_changes_trigger ON balance_changes IS 'Tracks all changes to balance_changes table for audit purposes';
-COMMENT ON TRIGGER audit_bets_trigger ON bets IS 'Tracks all changes to bets table for audit purposes';
+COMMENT ON TRIGGER audit_events_on_insert ON events IS 'Writes audit_log rows for the inserted events rows of a statement';
+COMMENT ON TRIGGER audit_events_on_update ON events IS 'Writes audit_log rows for the updated events rows of a statement';
+COMMENT ON TRIGGER audit_events_on_delete ON events IS 'Writes audit_log rows for the deleted events rows of a statement';
+COMMENT ON TRIGGER audit_results_on_insert ON results IS 'Writes audit_log rows for the inserted results rows of a statement';
+COMMENT ON TRIGGER audit_results_on_update ON results IS 'Writes audit_log rows for the updated results rows of a statement';
+COMMENT ON TRIGGER audit_results_on_delete ON results IS 'Writes audit_log rows for the deleted results rows of a statement';
+COMMENT ON TRIGGER audit_customers_on_insert ON customers IS 'Writes audit_log rows for the inserted customers rows of a statement';
+COMMENT ON TRIGGER audit_customers_on_update ON customers IS 'Writes audit_log rows for the updated customers rows of a statement';
+COMMENT ON TRIGGER audit_customers_on_delete ON customers IS 'Writes audit_log rows for the deleted customers rows of a statement';
+COMMENT ON TRIGGER audit_balance_changes_on_insert ON balance_changes IS 'Writes audit_log rows for the inserted balance_changes rows of a statement';
+COMMENT ON TRIGGER audit_balance_changes_on_update ON balance_changes IS 'Writes audit_log rows for the updated balance_changes rows of a statement';
+COMMENT ON TRIGGER audit_balance_changes_on_delete ON balance_changes IS 'Writes audit_log rows for the deleted balance_changes rows of a statement';
+COMMENT ON TRIGGER audit_bets_on_insert ON bets IS 'Writes audit_log rows for the inserted bets rows of a statement';
+COMMENT ON TRIGGER audit_bets_on_update ON bets IS 'Writes audit_log rows for the updated bets rows of a statement';
+COMMENT ON TRIGGER audit_bets_on_delete ON bets IS 'Writes audit_log rows for the deleted bets rows of a statement';
 COMMENT ON TRIGGER validate_prematch_event_date_trigger ON events IS 'Ensures prematch events are scheduled in the future';
-COMMENT ON TRIGGER refresh_customer_stats_on_bet ON bets IS 'Refreshes materialized view when bets change';
+COMMENT ON TRIGGER notify_customer_stats_dirty_on_bet ON bets IS 'Notifies the backend refresher that customer_stats is stale';
+COMMENT ON TRIGGER notify_customer_stats_dirty_on_customer ON customers IS 'Notifies the backend refresher that customer_stats is stale';
+COMMENT ON TRIGGER notify_reference_data_changed_on_sport ON sports IS 'Notifies backend workers to reload their cached sports';
+COMMENT ON TRIGGER notify_reference_data_changed_on_bookie ON bookies IS 'Notifies backend workers to reload their cached bookies';
+COMMENT ON TRIGGER notify_reference_data_changed_on_competition ON competitions IS 'Notifies backend workers to reload their cached competitions';
+COMMENT ON TRIGGER notify_reference_data_changed_on_team ON teams IS 'Notifies backend workers to reload their cached teams';
+COMMENT ON TRIGGER notify_bet_changes_on_insert ON bets IS 'Publishes the keys of inserted bets to /api/stream subscribers';
+COMMENT ON TRIGGER notify_bet_changes_on_update ON bets IS 'Publishes the old and new keys of updated bets to /api/stream subscribers';
+COMMENT ON TRIGGER notify_bet_changes_on_delete ON bets IS 'Publishes the keys of deleted bets to /api/stream subscribers';
+COMMENT ON TRIGGER notify_event_changes_on_insert ON events IS 'Publishes the keys of inserted events to /api/stream subscribers';
+COMMENT ON TRIGGER notify_event_changes_on_update ON events IS 'Publishes the old and new keys of updated events to /api/stream subscribers';
+COMMENT ON TRIGGER notify_event_changes_on_delete ON events IS 'Publishes the keys of deleted events to /api/stream subscribers';
+COMMENT ON TRIGGER notify_result_changes_on_insert ON results IS 'Publishes the keys of inserted results to /api/stream subscribers';
+COMMENT ON TRIGGER notify_result_changes_on_update ON results IS 'Publishes the old and new keys of updated results to /api/stream subscribers';
+COMMENT ON TRIGGER notify_result_changes_on_delete ON results IS 'Publishes the keys of deleted results to /api/stream subscribers';
+COMMENT ON TRIGGER notify_balance_change_changes_on_insert ON balance_changes IS 'Publishes the keys of inserted balance_changes to /api/stream subscribers';
+COMMENT ON TRIGGER notify_balance_change_changes_on_update ON balance_changes IS 'Publishes the old and new keys of updated balance_changes to /api/stream subscribers';
+COMMENT ON TRIGGER notify_balance_change_changes_on_delete ON balance_changes IS 'Publishes the keys of deleted balance_changes to /api/stream subscribers';
+COMMENT ON TRIGGER open_customer_balance_snapshot_on_insert ON customers IS 'Opens the customer balance snapshot used in ledger mode';
+COMMENT ON TRIGGER bet_rollup_on_insert ON bets IS 'Adds inserted bets to bet_daily_rollups';
+COMMENT ON TRIGGER bet_rollup_on_update ON bets IS 'Moves updated bets between bet_daily_rollups keys';
+COMMENT ON TRIGGER bet_rollup_on_delete ON bets IS 'Removes deleted bets from bet_daily_rollups';
+COMMENT ON TRIGGER bet_rollup_on_truncate ON bets IS 'Empties bet_daily_rollups when bets is truncated';
 COMMENT ON TRIGGER handle_bet_placement_trigger ON bets IS 'Deducts stake from customer balance when bet is placed';
 COMMENT ON TRIGGER handle_bet_outcome_change_trigger ON bets IS 'Creates balance change when bet outcome changes from NULL to win/lose/void';
\ No newline at end of file